@@ -0,0 +1,56 @@
+"""Look up xleap_briefing_prompt by the digest of the template
+
+Revision ID: 3c1f5d2a9e47
+Revises: bf7b226caa17
+Create Date: 2026-10-18 10:12:31.482113
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3c1f5d2a9e47'
+down_revision = 'bf7b226caa17'
+branch_labels = None
+depends_on = None
+
+TABLE = 'xleap_briefing_prompt'
+PRIMARY_KEY = 'xleap_briefing_prompt_pk'
+
+
+def _table_columns():
+    """returns the columns of the table, None if it does not exist yet"""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(TABLE):
+        return None
+    return {column['name'] for column in inspector.get_columns(TABLE)}
+
+
+def upgrade():
+    # the table is created by init_db with the digest if it does not exist
+    columns = _table_columns()
+    if columns is None or 'template_digest' in columns:
+        return
+
+    op.add_column(TABLE, sa.Column('template_digest', sa.String(length=64),
+                                   nullable=True))
+    # same digest as app.utils.briefings.get_template_digest
+    op.execute(
+        f"UPDATE {TABLE} SET template_digest = "
+        "encode(sha256(convert_to(template, 'UTF8')), 'hex')"
+    )
+    op.alter_column(TABLE, 'template_digest', nullable=False)
+    op.drop_constraint(PRIMARY_KEY, TABLE, type_='primary')
+    op.create_primary_key(PRIMARY_KEY, TABLE,
+                          ['category', 'sub_category', 'template_digest'])
+
+
+def downgrade():
+    columns = _table_columns()
+    if columns is None or 'template_digest' not in columns:
+        return
+
+    op.drop_constraint(PRIMARY_KEY, TABLE, type_='primary')
+    op.create_primary_key(PRIMARY_KEY, TABLE,
+                          ['category', 'sub_category', 'template'])
+    op.drop_column(TABLE, 'template_digest')
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import agents, api_keys, ideas
+from app.api.routes import agents, api_keys, ideas, metrics
 
 api_router = APIRouter()
 api_router.include_router(agents.router, prefix="/agents", tags=["agents"])
@@ -8,3 +8,4 @@ api_router.include_router(
     api_keys.router, prefix="/api_keys", tags=["api_keys"]
 )
 api_router.include_router(ideas.router, tags=["ideas"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
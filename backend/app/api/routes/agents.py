@@ -7,6 +7,7 @@ from sqlmodel import select
 
 from app import crud
 from app.api.deps import SessionDep
+from app.core.config import settings
 from app.models import (
     AIAgent,
     AIAgentCreate,
@@ -16,7 +17,11 @@ from app.models import (
     AIBriefingTest,
     BriefingTextResponse,
 )
+from app.orchestration.briefing_sync import briefing_synchronizer
+from app.orchestration.llm import token_usage_tracker
+from app.orchestration.warmup import warm_up_agent
 from app.utils import (
+    agent_manager,
     check_agent_exists_by_instance_id,
     get_agent_by_id,
     get_briefing2_by_agent_id,
@@ -72,7 +77,12 @@ async def create_agent(
             session=session, briefing=briefing, briefing_ref_base=exemplar
         )
 
-    # background_tasks.add_task(get_agent_briefing, agent)
+    if settings.BRIEFING_SYNC_SECONDS > 0:
+        # the validators of the briefing make its later syncs conditional
+        background_tasks.add_task(
+            briefing_synchronizer.seed_agent, str(agent.id), agent_in.briefing
+        )
+    background_tasks.add_task(warm_up_agent, str(agent.id))
 
     return AIAgentIdResponse(agent_id=str(agent.id))
 
@@ -85,7 +95,9 @@ async def create_agent(
     },
     status_code=200,
 )
-async def activate_agent(agent_id: str, session: SessionDep) -> None:
+async def activate_agent(
+    agent_id: str, session: SessionDep, background_tasks: BackgroundTasks
+) -> None:
     """
     Activate agent.
 
@@ -108,6 +120,7 @@ async def activate_agent(agent_id: str, session: SessionDep) -> None:
 
     # Activate agent
     crud.activate_ai_agent(session=session, ai_agent=agent)
+    background_tasks.add_task(warm_up_agent, str(agent.id))
 
 
 @router.post(
@@ -142,6 +155,8 @@ async def deactivate_agent(agent_id: str, session: SessionDep) -> None:
 
     # Deactivate agent
     crud.deactivate_ai_agent(session=session, ai_agent=agent)
+    agent_manager.discard_speculative_idea(agent.id)
+    token_usage_tracker.forget(str(agent.id))
 
 
 @router.put(
@@ -153,7 +168,11 @@ async def deactivate_agent(agent_id: str, session: SessionDep) -> None:
     status_code=200,
 )
 async def update_agent_briefing(
-    *, agent_id: str, briefing_in: AIBriefing2Base, session: SessionDep
+    *,
+    agent_id: str,
+    briefing_in: AIBriefing2Base,
+    session: SessionDep,
+    background_tasks: BackgroundTasks,
 ) -> Any:
     """
     Updates the briefing of an existing agent.
@@ -185,6 +204,9 @@ async def update_agent_briefing(
         agent_id=str(agent.id),
         briefing_refs=briefing_in.workspace_info_references,
     )
+    # a pre-generated idea was based on the previous briefing
+    agent_manager.discard_speculative_idea(agent.id)
+    background_tasks.add_task(warm_up_agent, str(agent.id))
     return None
 
 
@@ -33,12 +33,13 @@ async def validate_api_key(*, agent_config: AIAgentConfigBase) -> None:
 
     To Do:
         - Make it model dependent. At the moment it only works for
-          for OpenAI.
+          for OpenAI and OpenAI compatible APIs (api_url).
     """
     api_key = agent_config.api_key
     org_id = agent_config.org_id
     llm_model = agent_config.model
+    api_url = agent_config.api_url
     try:
-        await is_api_key_valid(api_key, org_id, llm_model)
+        await is_api_key_valid(api_key, org_id, llm_model, api_url)
     except HTTPException as http_exc:
         raise http_exc
@@ -4,20 +4,51 @@ from fastapi import APIRouter, BackgroundTasks
 
 from app import crud
 from app.api.deps import SessionDep
+from app.core.config import settings
 from app.models import Idea, IdeaBase, IdeaGenerationData
-from app.orchestration.prompts.dynamic import generate_idea_and_post
+from app.orchestration.data import xleap_breakers
+from app.orchestration.prompts.dynamic import (
+    SPECULATIVE_STRATEGY_TYPES,
+    generate_idea_and_post,
+    pregenerate_idea,
+)
 from app.utils import (
     agent_manager,
     check_if_idea_exists,
     delete_idea_by_agent_and_id,
     get_agent_by_id,
     get_last_ai_idea,
+    get_prompt_strategy,
+    is_speculative_idea_stale,
     should_ai_post_new_idea,
 )
 
 router = APIRouter()
 
 
+def _needs_speculative_idea(agent, session: SessionDep) -> bool:
+    """
+    Checks whether a candidate idea must be pre-generated for the agent, i.e.
+    its prompt strategy supports speculative ideas and it has none or its
+    candidate became stale. A stale candidate is discarded.
+    :param agent: the agent object
+    :param session: the database session
+    :return: True if a candidate must be generated
+    """
+    strategy = get_prompt_strategy(
+        agent_id=agent.id, host_id=agent.host_id, session=session
+    )
+    if strategy.type not in SPECULATIVE_STRATEGY_TYPES:
+        return False
+    candidate = agent_manager.get_speculative_idea(agent.id)
+    if candidate is None:
+        return True
+    if is_speculative_idea_stale(session, agent.id, candidate):
+        agent_manager.discard_speculative_idea(agent.id)
+        return True
+    return False
+
+
 def _maybe_kick_idea_generation(
     agent,
     agent_id: str,
@@ -40,6 +71,14 @@ def _maybe_kick_idea_generation(
         logging.info(f"Agent {agent.id} is not active")
         return
 
+    # do not spend LLM tokens on ideas which XLeap cannot take right now
+    if xleap_breakers.should_pause_generation(agent.server_address):
+        logging.info(
+            f"Agent {agent.id} is paused, "
+            f"XLeap server {agent.server_address} is unavailable"
+        )
+        return
+
     lock = agent_manager.try_acquire_generation_lock(agent.id)
     if lock.acquired:
         was_tasked = False
@@ -68,11 +107,26 @@ def _maybe_kick_idea_generation(
                     1,
                     None,
                 )
+                was_tasked = True
+            elif settings.SPECULATIVE_GENERATION and _needs_speculative_idea(
+                agent, session
+            ):
+                # use the idle time to prepare the (next) idea
+                background_tasks.add_task(
+                    pregenerate_idea,
+                    str(agent.id),
+                    agent.host_id,
+                    lock,
+                )
+                was_tasked = True
         finally:
             if not was_tasked:
                 lock.release()
     else:
         logging.info(f"Agent {agent.id} lock was already held")
+        if settings.SPECULATIVE_GENERATION:
+            # the trigger is evaluated once a pre-generation completes
+            agent_manager.add_pending_trigger(agent.id)
 
 
 @router.post(
@@ -265,6 +319,7 @@ async def generate_idea_(
     background_tasks.add_task(
         generate_idea_and_post,
         str(agent.id),
+        agent.host_id,
         lock,
         config.num_items,
         config.reference,
@@ -0,0 +1,60 @@
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.orchestration.briefing_sync import briefing_synchronizer
+from app.orchestration.data import (
+    dns_resolver,
+    idea_outbox,
+    xleap_breakers,
+    xleap_client,
+)
+from app.orchestration.llm import (
+    generation_batcher,
+    latency_recorder,
+    rate_limiter,
+    token_usage_tracker,
+)
+from app.orchestration.prompts import prompt_cache, tracer
+from app.utils import prompt_name_resolver
+
+router = APIRouter()
+
+
+@router.get("/", status_code=200)
+def read_metrics() -> Any:
+    """
+    Returns runtime metrics of the LLM usage.
+
+    Returns:
+        rate_limits: the rate limit state and the throttling time per API key
+          (keys are identified by a hash)
+        token_usage: the token usage per agent, including the streamed calls
+          whose usage is not reported
+        llm_calls: attempts, hedged calls, failures and latency percentiles
+          of the LLM calls per job type
+        batching: the number of batched jobs and the requests they needed
+        prompt_cache: hit ratio and refresh latency of the Langfuse prompt cache
+        xleap: requests, errors and new or reused connections per XLeap host
+        xleap_breakers: the circuit breaker state per XLeap host
+        outbox: stored, delivered, retried and dead-lettered ideas
+        dns: hits, misses and failed lookups of the DNS cache
+        tracing: the sampled and skipped jobs
+        briefing_sync: fetched, not modified and updated briefings
+        prompt_names: hits, misses and created prompts of the resolution of
+          XLeap templates to Langfuse prompts
+    """
+    return {
+        "rate_limits": rate_limiter.stats(),
+        "token_usage": token_usage_tracker.stats(),
+        "llm_calls": latency_recorder.stats(),
+        "batching": generation_batcher.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "xleap": xleap_client.stats(),
+        "xleap_breakers": xleap_breakers.stats(),
+        "outbox": idea_outbox.stats(),
+        "dns": dns_resolver.stats(),
+        "tracing": tracer.stats(),
+        "briefing_sync": briefing_synchronizer.stats(),
+        "prompt_names": prompt_name_resolver.stats(),
+    }
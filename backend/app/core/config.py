@@ -58,6 +58,110 @@ class Settings(BaseSettings):
     LANGFUSE_USER_ID: str
     HTTP_PROXY: str | None = None
 
+    # Lay out the idea history as an append-only prefix, so that providers
+    # can cache the prompt prefix across generations of the same agent
+    PROMPT_PREFIX_CACHING: bool = False
+    # The number of ideas (by idea count) which form one cacheable block
+    PROMPT_PREFIX_CHUNK_SIZE: int = 10
+    # The number of agents whose token usage is reported by the metrics
+    TOKEN_USAGE_MAX_AGENTS: int = 1024
+
+    # Keep one candidate idea per agent pre-generated in the background, so it
+    # can be posted as soon as the agent is triggered
+    SPECULATIVE_GENERATION: bool = False
+    # A candidate is regenerated if more human ideas arrived since it was generated
+    SPECULATIVE_MAX_NEW_IDEAS: int = 3
+    # A candidate is regenerated if it is this similar (0..1) to a newer idea
+    SPECULATIVE_MAX_SIMILARITY: float = 0.6
+    # A candidate is regenerated if it is older than this (seconds)
+    SPECULATIVE_MAX_AGE_SECONDS: int = 600
+
+    # The time (seconds) a generation job may take, by job type
+    LLM_DEADLINE_ON_DEMAND_SECONDS: float = 60
+    LLM_DEADLINE_PERIODIC_SECONDS: float = 180
+    LLM_DEADLINE_TEST_SECONDS: float = 120
+    # The timeout (seconds) of a single LLM request
+    LLM_ATTEMPT_TIMEOUT_SECONDS: float = 45
+    # The number of attempts of an LLM call within the deadline
+    LLM_MAX_ATTEMPTS: int = 3
+    # The base delay (seconds) of the jittered exponential backoff
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 1.0
+    # Send a duplicate request for on-demand jobs once an attempt is slower
+    # than this latency percentile (0..1) of the previous calls
+    LLM_HEDGE_ON_DEMAND: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.9
+
+    # Submit the generations of agents triggered at the same time together
+    # (multi-choice requests for identical prompts)
+    GENERATION_BATCHING: bool = False
+    # The time (milliseconds) a generation waits for other jobs of its batch
+    GENERATION_BATCH_WINDOW_MS: int = 50
+
+    # Langfuse prompts older than this (seconds) are refreshed in the background
+    PROMPT_CACHE_TTL_SECONDS: int = 300
+    # The time (seconds) until a failed refresh is retried, meanwhile the
+    # cached prompt is served
+    PROMPT_CACHE_RETRY_SECONDS: int = 30
+    # The interval (seconds) of the synchronization of the local copies of
+    # the Langfuse prompts, 0 disables it
+    PROMPT_STORE_SYNC_SECONDS: int = 3600
+    # The number of prompts fetched concurrently for one system prompt
+    PROMPT_FETCH_CONCURRENCY: int = 8
+    # The share (0..1) of generation jobs traced in Langfuse per job type
+    LANGFUSE_SAMPLE_RATE_ON_DEMAND: float = 1.0
+    LANGFUSE_SAMPLE_RATE_PERIODIC: float = 0.25
+    LANGFUSE_SAMPLE_RATE_TEST: float = 1.0
+    # The export of trace events to Langfuse: the events per batch, the max
+    # delay (seconds) of a batch and the number of export threads
+    LANGFUSE_FLUSH_AT: int = 50
+    LANGFUSE_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LANGFUSE_EXPORT_THREADS: int = 1
+    # The number of XLeap templates whose Langfuse prompt names are cached
+    BRIEFING_PROMPT_CACHE_SIZE: int = 4096
+    # The connections to XLeap servers: overall and per host limits, idle
+    # seconds until a connection is closed, timeouts (seconds)
+    XLEAP_MAX_CONNECTIONS: int = 100
+    XLEAP_MAX_CONNECTIONS_PER_HOST: int = 20
+    XLEAP_KEEPALIVE_SECONDS: float = 30.0
+    XLEAP_TIMEOUT_SECONDS: float = 30.0
+    XLEAP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    # The circuit breaker of each XLeap server: consecutive failed deliveries
+    # until generations are paused, seconds until a probe request is sent,
+    # seconds until a probe without outcome expires
+    XLEAP_BREAKER_FAILURE_THRESHOLD: int = 5
+    XLEAP_BREAKER_OPEN_SECONDS: float = 30.0
+    XLEAP_BREAKER_PROBE_TIMEOUT_SECONDS: float = 60.0
+    # The DNS cache of the XLeap hosts: seconds resolved and unresolvable
+    # hosts are cached, number of cached hosts, timeout (seconds) of a lookup
+    DNS_CACHE_TTL_SECONDS: float = 300.0
+    DNS_NEGATIVE_TTL_SECONDS: float = 30.0
+    DNS_CACHE_SIZE: int = 1024
+    DNS_TIMEOUT_SECONDS: float = 5.0
+    # The ideas of an LLM stream waiting to be posted (in the order they
+    # were streamed)
+    IDEA_STREAM_QUEUE_SIZE: int = 32
+    # The interval (seconds) of the synchronization of the briefings of the
+    # active agents with XLeap, 0 disables it, and the number of briefings
+    # fetched concurrently
+    BRIEFING_SYNC_SECONDS: int = 0
+    BRIEFING_SYNC_CONCURRENCY: int = 8
+    # The delivery of generated ideas from the outbox to XLeap: seconds
+    # between the checks for due ideas, seconds a delivery is leased to one
+    # worker, attempts until an idea is dead-lettered, first and maximum
+    # backoff (seconds) between attempts, ideas loaded per host and check
+    IDEA_OUTBOX_POLL_SECONDS: float = 5.0
+    IDEA_OUTBOX_LEASE_SECONDS: float = 60.0
+    IDEA_OUTBOX_MAX_ATTEMPTS: int = 12
+    IDEA_OUTBOX_BACKOFF_SECONDS: float = 2.0
+    IDEA_OUTBOX_MAX_BACKOFF_SECONDS: float = 600.0
+    IDEA_OUTBOX_BATCH_SIZE: int = 200
+    # The maximum seconds the shutdown waits for running generations, then
+    # for the export of the queued traces
+    SHUTDOWN_DRAIN_SECONDS: float = 20.0
+    SHUTDOWN_FLUSH_SECONDS: float = 5.0
+    # Warm up all active agents (prompts, DNS, LLM connection) on startup
+    WARM_UP_ON_STARTUP: bool = True
+
     @computed_field  # type: ignore[misc]
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
@@ -13,6 +13,7 @@ from app.utils import (
     get_briefing2_references_by_agent,
     langfuse_base_from_briefing_base,
     langfuse_base_from_briefing_reference_base,
+    langfuse_bases_from_briefing_reference_bases,
 )
 
 
@@ -188,6 +189,17 @@ def replace_briefing2_references(
     }
     existing_map = {ref.ref_id: ref for ref in existing}
 
+    # resolve all templates at once, before the session holds any change
+    langfuse_ref_bases = dict(
+        zip(
+            new_map,
+            langfuse_bases_from_briefing_reference_bases(
+                session, list(new_map.values())
+            ),
+            strict=True,
+        )
+    )
+
     updated_refs = []
 
     # update existing or delete no longer needed references
@@ -195,13 +207,9 @@ def replace_briefing2_references(
         if existing_id in new_map:
             new_ref = new_map.get(existing_id)
 
-            langfuse_ref_base = langfuse_base_from_briefing_reference_base(
-                session, new_ref
-            )
-
             db_obj = _validate_briefing2_reference(
                 briefing_ref_base=new_ref,
-                langfuse_ref_base=langfuse_ref_base,
+                langfuse_ref_base=langfuse_ref_bases[existing_id],
                 agent_id=agent_id,
             )
             session.merge(db_obj)
@@ -212,12 +220,9 @@ def replace_briefing2_references(
     for new_id in new_map:
         if new_id not in existing_map:
             new_ref = new_map.get(new_id)
-            langfuse_ref_base = langfuse_base_from_briefing_reference_base(
-                session, new_ref
-            )
             db_obj = _validate_briefing2_reference(
                 briefing_ref_base=new_ref,
-                langfuse_ref_base=langfuse_ref_base,
+                langfuse_ref_base=langfuse_ref_bases[new_id],
                 agent_id=agent_id,
             )
             session.add(db_obj)
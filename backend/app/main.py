@@ -1,3 +1,8 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import AsyncIterator
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
@@ -5,12 +10,72 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.orchestration.briefing_sync import briefing_synchronizer
+from app.orchestration.data import idea_outbox, xleap_client
+from app.orchestration.llm import close_http_clients, wait_for_running_jobs
+from app.orchestration.prompts import (
+    close_langfuse_client,
+    prompt_cache,
+    run_prompt_store_sync,
+)
+from app.orchestration.warmup import warm_up_active_agents
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+async def _load_prompt_store() -> None:
+    # the stored prompts make the first generations independent of Langfuse
+    try:
+        await prompt_cache.load_store()
+    except Exception as err:
+        logging.warning(f"Loading the prompt store failed: {err}")
+
+
+async def _shut_down(background_tasks: list[asyncio.Task]) -> None:
+    for task in background_tasks:
+        task.cancel()
+
+    if not await wait_for_running_jobs(settings.SHUTDOWN_DRAIN_SECONDS):
+        logging.warning("Shutting down while generations are still running")
+
+    # export the queued traces, the Langfuse client blocks
+    try:
+        async with asyncio.timeout(settings.SHUTDOWN_FLUSH_SECONDS):
+            await asyncio.to_thread(close_langfuse_client)
+    except TimeoutError:
+        logging.warning("Traces were not exported before the shutdown")
+
+    await close_http_clients()
+    await xleap_client.close()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """
+    Creates the background tasks on startup. On shutdown the running
+    generations are drained, the queued traces exported and the clients
+    closed, each within a bounded time.
+    """
+    await _load_prompt_store()
+    # ideas which were not delivered before (e.g. a restart) are delivered
+    background_tasks = [asyncio.create_task(idea_outbox.run())]
+    if settings.PROMPT_STORE_SYNC_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_prompt_store_sync()))
+    if settings.BRIEFING_SYNC_SECONDS > 0:
+        background_tasks.append(
+            asyncio.create_task(briefing_synchronizer.run())
+        )
+    if settings.WARM_UP_ON_STARTUP:
+        # do not delay the startup, the agents are warmed up in the background
+        background_tasks.append(asyncio.create_task(warm_up_active_agents()))
+
+    yield
+
+    await _shut_down(background_tasks)
+
+
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
@@ -18,6 +83,7 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
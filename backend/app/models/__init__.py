@@ -30,6 +30,7 @@ from .briefings import (
     BriefingCategory,
     BriefingSubCategory,
     BriefingSubCategoryDifferentiator,
+    BriefingSyncState,
     XLeapBriefingPrompt,
     BriefingTextResponse,
 )
@@ -37,9 +38,11 @@ from .ideas import (
     Idea,
     IdeaBase,
     IdeaGenerationData,
+    OutboxIdea,
+    OutboxIdeaStatus,
 )
 
-from .prompts import PromptStrategyType, PromptStrategy
+from .prompts import LangfusePrompt, PromptStrategyType, PromptStrategy
 
 from .varia import Message, NewPassword, Token, TokenPayload
 
@@ -60,13 +63,17 @@ __all__ = [
     "BriefingCategory",
     "BriefingSubCategory",
     "BriefingSubCategoryDifferentiator",
+    "BriefingSyncState",
     "BriefingTextResponse",
     "Field",
     "Idea",
     "IdeaBase",
     "IdeaGenerationData",
+    "LangfusePrompt",
     "Message",
     "NewPassword",
+    "OutboxIdea",
+    "OutboxIdeaStatus",
     "PromptStrategy",
     "PromptStrategyType",
     "Relationship",
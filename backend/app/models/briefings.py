@@ -1,5 +1,6 @@
 import enum
 import uuid as uuid_pkg
+from datetime import datetime
 
 from sqlmodel import (
     Column,
@@ -173,7 +174,9 @@ class XLeapBriefingPrompt(SQLModel, table=True):
     in Langfuse.
     Because a language key may change over time and the microservice
     can potentially be used by multiple XLeap applications the mapping
-    occurs purly on the text
+    occurs purly on the text.
+    Templates can be long, therefore the primary key contains the SHA-256
+    digest of the template instead of the template
     """
 
     __tablename__ = "xleap_briefing_prompt"
@@ -181,7 +184,7 @@ class XLeapBriefingPrompt(SQLModel, table=True):
         PrimaryKeyConstraint(
             "category",
             "sub_category",
-            "template",
+            "template_digest",
             name="xleap_briefing_prompt_pk",
         ),
     )
@@ -191,6 +194,8 @@ class XLeapBriefingPrompt(SQLModel, table=True):
     sub_category: str = Column(String(50))
     template: str = Column(Text)
     """ The prompt template """
+    template_digest: str = Column(String(64))
+    """ The SHA-256 digest (hex) of the template """
     langfuse_prompt: str
     """ The name of the prompt in langfuse """
 
@@ -528,3 +533,24 @@ class Briefing2Reference(SQLModel, table=True):
 
 class BriefingTextResponse(SQLModel):
     text: str
+
+
+class BriefingSyncState(SQLModel, table=True):
+    """
+    The validators of the briefing of an agent as last fetched from XLeap.
+    They are sent with the next fetch, XLeap answers 304 Not Modified if the
+    briefing did not change.
+    """
+
+    __tablename__ = "briefing_sync_state"
+
+    agent_id: uuid_pkg.UUID = Field(
+        default=None, foreign_key="ai_agent.id", primary_key=True
+    )
+    etag: str | None = None
+    """ the ETag of the last response, sent as If-None-Match """
+    last_modified: str | None = None
+    """ the Last-Modified of the last response, sent as If-Modified-Since """
+    digest: str | None = Field(default=None, sa_column=Column(String(64)))
+    """ sha256 of the last briefing, detects unchanged briefings without validators """
+    synced_at: datetime = Field(default_factory=datetime.utcnow)
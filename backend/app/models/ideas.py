@@ -1,7 +1,8 @@
+import enum
 import uuid as uuid_pkg
 from datetime import datetime
 
-from sqlmodel import Field, SQLModel
+from sqlmodel import Column, Field, SQLModel, String, Text
 
 
 class IdeaBase(SQLModel):
@@ -48,3 +49,46 @@ class IdeaGenerationData(SQLModel):
     """
     num_items: int
     """ the number of items to generate """
+
+
+class OutboxIdeaStatus(enum.StrEnum):
+    PENDING = "pending"
+    """ waiting for its (next) delivery attempt """
+    DEAD = "dead"
+    """ XLeap refused the idea or all attempts failed, it is not retried """
+
+
+class OutboxIdea(SQLModel, table=True):
+    """
+    A generated idea waiting for its delivery to XLeap.
+    Ideas are stored before they are posted and deleted once XLeap accepted
+    them, hence an idea is not lost if XLeap is unavailable.
+    """
+
+    __tablename__ = "idea_outbox"
+
+    id: uuid_pkg.UUID = Field(
+        default_factory=uuid_pkg.uuid4,
+        primary_key=True,
+        nullable=False,
+    )
+    """ also the idempotency key of the delivery """
+    agent_id: uuid_pkg.UUID = Field(
+        default=None, foreign_key="ai_agent.id", nullable=False
+    )
+    host: str = Field(index=True)
+    """ the XLeap host, ideas of a host are delivered in order """
+    url: str = Field(sa_column=Column(Text, nullable=False))
+    payload: str = Field(sa_column=Column(Text, nullable=False))
+    """ the JSON body of the post """
+    status: str = Field(
+        default=OutboxIdeaStatus.PENDING,
+        sa_column=Column(String(20), nullable=False, index=True),
+    )
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    """ pending ideas are not delivered before, also the lease of a delivery """
+    last_error: str | None = Field(default=None, sa_column=Column(Text))
+    created_at: datetime = Field(
+        default_factory=datetime.utcnow, nullable=False
+    )
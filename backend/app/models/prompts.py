@@ -1,7 +1,8 @@
 import enum
 import uuid as uuid_pkg
+from datetime import datetime
 
-from sqlmodel import Column, Field, SQLModel, String
+from sqlmodel import Column, Field, SQLModel, String, Text
 
 
 class PromptStrategyType(enum.StrEnum):
@@ -39,3 +40,22 @@ class PromptStrategy(SQLModel, table=True):
     """ optional default None, if specified the agent with the given UID will use this strategy """
     host_id: str = Field(None, nullable=True)
     """ optional default None, if specified and a host created an agent it will be using this strategy """
+
+
+class LangfusePrompt(SQLModel, table=True):
+    """
+    The local copy of a (text) prompt of Langfuse.
+    Prompts are read from this table if they are not cached yet, hence
+    generations do not depend on Langfuse after the first start.
+    """
+
+    __tablename__ = "langfuse_prompt"
+
+    name: str = Field(primary_key=True)
+    """ the name of the prompt in Langfuse """
+    version: int | None = Field(default=None, nullable=True)
+    """ the version of the prompt in Langfuse, None if unknown """
+    prompt: str = Field(sa_column=Column(Text, nullable=False))
+    """ the prompt text with {{variables}} """
+    synced_at: datetime = Field(default_factory=datetime.utcnow)
+    """ when the prompt was last stored """
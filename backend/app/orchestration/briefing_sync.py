@@ -0,0 +1,203 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app import crud
+from app.core.config import settings
+from app.core.db import engine as db_engine
+from app.models import AIAgent, AIBriefing2Base, BriefingSyncState
+from app.orchestration.data import FetchedBriefing, get_agent_briefing
+from app.orchestration.warmup import warm_up_agent
+from app.utils import agent_manager, get_agent_by_id
+
+
+class BriefingSynchronizer:
+    """
+    Keeps the briefings of the agents current with XLeap. A briefing is
+    revalidated with the ETag and Last-Modified of its previous fetch, hence
+    an unchanged briefing costs a 304 response instead of the full payload,
+    and no database writes. Briefings of servers without validators are
+    compared by digest. Many agents are synchronized concurrently, bounded
+    by settings.BRIEFING_SYNC_CONCURRENCY.
+    """
+
+    def __init__(
+        self,
+        engine: Engine | None = None,
+        concurrency: int = settings.BRIEFING_SYNC_CONCURRENCY,
+    ):
+        # None: the engine of the service
+        self._engine = engine or db_engine
+        self._concurrency = max(1, concurrency)
+        self._fetched = 0
+        self._not_modified = 0
+        self._unchanged = 0
+        self._updated = 0
+        self._errors = 0
+
+    def _load(self, agent_id: str) -> tuple[AIAgent, BriefingSyncState]:
+        with Session(self._engine) as session:
+            agent = get_agent_by_id(agent_id, session)
+            state = session.get(BriefingSyncState, agent.id)
+            if state is None:
+                state = BriefingSyncState(agent_id=agent.id)
+            return agent, state
+
+    def _store(
+        self,
+        agent: AIAgent,
+        state: BriefingSyncState,
+        fetched: FetchedBriefing,
+        stored_briefing: AIBriefing2Base | None = None,
+    ) -> bool:
+        """
+        stores the fetched briefing if it changed and the validators
+        :param stored_briefing: (optional) the briefing the agent has, it is
+          not written again if XLeap sent the same
+        :return: whether the briefing was updated
+        """
+        changed = (
+            fetched.briefing is not None and fetched.digest != state.digest
+        )
+        updated = changed and fetched.briefing != stored_briefing
+        with Session(self._engine) as session:
+            if updated:
+                crud.create_or_update_ai_agent_briefing2(
+                    session=session,
+                    ai_agent=agent,
+                    briefing_base=fetched.briefing,
+                )
+                crud.replace_briefing2_references(
+                    session=session,
+                    agent_id=str(agent.id),
+                    briefing_refs=[
+                        *(fetched.briefing.workspace_info_references or []),
+                        *(fetched.briefing.exemplar_references or []),
+                    ],
+                )
+            if changed:
+                state.digest = fetched.digest
+            state.etag = fetched.etag
+            state.last_modified = fetched.last_modified
+            state.synced_at = datetime.utcnow()
+            session.merge(state)
+            session.commit()
+        return updated
+
+    def _load_active_agent_ids(self) -> list[str]:
+        with Session(self._engine) as session:
+            return [
+                str(agent_id)
+                for agent_id in session.exec(
+                    select(AIAgent.id).where(AIAgent.is_active == True)  # noqa
+                ).all()
+            ]
+
+    async def sync_agent(
+        self, agent_id: str, stored_briefing: AIBriefing2Base | None = None
+    ) -> bool:
+        """
+        Fetches the briefing of an agent from XLeap and stores it if it changed.
+        The database is accessed in a thread, no connection is held while
+        XLeap is requested.
+        :param agent_id: the ID of the agent
+        :param stored_briefing: (optional) the briefing the agent has, if XLeap
+          sends the same only its validators are stored
+        :return: whether the briefing was updated
+        """
+        agent, state = await asyncio.to_thread(self._load, agent_id)
+        fetched = await get_agent_briefing(
+            agent, etag=state.etag, last_modified=state.last_modified
+        )
+        self._fetched += 1
+
+        changed = await asyncio.to_thread(
+            self._store, agent, state, fetched, stored_briefing
+        )
+        if fetched.briefing is None:
+            self._not_modified += 1
+        elif not changed:
+            self._unchanged += 1
+        else:
+            self._updated += 1
+            # a pre-generated idea was based on the previous briefing
+            agent_manager.discard_speculative_idea(agent.id)
+            await warm_up_agent(agent_id)
+        return changed
+
+    async def seed_agent(
+        self, agent_id: str, briefing: AIBriefing2Base
+    ) -> None:
+        """
+        Stores the validators of the briefing of a new agent, so its later
+        syncs are conditional. The briefing the agent was created with is
+        neither written nor warmed up again unless XLeap sends a different
+        one. Failures are logged only.
+        :param agent_id: the ID of the agent
+        :param briefing: the briefing the agent was created with
+        """
+        try:
+            await self.sync_agent(agent_id, stored_briefing=briefing)
+        except Exception as err:
+            self._errors += 1
+            logging.warning(
+                f"Seeding the briefing sync of agent {agent_id} failed: {err}"
+            )
+
+    async def sync_agents(self, agent_ids: list[str] | None = None) -> int:
+        """
+        Synchronizes the briefings of many agents concurrently, failures are
+        logged only
+        :param agent_ids: (optional) default all active agents
+        :return: the number of updated briefings
+        """
+        if agent_ids is None:
+            agent_ids = await asyncio.to_thread(self._load_active_agent_ids)
+
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def sync(agent_id: str) -> bool:
+            async with semaphore:
+                try:
+                    return await self.sync_agent(agent_id)
+                except Exception as err:
+                    self._errors += 1
+                    logging.warning(
+                        f"Syncing the briefing of agent {agent_id} failed: "
+                        f"{err}"
+                    )
+                    return False
+
+        updated = await asyncio.gather(
+            *(sync(agent_id) for agent_id in agent_ids)
+        )
+        return sum(updated)
+
+    async def run(self):
+        """
+        Synchronizes the briefings of all active agents every
+        settings.BRIEFING_SYNC_SECONDS (forever)
+        """
+        while True:
+            await asyncio.sleep(settings.BRIEFING_SYNC_SECONDS)
+            try:
+                updated = await self.sync_agents()
+                logging.info(f"Synced briefings, {updated} updated")
+            except Exception as err:
+                logging.warning(f"Syncing the briefings failed: {err}")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "fetched": self._fetched,
+            "not_modified": self._not_modified,
+            "unchanged": self._unchanged,
+            "updated": self._updated,
+            "errors": self._errors,
+        }
+
+
+briefing_synchronizer = BriefingSynchronizer()
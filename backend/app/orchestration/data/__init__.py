@@ -1,4 +1,41 @@
 # isort: skip_file
-from .dns import resolve_host, resolve_server_addr  # noqa
+from .dns import (  # noqa
+    CachingResolver,
+    dns_resolver,
+    resolve_host,
+    resolve_server_addr,
+    resolve_server_addr_async,
+)
+from .xleap_client import XLeapClient, xleap_client  # noqa
+from .circuit_breaker import (  # noqa
+    BreakerState,
+    CircuitBreaker,
+    XLeapCircuitBreakers,
+    xleap_breakers,
+)
+from .agents import (  # noqa
+    FetchedBriefing,
+    deactivate_refused_agent,
+    get_agent_briefing,
+)
+from .idea_outbox import IdeaOutbox, idea_outbox, is_transient_error  # noqa
 
-__all__ = ["resolve_host", "resolve_server_addr"]
+__all__ = [
+    "BreakerState",
+    "CircuitBreaker",
+    "CachingResolver",
+    "FetchedBriefing",
+    "IdeaOutbox",
+    "deactivate_refused_agent",
+    "dns_resolver",
+    "get_agent_briefing",
+    "idea_outbox",
+    "is_transient_error",
+    "resolve_host",
+    "resolve_server_addr",
+    "resolve_server_addr_async",
+    "XLeapCircuitBreakers",
+    "XLeapClient",
+    "xleap_breakers",
+    "xleap_client",
+]
@@ -1,21 +1,78 @@
+import hashlib
 import logging
+from typing import NamedTuple
 
-import aiohttp
+from sqlmodel import Session
 
-from app.models import AIAgent
+from app.models import AIAgent, AIBriefing2Base
+from app.orchestration.llm.usage import token_usage_tracker
+
+from .xleap_client import xleap_client
+
+
+class FetchedBriefing(NamedTuple):
+    briefing: AIBriefing2Base | None
+    """ None if the briefing was not modified """
+    etag: str | None
+    last_modified: str | None
+    digest: str | None
+    """ sha256 of the briefing, None if it was not modified """
+
+
+def deactivate_refused_agent(
+    err: BaseException, agent: AIAgent, session: Session
+) -> bool:
+    """
+    Deactivates the agent if XLeap refused it with one of these HTTP status
+      402 Payment Required - if the XLeap subscription expired
+      409 Conflict - when an agent is not supposed to be active
+
+    :param err: the error of the XLeap request
+    :param agent: the agent (attached to the session)
+    :param session: the DB session, the deactivation is committed
+    :return: whether the agent must be deactivated
+    """
+    status = getattr(err, "status", None)
+    # 402 payment required => XLeap license expired
+    if status == 402:
+        logging.info(
+            f"XLeap subscription expired, agent {agent.id} is being deactivated"
+        )
+    # 409 conflict => The agent should not be generating content since it was deactivated
+    elif status == 409:
+        logging.info(
+            f"Agent {agent.id} should not have been active, deactivating"
+        )
+    else:
+        return False
+
+    # update the agent object before changing it
+    session.refresh(agent)
+    if agent.is_active:
+        agent.is_active = False
+        session.merge(agent)
+        session.commit()
+    token_usage_tracker.forget(str(agent.id))
+    return True
 
 
 async def get_agent_briefing(
     agent: AIAgent,
-) -> None:
+    etag: str | None = None,
+    last_modified: str | None = None,
+) -> FetchedBriefing:
     """
-    Get briefing for the agent from XLeap server and store it in the database.
+    Get briefing for the agent from XLeap server. The validators of a previous
+    fetch revalidate the briefing, XLeap does not send it again if it was not
+    modified.
 
     Args:
         agent (AIAgent): Agent of which the briefing is to be fetched
+        etag (str): (optional) the ETag of the previous fetch
+        last_modified (str): (optional) the Last-Modified of the previous fetch
 
     Returns
-        None
+        FetchedBriefing: the briefing (None if not modified) and its validators
     """
     logging.info(
         f"""
@@ -27,13 +84,34 @@ async def get_agent_briefing(
     """
     )
 
+    headers = {"Authorization": f"Bearer {agent.secret}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
     # Get agent briefing from XLeap server
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            url=f"{agent.server_address}/services/api/sessions"
-            f"/{agent.session_id}/workspaces/"
-            f"{agent.workspace_id}/settings/ai/{agent.instance_id}",
-            headers={"Authorization": f"Bearer {agent.secret}"},
-        ) as agent_briefing_obj:
-            agent_briefing = await agent_briefing_obj.json()
-            logging.info(f"Agent briefing: {agent_briefing}")
+    async with xleap_client.request(
+        "GET",
+        url=f"{agent.server_address}/services/api/sessions"
+        f"/{agent.session_id}/workspaces/"
+        f"{agent.workspace_id}/settings/ai/{agent.instance_id}",
+        headers=headers,
+    ) as response:
+        if response.status == 304:
+            return FetchedBriefing(
+                briefing=None,
+                etag=response.headers.get("ETag", etag),
+                last_modified=response.headers.get(
+                    "Last-Modified", last_modified
+                ),
+                digest=None,
+            )
+        response.raise_for_status()
+        body = await response.read()
+        return FetchedBriefing(
+            briefing=AIBriefing2Base.model_validate_json(body),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            digest=hashlib.sha256(body).hexdigest(),
+        )
@@ -0,0 +1,150 @@
+import enum
+import time
+from typing import Any
+
+from yarl import URL
+
+from app.core.config import settings
+
+
+class BreakerState(enum.StrEnum):
+    CLOSED = "closed"
+    """ the server is healthy """
+    OPEN = "open"
+    """ the server failed, generations of its agents are paused """
+    HALF_OPEN = "half_open"
+    """ the pause is over, one probe request checks if the server recovered """
+
+
+class CircuitBreaker:
+    """
+    The health of one XLeap server. The breaker opens after consecutive
+    failed deliveries. Once open, it waits for open_seconds, then lets one
+    probe request through (half-open): its success closes the breaker, its
+    failure opens it again. A probe without outcome expires after
+    probe_timeout_seconds.
+    All access happens in the event loop.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = settings.XLEAP_BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = settings.XLEAP_BREAKER_OPEN_SECONDS,
+        probe_timeout_seconds: float = (
+            settings.XLEAP_BREAKER_PROBE_TIMEOUT_SECONDS
+        ),
+    ):
+        self._failure_threshold = failure_threshold
+        self._open_seconds = open_seconds
+        self._probe_timeout_seconds = probe_timeout_seconds
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probe_until: float | None = None
+        self.times_opened = 0
+        self.paused_generations = 0
+
+    @property
+    def state(self) -> BreakerState:
+        if self._opened_at is None:
+            return BreakerState.CLOSED
+        if time.monotonic() < self._opened_at + self._open_seconds:
+            return BreakerState.OPEN
+        return BreakerState.HALF_OPEN
+
+    def _is_probing(self) -> bool:
+        return (
+            self._probe_until is not None
+            and time.monotonic() < self._probe_until
+        )
+
+    def allow(self) -> bool:
+        """
+        whether a request may be sent, in half-open state the caller sends
+        the probe and must report its outcome (or release the probe)
+        """
+        match self.state:
+            case BreakerState.CLOSED:
+                return True
+            case BreakerState.OPEN:
+                return False
+        if self._is_probing():
+            return False
+        self._probe_until = time.monotonic() + self._probe_timeout_seconds
+        return True
+
+    def release_probe(self):
+        """releases a probe which was allowed but not sent"""
+        self._probe_until = None
+
+    def is_paused(self) -> bool:
+        """
+        whether generations must wait: while the breaker is open and while a
+        probe checks the server
+        """
+        state = self.state
+        return state == BreakerState.OPEN or (
+            state == BreakerState.HALF_OPEN and self._is_probing()
+        )
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._probe_until = None
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_until = None
+        # a failed probe opens the breaker again
+        if (
+            self._opened_at is not None
+            or self._failures >= self._failure_threshold
+        ):
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": str(self.state),
+            "consecutive_failures": self._failures,
+            "times_opened": self.times_opened,
+            "paused_generations": self.paused_generations,
+        }
+
+
+class XLeapCircuitBreakers:
+    """
+    The circuit breakers of the XLeap servers, keyed by host. Many agents
+    share a server, a breaker fed by the deliveries of all of them pauses
+    their generations while the server is down, so no LLM tokens are spent
+    on ideas which cannot be delivered.
+    """
+
+    def __init__(self):
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, url: str) -> CircuitBreaker:
+        """
+        returns the breaker of the host
+        :param url: a URL or the server address of the host
+        """
+        host = URL(url).host or ""
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker()
+        return breaker
+
+    def should_pause_generation(self, server_address: str) -> bool:
+        """whether the agents of the server must not generate ideas now"""
+        breaker = self.get(server_address)
+        if breaker.is_paused():
+            breaker.paused_generations += 1
+            return True
+        return False
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            host: breaker.stats() for host, breaker in self._breakers.items()
+        }
+
+
+xleap_breakers = XLeapCircuitBreakers()
@@ -1,5 +1,13 @@
+import asyncio
 import re
 import socket
+import time
+from collections import OrderedDict
+from typing import Any
+
+from aiohttp.abc import AbstractResolver
+
+from app.core.config import settings
 
 
 def resolve_host(host: str) -> str:
@@ -37,10 +45,167 @@ def resolve_server_addr(server: str) -> str:
         SyntaxError: If the server name does not start with http:// or https://
         NameError: If the host was not found.
     """
+    return resolve_host(_get_server_host(server))
+
+
+def _get_server_host(server: str) -> str:
     p = re.compile("^(https?://)(.*)", re.IGNORECASE)
     m = p.match(server)
 
     if m is None:
         raise SyntaxError(f"Invalid server address: '{server}'")
-    else:
-        return resolve_host(m.group(2))
+    return m.group(2)
+
+
+class _CacheEntry:
+    def __init__(
+        self,
+        infos: list[tuple] | None,
+        error: OSError | None,
+        ttl_seconds: float,
+    ):
+        # the address infos of getaddrinfo, None if the lookup failed
+        self.infos = infos
+        self.error = error
+        self.expires_at = time.monotonic() + ttl_seconds
+
+
+class CachingResolver(AbstractResolver):
+    """
+    Resolves host names without blocking the event loop (getaddrinfo runs in
+    a thread) and caches the addresses for settings.DNS_CACHE_TTL_SECONDS.
+    Failed lookups are cached for settings.DNS_NEGATIVE_TTL_SECONDS, lookups
+    time out after settings.DNS_TIMEOUT_SECONDS and concurrent lookups of a
+    host share one query. The number of cached hosts is bounded (LRU).
+    It is the resolver of the XLeap HTTP client as well, so checking a server
+    address and connecting to it resolve the host once.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.DNS_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = settings.DNS_NEGATIVE_TTL_SECONDS,
+        max_size: int = settings.DNS_CACHE_SIZE,
+        timeout: float = settings.DNS_TIMEOUT_SECONDS,
+    ):
+        self._ttl_seconds = ttl_seconds
+        self._negative_ttl_seconds = negative_ttl_seconds
+        self._max_size = max_size
+        self._timeout = timeout
+        self._entries: OrderedDict[
+            tuple[str, int], _CacheEntry
+        ] = OrderedDict()
+        self._lookups: dict[tuple[str, int], asyncio.Future] = {}
+        self._hits = 0
+        self._misses = 0
+        self._failures = 0
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> list[dict[str, Any]]:
+        """
+        returns the addresses of the host (in the format of aiohttp resolvers)
+        :raises OSError if the host cannot be resolved
+        """
+        infos = await self._get_infos(host, family)
+        return [
+            {
+                "hostname": host,
+                "host": address[0],
+                "port": port,
+                "family": info_family,
+                "proto": proto,
+                "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            }
+            for info_family, _, proto, _, address in infos
+        ]
+
+    async def close(self) -> None:
+        pass
+
+    async def _get_infos(self, host: str, family: int) -> list[tuple]:
+        key = (host, family)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._hits += 1
+            self._entries.move_to_end(key)
+            if entry.error is not None:
+                raise entry.error
+            return entry.infos  # type: ignore
+
+        self._misses += 1
+        lookup = self._lookups.get(key)
+        if (
+            lookup is None
+            or lookup.get_loop() is not asyncio.get_running_loop()
+        ):
+            lookup = asyncio.ensure_future(self._lookup(key))
+            self._lookups[key] = lookup
+            lookup.add_done_callback(lambda _: self._lookups.pop(key, None))
+        return await asyncio.shield(lookup)
+
+    async def _lookup(self, key: tuple[str, int]) -> list[tuple]:
+        host, family = key
+        try:
+            async with asyncio.timeout(self._timeout):
+                infos = await asyncio.get_running_loop().getaddrinfo(
+                    host,
+                    0,
+                    type=socket.SOCK_STREAM,
+                    family=family,
+                    flags=socket.AI_ADDRCONFIG,
+                )
+        except OSError as err:
+            # includes TimeoutError
+            self._failures += 1
+            self._put(key, _CacheEntry(None, err, self._negative_ttl_seconds))
+            raise
+        self._put(key, _CacheEntry(infos, None, self._ttl_seconds))
+        return infos
+
+    def _put(self, key: tuple[str, int], entry: _CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "failures": self._failures,
+        }
+
+
+dns_resolver = CachingResolver()
+
+
+async def resolve_server_addr_async(server: str) -> str:
+    """
+    Attempts to resolve the IP address from a server address without
+    blocking, the address is cached.
+
+    Args:
+        server (str): The server address, e.g., https://example.com.
+
+    Returns:
+        str: The IP address of the resolved server.
+
+    Raises:
+        SyntaxError: If the server name does not start with http:// or https://
+        NameError: If the host was not found.
+    """
+    host = _get_server_host(server)
+    try:
+        # the family of the aiohttp connectors, both share the cache entry
+        addresses = await dns_resolver.resolve(host, family=socket.AF_UNSPEC)
+    except OSError as e:
+        raise NameError(f"Name not found: '{host}'") from e
+    if not addresses:
+        raise NameError(f"Name not found: '{host}'")
+    # IPv4 addresses are preferred like by resolve_server_addr
+    ipv4_addresses = [
+        address for address in addresses if address["family"] == socket.AF_INET
+    ]
+    return (ipv4_addresses or addresses)[0]["host"]
@@ -0,0 +1,388 @@
+import asyncio
+import json
+import logging
+import random
+import uuid as uuid_pkg
+from datetime import datetime, timedelta
+from typing import Any
+
+import aiohttp
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, col, func, select, update
+from yarl import URL
+
+from app.core.config import settings
+from app.models import AIAgent, OutboxIdea, OutboxIdeaStatus
+
+from .agents import deactivate_refused_agent
+from .circuit_breaker import XLeapCircuitBreakers, xleap_breakers
+from .xleap_client import XLeapClient, xleap_client
+
+
+def is_transient_error(err: BaseException) -> bool:
+    """whether a failed delivery may succeed later (timeouts, 5xx, ...)"""
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status >= 500 or err.status in (408, 429)
+    return isinstance(err, aiohttp.ClientError | TimeoutError | OSError)
+
+
+def get_backoff_seconds(attempts: int) -> float:
+    """the exponential backoff (with jitter) after the given attempts"""
+    backoff = min(
+        settings.IDEA_OUTBOX_MAX_BACKOFF_SECONDS,
+        settings.IDEA_OUTBOX_BACKOFF_SECONDS * 2 ** max(0, attempts - 1),
+    )
+    # the jitter spreads the retries of the ideas of an outage
+    return backoff * random.uniform(0.5, 1.0)
+
+
+class IdeaOutbox:
+    """
+    Delivers the generated ideas to XLeap. Ideas are stored in the outbox
+    table before they are posted, so an idea which XLeap does not accept
+    right now (timeout, 5xx, connection errors) is retried with exponential
+    backoff instead of being lost. Ideas of a host are delivered in the order
+    they were generated, each post has the ID of the idea as idempotency key.
+    Ideas refused by XLeap (4xx) or failing all attempts are dead-lettered,
+    i.e. kept in the table with their last error.
+    Each delivery is leased to one worker (next_attempt_at), hence several
+    workers may share the outbox.
+    The outcomes of the deliveries feed the circuit breakers of the hosts,
+    while a breaker is open the ideas of its host wait in the outbox.
+    """
+
+    def __init__(
+        self,
+        engine: Engine | None = None,
+        client: XLeapClient | None = None,
+        breakers: XLeapCircuitBreakers | None = None,
+    ):
+        # None: the engine of the service (imported late, app.core.db
+        # depends on this package)
+        self._engine = engine
+        self._client = client or xleap_client
+        self._breakers = breakers or xleap_breakers
+        self._wake_up: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stored = 0
+        self._delivered = 0
+        self._retries = 0
+        self._dead = 0
+
+    def _get_engine(self) -> Engine:
+        if self._engine is None:
+            from app.core.db import engine
+
+            self._engine = engine
+        return self._engine
+
+    def _get_wake_up(self) -> asyncio.Event:
+        loop = asyncio.get_running_loop()
+        if self._wake_up is None or self._loop is not loop:
+            self._wake_up = asyncio.Event()
+            self._loop = loop
+        return self._wake_up
+
+    def _store(
+        self,
+        agent_id: uuid_pkg.UUID,
+        url: str,
+        payload: str,
+        deliver_now: bool = True,
+    ) -> tuple[OutboxIdea, bool]:
+        """
+        stores an idea, it is leased for an immediate delivery unless earlier
+        ideas of its host are pending (being delivered or waiting for their
+        next attempt)
+        :param deliver_now: False to leave the delivery to the worker
+        :return: the stored idea and whether it is leased
+        """
+        host = URL(url).host or ""
+        now = datetime.utcnow()
+        with Session(self._get_engine()) as session:
+            # an idea being delivered right now holds up the idea too, it
+            # may fail and must be delivered first
+            backlog = session.exec(
+                select(OutboxIdea.id)
+                .where(OutboxIdea.host == host)
+                .where(OutboxIdea.status == OutboxIdeaStatus.PENDING)
+                .limit(1)
+            ).first()
+            leased = deliver_now and backlog is None
+            outbox_idea = OutboxIdea(
+                agent_id=agent_id,
+                host=host,
+                url=url,
+                payload=payload,
+                attempts=1 if leased else 0,
+                next_attempt_at=(
+                    now + timedelta(seconds=settings.IDEA_OUTBOX_LEASE_SECONDS)
+                    if leased
+                    else now
+                ),
+            )
+            session.add(outbox_idea)
+            session.commit()
+            session.refresh(outbox_idea)
+            return outbox_idea, leased
+
+    def _load_pending(self, now: datetime) -> list[tuple[OutboxIdea, str]]:
+        """
+        returns the oldest settings.IDEA_OUTBOX_BATCH_SIZE pending ideas of
+        each host with due ideas (oldest first) with the agent secrets, hence
+        the ideas of a failing host do not hold up the other hosts
+        """
+        pending = OutboxIdea.status == OutboxIdeaStatus.PENDING
+        positions = (
+            select(
+                col(OutboxIdea.id).label("id"),
+                func.row_number()
+                .over(
+                    partition_by=OutboxIdea.host,
+                    order_by=col(OutboxIdea.created_at),
+                )
+                .label("position"),
+            )
+            .where(pending)
+            .subquery()
+        )
+        due_hosts = (
+            select(OutboxIdea.host)
+            .where(pending)
+            .where(col(OutboxIdea.next_attempt_at) <= now)
+        )
+        with Session(self._get_engine()) as session:
+            rows = session.exec(
+                select(OutboxIdea, AIAgent.secret)
+                .join(AIAgent, col(AIAgent.id) == OutboxIdea.agent_id)
+                .join(positions, positions.c.id == OutboxIdea.id)
+                .where(col(OutboxIdea.host).in_(due_hosts))
+                .where(positions.c.position <= settings.IDEA_OUTBOX_BATCH_SIZE)
+                .order_by(col(OutboxIdea.created_at))
+            ).all()
+            return list(rows)  # type: ignore
+
+    def _claim(self, idea_id: uuid_pkg.UUID, now: datetime) -> bool:
+        """leases a due idea, False if another worker leased it before"""
+        with Session(self._get_engine()) as session:
+            result = session.exec(  # type: ignore
+                update(OutboxIdea)
+                .where(col(OutboxIdea.id) == idea_id)
+                .where(col(OutboxIdea.status) == OutboxIdeaStatus.PENDING)
+                .where(col(OutboxIdea.next_attempt_at) <= now)
+                .values(
+                    attempts=OutboxIdea.attempts + 1,
+                    next_attempt_at=now
+                    + timedelta(seconds=settings.IDEA_OUTBOX_LEASE_SECONDS),
+                )
+            )
+            session.commit()
+            return result.rowcount == 1
+
+    def _delete(self, idea_id: uuid_pkg.UUID):
+        with Session(self._get_engine()) as session:
+            outbox_idea = session.get(OutboxIdea, idea_id)
+            if outbox_idea is not None:
+                session.delete(outbox_idea)
+                session.commit()
+
+    def _retry_later(self, outbox_idea: OutboxIdea, error: str) -> bool:
+        """
+        schedules the next attempt, dead-letters the idea after the last one
+        :return: whether the idea was dead-lettered
+        """
+        dead = outbox_idea.attempts >= settings.IDEA_OUTBOX_MAX_ATTEMPTS
+        with Session(self._get_engine()) as session:
+            session.exec(  # type: ignore
+                update(OutboxIdea)
+                .where(col(OutboxIdea.id) == outbox_idea.id)
+                .values(
+                    status=(
+                        OutboxIdeaStatus.DEAD
+                        if dead
+                        else OutboxIdeaStatus.PENDING
+                    ),
+                    next_attempt_at=datetime.utcnow()
+                    + timedelta(
+                        seconds=get_backoff_seconds(outbox_idea.attempts)
+                    ),
+                    last_error=error,
+                )
+            )
+            session.commit()
+        return dead
+
+    def _dead_letter(self, outbox_idea: OutboxIdea, err: Exception):
+        """
+        keeps the refused idea, deactivates its agent if XLeap refused the
+        agent (see deactivate_refused_agent)
+        """
+        with Session(self._get_engine()) as session:
+            session.exec(  # type: ignore
+                update(OutboxIdea)
+                .where(col(OutboxIdea.id) == outbox_idea.id)
+                .values(status=OutboxIdeaStatus.DEAD, last_error=repr(err))
+            )
+            session.commit()
+            agent = session.get(AIAgent, outbox_idea.agent_id)
+            if agent is not None:
+                deactivate_refused_agent(err, agent, session)
+
+    async def _send(self, outbox_idea: OutboxIdea, secret: str):
+        async with self._client.request(
+            "POST",
+            url=outbox_idea.url,
+            data=outbox_idea.payload,
+            headers={
+                "Authorization": f"Bearer {secret}",
+                "content-type": "application/json",
+                # XLeap can detect a repeated delivery, e.g. after a timeout
+                "Idempotency-Key": str(outbox_idea.id),
+            },
+        ) as response:
+            response.raise_for_status()
+
+    async def _attempt(self, outbox_idea: OutboxIdea, secret: str) -> bool:
+        """
+        delivers a leased idea once
+        :return: False if the idea stays pending (transient failure)
+        :raises: the error of XLeap if the idea was refused (dead-lettered)
+        """
+        breaker = self._breakers.get(outbox_idea.url)
+        try:
+            await self._send(outbox_idea, secret)
+        except Exception as err:
+            if not is_transient_error(err):
+                # the server is up, it refused the idea
+                breaker.record_success()
+                self._dead += 1
+                await asyncio.to_thread(self._dead_letter, outbox_idea, err)
+                raise
+            breaker.record_failure()
+            dead = await asyncio.to_thread(
+                self._retry_later, outbox_idea, repr(err)
+            )
+            if dead:
+                self._dead += 1
+                logging.warning(
+                    f"Idea {outbox_idea.id} was not delivered to "
+                    f"{outbox_idea.host} after {outbox_idea.attempts} "
+                    f"attempts: {err}"
+                )
+            else:
+                self._retries += 1
+                logging.info(
+                    f"Delivery of idea {outbox_idea.id} to {outbox_idea.host} "
+                    f"failed, retrying later: {err}"
+                )
+            return dead
+
+        breaker.record_success()
+        await asyncio.to_thread(self._delete, outbox_idea.id)
+        self._delivered += 1
+        return True
+
+    async def post(
+        self, agent_id: uuid_pkg.UUID, secret: str, url: str, data: dict
+    ) -> None:
+        """
+        Stores an idea and delivers it right away unless earlier ideas of its
+        host wait for their delivery or its circuit breaker is open. Transient
+        failures are retried in the background.
+        :param agent_id: the ID of the agent
+        :param secret: the secret of the agent
+        :param url: the URL of the ideas of the brainstorm
+        :param data: the idea
+        :raises aiohttp.ClientResponseError: if XLeap refused the idea
+        """
+        breaker = self._breakers.get(url)
+        deliver_now = breaker.allow()
+        outbox_idea, leased = await asyncio.to_thread(
+            self._store, agent_id, url, json.dumps(data), deliver_now
+        )
+        self._stored += 1
+        if leased:
+            try:
+                await self._attempt(outbox_idea, secret)
+            finally:
+                # later ideas of the host may wait for this one
+                self._get_wake_up().set()
+            return
+        if deliver_now:
+            breaker.release_probe()
+        self._get_wake_up().set()
+
+    async def _deliver_host(
+        self, pending: list[tuple[OutboxIdea, str]], now: datetime
+    ) -> int:
+        handled = 0
+        for outbox_idea, secret in pending:
+            # the oldest idea of the host is not due or leased by another
+            # worker, later ideas must wait for it
+            if outbox_idea.next_attempt_at > now:
+                break
+            breaker = self._breakers.get(outbox_idea.url)
+            if not breaker.allow():
+                break
+            if not await asyncio.to_thread(self._claim, outbox_idea.id, now):
+                breaker.release_probe()
+                break
+            outbox_idea.attempts += 1
+            try:
+                if not await self._attempt(outbox_idea, secret):
+                    break
+            except Exception as err:
+                logging.warning(f"XLeap refused idea {outbox_idea.id}: {err}")
+            handled += 1
+        return handled
+
+    async def deliver_due(self) -> int:
+        """
+        Delivers the due ideas, the hosts concurrently and the ideas of a
+        host in order
+        :return: the number of delivered or dead-lettered ideas
+        """
+        now = datetime.utcnow()
+        hosts: dict[str, list[tuple[OutboxIdea, str]]] = {}
+        for outbox_idea, secret in await asyncio.to_thread(
+            self._load_pending, now
+        ):
+            hosts.setdefault(outbox_idea.host, []).append(
+                (outbox_idea, secret)
+            )
+        handled = await asyncio.gather(
+            *(self._deliver_host(pending, now) for pending in hosts.values())
+        )
+        return sum(handled)
+
+    async def run(self):
+        """
+        Delivers the due ideas every settings.IDEA_OUTBOX_POLL_SECONDS and
+        whenever an idea waits behind earlier ideas (forever)
+        """
+        wake_up = self._get_wake_up()
+        while True:
+            try:
+                await asyncio.wait_for(
+                    wake_up.wait(), settings.IDEA_OUTBOX_POLL_SECONDS
+                )
+            except TimeoutError:
+                pass
+            wake_up.clear()
+            try:
+                await self.deliver_due()
+            except Exception as err:
+                logging.warning(
+                    f"Delivering ideas from the outbox failed: {err}"
+                )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "stored": self._stored,
+            "delivered": self._delivered,
+            "retries": self._retries,
+            "dead": self._dead,
+        }
+
+
+idea_outbox = IdeaOutbox()
@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+from yarl import URL
+
+from app.core.config import settings
+
+from .dns import dns_resolver
+
+
+class _HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.seconds_total = 0.0
+
+
+class XLeapClient:
+    """
+    The HTTP client for all requests to XLeap servers (posting ideas, fetching
+    briefings). Its session keeps the connections to each host alive, hence
+    DNS, TCP and TLS setup are only paid once per connection. The number of
+    connections is limited overall and per host.
+    The session is created on first use in the event loop of the caller.
+    """
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._hosts: dict[str, _HostStats] = {}
+
+    def _get_host_stats(self, host: str) -> _HostStats:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = _HostStats()
+        return stats
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """counts new and reused connections per host"""
+
+        async def on_connection_create_end(
+            session: aiohttp.ClientSession,
+            context: SimpleNamespace,
+            params: aiohttp.TraceConnectionCreateEndParams,
+        ):
+            host = context.trace_request_ctx["host"]
+            self._get_host_stats(host).new_connections += 1
+
+        async def on_connection_reuseconn(
+            session: aiohttp.ClientSession,
+            context: SimpleNamespace,
+            params: aiohttp.TraceConnectionReuseconnParams,
+        ):
+            host = context.trace_request_ctx["host"]
+            self._get_host_stats(host).reused_connections += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        # a session can only be used in the loop it was created in
+        if (
+            self._session is None
+            or self._session.closed
+            or self._loop is not loop
+        ):
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=settings.XLEAP_MAX_CONNECTIONS,
+                    limit_per_host=settings.XLEAP_MAX_CONNECTIONS_PER_HOST,
+                    keepalive_timeout=settings.XLEAP_KEEPALIVE_SECONDS,
+                    # the addresses are cached by the shared resolver
+                    resolver=dns_resolver,
+                    use_dns_cache=False,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=settings.XLEAP_TIMEOUT_SECONDS,
+                    sock_connect=settings.XLEAP_CONNECT_TIMEOUT_SECONDS,
+                ),
+                trace_configs=[self._create_trace_config()],
+            )
+            self._loop = loop
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Sends a request to XLeap with a pooled connection
+        :param method: the HTTP method, e.g. "POST"
+        :param url: the URL
+        :param kwargs: further arguments of aiohttp.ClientSession.request
+        :return: (context manager) the response
+        """
+        host = URL(url).host or ""
+        stats = self._get_host_stats(host)
+        stats.requests += 1
+        stats.in_flight += 1
+        started = time.monotonic()
+        failed = False
+        try:
+            async with self._get_session().request(
+                method, url, trace_request_ctx={"host": host}, **kwargs
+            ) as response:
+                failed = response.status >= 400
+                yield response
+        except (aiohttp.ClientError, TimeoutError):
+            failed = True
+            raise
+        finally:
+            if failed:
+                stats.errors += 1
+            stats.in_flight -= 1
+            stats.seconds_total += time.monotonic() - started
+
+    async def close(self):
+        """closes the session and its connections, e.g. on shutdown"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            host: {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "in_flight": stats.in_flight,
+                "new_connections": stats.new_connections,
+                "reused_connections": stats.reused_connections,
+                "seconds_avg": round(
+                    stats.seconds_total / stats.requests
+                    if stats.requests
+                    else 0,
+                    4,
+                ),
+            }
+            for host, stats in self._hosts.items()
+        }
+
+
+xleap_client = XLeapClient()
@@ -0,0 +1,41 @@
+# isort: skip_file
+from .usage import (  # noqa
+    TokenUsageCallbackHandler,
+    token_usage_tracker,
+)
+from .rate_limiter import SKIP_RATE_LIMIT_EXTENSION, rate_limiter  # noqa
+from .client import (  # noqa
+    close_http_clients,
+    create_chat_model,
+    get_api_base_url,
+    get_async_http_client,
+    get_http_client,
+)
+from .deadline import (  # noqa
+    JobType,
+    call_with_deadline,
+    deadline_scope,
+    get_current_deadline,
+    latency_recorder,
+    wait_for_running_jobs,
+)
+from .batching import generation_batcher  # noqa
+
+__all__ = [
+    "TokenUsageCallbackHandler",
+    "token_usage_tracker",
+    "SKIP_RATE_LIMIT_EXTENSION",
+    "rate_limiter",
+    "close_http_clients",
+    "create_chat_model",
+    "get_api_base_url",
+    "get_async_http_client",
+    "get_http_client",
+    "JobType",
+    "call_with_deadline",
+    "deadline_scope",
+    "get_current_deadline",
+    "latency_recorder",
+    "wait_for_running_jobs",
+    "generation_batcher",
+]
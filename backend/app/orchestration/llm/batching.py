@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumpd
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from app.core.config import settings
+
+from .client import create_chat_model
+from .deadline import call_with_deadline
+
+
+class _BatchJob:
+    """A generation of one agent waiting for its batch"""
+
+    def __init__(self, messages: list[BaseMessage], callbacks: list):
+        self.messages = messages
+        self.callbacks = callbacks
+        self.future: asyncio.Future[
+            str
+        ] = asyncio.get_running_loop().create_future()
+
+    def prompt_signature(self) -> tuple:
+        return tuple(
+            (message.type, message.content) for message in self.messages
+        )
+
+
+def _split_token_usage(token_usage: dict, parts: int) -> list[dict]:
+    """
+    Splits the token usage of a multi-choice request evenly among its choices,
+    the remainder of a division is assigned to the first choices
+    """
+    shares: list[dict] = [{} for _ in range(parts)]
+    for name, value in token_usage.items():
+        if isinstance(value, dict):
+            for share, part in zip(
+                shares, _split_token_usage(value, parts), strict=True
+            ):
+                share[name] = part
+        elif isinstance(value, int):
+            quotient, remainder = divmod(value, parts)
+            for index, share in enumerate(shares):
+                share[name] = quotient + (1 if index < remainder else 0)
+    return shares
+
+
+class GenerationBatcher:
+    """
+    Gathers the generations of agents which are triggered at the same time
+    (e.g. several agents of one XLeap session receive the same new idea).
+    Jobs with the same API, key, model and temperature which arrive within
+    settings.GENERATION_BATCH_WINDOW_MS are submitted together: jobs with an
+    identical prompt are sent as one multi-choice request (n > 1), the other
+    jobs of the batch are sent concurrently. The callbacks of every job
+    receive its own choice and an even share of the token usage.
+    All jobs run in the event loop, therefore no locking is required.
+    """
+
+    def __init__(self):
+        self._pending: dict[tuple, list[_BatchJob]] = {}
+        # the event loop only keeps weak references to tasks
+        self._flush_tasks: set[asyncio.Task] = set()
+        self._batches = 0
+        self._jobs = 0
+        self._requests = 0
+        self._multi_choice_requests = 0
+
+    async def generate(
+        self,
+        api_key: str,
+        base_url: str | None,
+        model: str,
+        temperature: float,
+        messages: list[BaseMessage],
+        callbacks: list,
+    ) -> str:
+        """
+        Generates the completion of the messages together with the other jobs of
+        the batch
+        :return: the content of the generated message
+        """
+        batch_key = (base_url, api_key, model, temperature)
+        job = _BatchJob(messages=messages, callbacks=callbacks)
+        self._jobs += 1
+
+        jobs = self._pending.get(batch_key)
+        if jobs is None:
+            self._pending[batch_key] = [job]
+            task = asyncio.create_task(self._flush_later(batch_key))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        else:
+            jobs.append(job)
+
+        return await job.future
+
+    async def _flush_later(self, batch_key: tuple):
+        await asyncio.sleep(settings.GENERATION_BATCH_WINDOW_MS / 1000.0)
+        jobs = self._pending.pop(batch_key, [])
+        if not jobs:
+            return
+        self._batches += 1
+
+        groups: dict[tuple, list[_BatchJob]] = {}
+        for job in jobs:
+            groups.setdefault(job.prompt_signature(), []).append(job)
+
+        logging.info(
+            f"Submitting batch of {len(jobs)} generations "
+            f"as {len(groups)} requests"
+        )
+        await asyncio.gather(
+            *(self._submit(batch_key, group) for group in groups.values())
+        )
+
+    async def _submit(self, batch_key: tuple, jobs: list[_BatchJob]):
+        try:
+            while jobs:
+                generations = await self._request(batch_key, jobs)
+                if not generations:
+                    raise ValueError("The LLM did not return any generation")
+                for job, generation in zip(jobs, generations, strict=False):
+                    # the caller of a cancelled job no longer waits for it
+                    if not job.future.done():
+                        job.future.set_result(generation)
+                # some OpenAI compatible servers ignore n, the remaining
+                # jobs are submitted again
+                jobs = jobs[len(generations) :]
+        except Exception as err:
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(err)
+
+    async def _request(
+        self, batch_key: tuple, jobs: list[_BatchJob]
+    ) -> list[str]:
+        """
+        sends one request with a choice per job (same prompt), the run of
+        every job is reported to its own callbacks
+        """
+        base_url, api_key, model, temperature = batch_key
+        llm = create_chat_model(
+            api_key=api_key,
+            base_url=base_url,
+            model=model,
+            temperature=temperature,
+            n=len(jobs),
+            max_retries=0,
+        )
+        self._requests += 1
+        if len(jobs) > 1:
+            self._multi_choice_requests += 1
+
+        run_managers = [await self._start_run(llm, job) for job in jobs]
+        try:
+            result = await call_with_deadline(
+                lambda: llm.agenerate([jobs[0].messages]),
+                name=f"batch of {len(jobs)} generations",
+            )
+        except BaseException as err:
+            for run_manager in run_managers:
+                await run_manager.on_llm_error(err)
+            raise
+
+        generations = result.generations[0]
+        llm_output = result.llm_output or {}
+        token_usages = _split_token_usage(
+            llm_output.get("token_usage") or {}, max(len(generations), 1)
+        )
+        for run_manager, generation, token_usage in zip(
+            run_managers, generations, token_usages, strict=False
+        ):
+            await run_manager.on_llm_end(
+                LLMResult(
+                    generations=[[generation]],
+                    llm_output={**llm_output, "token_usage": token_usage},
+                )
+            )
+        for run_manager in run_managers[len(generations) :]:
+            await run_manager.on_llm_error(
+                ValueError("The LLM returned fewer choices than requested")
+            )
+        return [generation.text for generation in generations]
+
+    @staticmethod
+    async def _start_run(
+        llm: BaseChatModel, job: _BatchJob
+    ) -> AsyncCallbackManagerForLLMRun:
+        """reports the start of the LLM run of a job to its callbacks"""
+        callback_manager = AsyncCallbackManager.configure(
+            inheritable_callbacks=job.callbacks
+        )
+        run_managers = await callback_manager.on_chat_model_start(
+            dumpd(llm), [job.messages], invocation_params=llm.dict()
+        )
+        return run_managers[0]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "batches": self._batches,
+            "jobs": self._jobs,
+            "requests": self._requests,
+            "multi_choice_requests": self._multi_choice_requests,
+        }
+
+
+generation_batcher = GenerationBatcher()
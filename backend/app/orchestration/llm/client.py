@@ -0,0 +1,136 @@
+import threading
+from typing import Any
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+from app.core.config import settings
+
+from .rate_limiter import (
+    async_rate_limit_event_hooks,
+    rate_limit_event_hooks,
+)
+
+
+class _SharedHttpClient(httpx.Client):
+    """
+    The HTTP client shared by all LLM requests. Autogen deep copies its llm_config,
+    the copies must use the shared client as well.
+    """
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class _SharedAsyncHttpClient(httpx.AsyncClient):
+    def __deepcopy__(self, memo):
+        return self
+
+
+_lock = threading.Lock()
+_http_client: _SharedHttpClient | None = None
+_async_http_client: _SharedAsyncHttpClient | None = None
+
+
+def get_http_client() -> httpx.Client:
+    """
+    returns the HTTP client for synchronous LLM requests, all requests pass the
+    rate limiter
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = _SharedHttpClient(
+                proxy=settings.HTTP_PROXY,
+                timeout=httpx.Timeout(timeout=600.0, connect=5.0),
+                event_hooks=rate_limit_event_hooks,
+            )
+        return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    returns the HTTP client for asynchronous LLM requests, all requests pass the
+    rate limiter
+    """
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            _async_http_client = _SharedAsyncHttpClient(
+                proxy=settings.HTTP_PROXY,
+                timeout=httpx.Timeout(timeout=600.0, connect=5.0),
+                event_hooks=async_rate_limit_event_hooks,
+            )
+        return _async_http_client
+
+
+async def close_http_clients():
+    """closes the HTTP clients (if they were created), e.g. on shutdown"""
+    global _http_client, _async_http_client
+    with _lock:
+        http_client, _http_client = _http_client, None
+        async_http_client, _async_http_client = _async_http_client, None
+    if http_client is not None:
+        http_client.close()
+    if async_http_client is not None:
+        await async_http_client.aclose()
+
+
+def get_api_base_url(api_url: str | None) -> str | None:
+    """
+    returns the base URL of the OpenAI compatible API of an agent,
+    None (OpenAI) if the agent has no API URL
+    """
+    if api_url is None or not api_url.strip():
+        return None
+    return api_url.strip()
+
+
+def create_chat_model(
+    api_key: str,
+    model: str,
+    organization: str | None = None,
+    base_url: str | None = None,
+    timeout: float | None = None,
+    max_retries: int = 2,
+    **kwargs: Any,
+) -> ChatOpenAI:
+    """
+    Creates a ChatOpenAI model which uses the shared (rate limited) HTTP clients
+    :param api_key: the OpenAI API key
+    :param model: the name of the model
+    :param organization: (optional) the OpenAI organization ID
+    :param base_url: (optional) the URL of an OpenAI compatible API (e.g. a
+      self-hosted vLLM or llama.cpp server), default OpenAI
+    :param timeout: (optional) the timeout of a request in seconds,
+      default settings.LLM_ATTEMPT_TIMEOUT_SECONDS
+    :param max_retries: (optional, default=2) the retries of the OpenAI client, use 0
+      if the calls are made with call_with_deadline
+    :param kwargs: further arguments of ChatOpenAI, e.g. temperature
+    :return: the chat model
+    """
+    if timeout is None:
+        timeout = settings.LLM_ATTEMPT_TIMEOUT_SECONDS
+    client_params = {
+        "api_key": api_key,
+        "organization": organization,
+        "base_url": get_api_base_url(base_url),
+        "timeout": timeout,
+        "max_retries": max_retries,
+    }
+    return ChatOpenAI(
+        openai_api_key=api_key,  # type: ignore
+        openai_organization=organization,
+        openai_api_base=client_params["base_url"],
+        model_name=model,
+        request_timeout=timeout,
+        max_retries=max_retries,
+        client=openai.OpenAI(
+            **client_params, http_client=get_http_client()
+        ).chat.completions,
+        async_client=openai.AsyncOpenAI(
+            **client_params, http_client=get_async_http_client()
+        ).chat.completions,
+        **kwargs,
+    )
@@ -0,0 +1,308 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from enum import StrEnum
+from typing import Any, TypeVar
+
+import openai
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class JobType(StrEnum):
+    ON_DEMAND = "on_demand"
+    """ ideas requested by XLeap with a task reference, somebody is waiting """
+    PERIODIC = "periodic"
+    """ ideas the agent contributes on its own """
+    TEST = "test"
+    """ ideas generated to test a briefing """
+
+
+def _get_deadline_seconds(job_type: JobType) -> float:
+    match job_type:
+        case JobType.ON_DEMAND:
+            return settings.LLM_DEADLINE_ON_DEMAND_SECONDS
+        case JobType.TEST:
+            return settings.LLM_DEADLINE_TEST_SECONDS
+        case _:
+            return settings.LLM_DEADLINE_PERIODIC_SECONDS
+
+
+class Deadline:
+    """
+    The point in time until a generation job must be completed
+    """
+
+    def __init__(self, job_type: JobType, seconds: float | None = None):
+        self.job_type = job_type
+        if seconds is None:
+            seconds = _get_deadline_seconds(job_type)
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """returns the seconds until the deadline, 0 if it passed"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_jobs_lock = threading.Lock()
+_running_jobs = 0
+
+_current_deadline: contextvars.ContextVar[
+    Deadline | None
+] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline_scope(job_type: JobType) -> Iterator[Deadline]:
+    """
+    Sets the deadline for all LLM calls of a generation job
+    (including the tasks started by the job)
+    """
+    global _running_jobs
+    deadline = Deadline(job_type)
+    token = _current_deadline.set(deadline)
+    with _jobs_lock:
+        _running_jobs += 1
+    try:
+        yield deadline
+    finally:
+        with _jobs_lock:
+            _running_jobs -= 1
+        _current_deadline.reset(token)
+
+
+async def wait_for_running_jobs(timeout: float) -> bool:
+    """
+    Waits until no generation job is running, e.g. on shutdown
+    :param timeout: the maximum seconds to wait
+    :return: False if jobs were still running after the timeout
+    """
+    expires_at = time.monotonic() + timeout
+    while _running_jobs > 0:
+        if time.monotonic() >= expires_at:
+            return False
+        await asyncio.sleep(0.1)
+    return True
+
+
+def get_current_deadline() -> Deadline:
+    """returns the deadline of the current job, periodic jobs are the default"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        deadline = Deadline(JobType.PERIODIC)
+    return deadline
+
+
+def _get_percentile(latencies: list[float], percentile: float) -> float | None:
+    """returns the percentile (0..1) of sorted latencies, None if too few"""
+    if len(latencies) < 10:
+        return None
+    index = min(len(latencies) - 1, int(percentile * len(latencies)))
+    return latencies[index]
+
+
+class LatencyRecorder:
+    """
+    Records attempts and latencies of LLM calls per job type, and provides the
+    latency percentiles used to decide when to hedge
+    """
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._window = window
+        self._latencies: dict[str, deque[float]] = {}
+        self._calls: dict[str, int] = {}
+        self._attempts: dict[str, int] = {}
+        self._hedges: dict[str, int] = {}
+        self._failures: dict[str, int] = {}
+
+    def record(
+        self,
+        job_type: str,
+        latency: float | None,
+        attempts: int,
+        hedged: bool,
+    ):
+        """
+        Records a call
+        :param latency: the latency of the successful attempt, None if the call failed
+        """
+        with self._lock:
+            if job_type not in self._latencies:
+                self._latencies[job_type] = deque(maxlen=self._window)
+            if latency is None:
+                self._failures[job_type] = self._failures.get(job_type, 0) + 1
+            else:
+                self._latencies[job_type].append(latency)
+            self._calls[job_type] = self._calls.get(job_type, 0) + 1
+            self._attempts[job_type] = (
+                self._attempts.get(job_type, 0) + attempts
+            )
+            if hedged:
+                self._hedges[job_type] = self._hedges.get(job_type, 0) + 1
+
+    def percentile(self, job_type: str, percentile: float) -> float | None:
+        """
+        returns the latency percentile (0..1) or None if there are too few samples
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(job_type, ()))
+        return _get_percentile(latencies, percentile)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            snapshot = {
+                job_type: (
+                    calls,
+                    self._attempts.get(job_type, 0),
+                    self._hedges.get(job_type, 0),
+                    self._failures.get(job_type, 0),
+                    sorted(self._latencies.get(job_type, ())),
+                )
+                for job_type, calls in self._calls.items()
+            }
+        return {
+            job_type: {
+                "calls": calls,
+                "attempts": attempts,
+                "hedged_calls": hedges,
+                "failures": failures,
+                "p50_seconds": _get_percentile(latencies, 0.5),
+                "p95_seconds": _get_percentile(latencies, 0.95),
+                "p99_seconds": _get_percentile(latencies, 0.99),
+            }
+            for job_type, (
+                calls,
+                attempts,
+                hedges,
+                failures,
+                latencies,
+            ) in snapshot.items()
+        }
+
+
+latency_recorder = LatencyRecorder()
+
+RETRYABLE_ERRORS = (
+    TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+async def _run_hedged(
+    call: Callable[[], Awaitable[T]], timeout: float, hedge_after: float
+) -> tuple[T, bool]:
+    """
+    Runs the call and, if it did not complete after hedge_after seconds, a
+    duplicate of it. The first result wins, the other call is cancelled.
+    :return: the result and whether a duplicate request was sent
+    """
+    primary = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    if done:
+        return primary.result(), False
+
+    hedge = asyncio.ensure_future(call())
+    pending = {primary, hedge}
+    try:
+        async with asyncio.timeout(max(0.0, timeout - hedge_after)):
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), True
+                # both failed: raise the error of the last one
+                if not pending:
+                    raise done.pop().exception()  # type: ignore
+    finally:
+        for task in pending:
+            task.cancel()
+    raise TimeoutError()
+
+
+async def call_with_deadline(
+    call: Callable[[], Awaitable[T]], name: str = "llm"
+) -> T:
+    """
+    Calls the LLM within the deadline of the current job.
+    Every attempt gets a timeout, failed attempts are retried with jittered
+    backoff as long as the deadline permits. For on-demand jobs a duplicate
+    request is sent once an attempt is slower than the configured latency
+    percentile (if LLM_HEDGE_ON_DEMAND is set).
+    :param call: creates the awaitable of one attempt, e.g. lambda: chain.ainvoke(...)
+    :param name: the name of the call for logging
+    :return: the result of the first successful attempt
+    """
+    deadline = get_current_deadline()
+    job_type = str(deadline.job_type)
+    attempts = 0
+    hedged = False
+
+    while True:
+        attempts += 1
+        timeout = min(
+            settings.LLM_ATTEMPT_TIMEOUT_SECONDS, deadline.remaining()
+        )
+        if timeout <= 0:
+            latency_recorder.record(job_type, None, attempts - 1, hedged)
+            raise TimeoutError(f"Deadline of {name} ({job_type}) expired")
+
+        hedge_after = None
+        if (
+            settings.LLM_HEDGE_ON_DEMAND
+            and deadline.job_type == JobType.ON_DEMAND
+        ):
+            hedge_after = latency_recorder.percentile(
+                job_type, settings.LLM_HEDGE_PERCENTILE
+            )
+
+        started = time.monotonic()
+        try:
+            if hedge_after is not None and hedge_after < timeout:
+                result, attempt_hedged = await _run_hedged(
+                    call, timeout, hedge_after
+                )
+                hedged = hedged or attempt_hedged
+            else:
+                async with asyncio.timeout(timeout):
+                    result = await call()
+        except RETRYABLE_ERRORS as err:
+            backoff = random.uniform(
+                0, settings.LLM_RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1)
+            )
+            if (
+                attempts >= settings.LLM_MAX_ATTEMPTS
+                or backoff >= deadline.remaining()
+            ):
+                latency_recorder.record(job_type, None, attempts, hedged)
+                raise err
+            logging.warning(
+                f"Attempt {attempts} of {name} ({job_type}) failed: "
+                f"{err!r}, retrying in {backoff:.2f}s"
+            )
+            await asyncio.sleep(backoff)
+            continue
+        except Exception:
+            latency_recorder.record(job_type, None, attempts, hedged)
+            raise
+
+        latency_recorder.record(
+            job_type, time.monotonic() - started, attempts, hedged
+        )
+        return result
@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Any
+
+import httpx
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: str | None) -> float:
+    """
+    Parses the reset durations of the rate limit headers (e.g. "1s", "6m0s", "20ms")
+    :return: the duration in seconds, 0 if the value cannot be parsed
+    """
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    return sum(
+        float(amount) * _DURATION_UNITS[unit]
+        for amount, unit in _DURATION_PATTERN.findall(value)
+    )
+
+
+def get_key_id(request: httpx.Request) -> str | None:
+    """
+    Identifies the API key of a request without exposing it (logs, metrics).
+    The same key may be used with different (self-hosted) APIs, which have
+    their own limits.
+    :return: a short hash of the API and the key or None if the request has no key
+    """
+    authorization = request.headers.get("Authorization")
+    if not authorization:
+        return None
+    key = f"{request.url.host}:{request.url.port}:{authorization}"
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """estimates the tokens of a request (approx. 4 characters per token)"""
+    try:
+        return max(1, len(request.content) // 4)
+    except httpx.RequestNotRead:
+        return 1
+
+
+class _Bucket:
+    """
+    A token bucket of one limit (requests or tokens) of an API key.
+    The bucket is unlimited until it was calibrated from the provider's headers.
+    """
+
+    def __init__(self):
+        self.limit: float | None = None
+        self.level = 0.0
+        # refill per second
+        self.rate = 0.0
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.limit is not None:
+            elapsed = now - self._updated
+            self.level = min(self.limit, self.level + elapsed * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """returns the seconds until the bucket holds the amount (after refill)"""
+        if self.limit is None or self.level >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def calibrate(self, limit: float, remaining: float, reset: float):
+        self.limit = limit
+        self.level = remaining
+        # the limits are per minute, the reset tells when the bucket is full again
+        if reset > 0 and limit > remaining:
+            self.rate = (limit - remaining) / reset
+        else:
+            self.rate = limit / 60.0
+
+
+class KeyRateLimit:
+    """
+    The request and token buckets of one API key including its throttling statistics
+    """
+
+    def __init__(self):
+        self.requests = _Bucket()
+        self.tokens = _Bucket()
+        self.blocked_until = 0.0
+        self.throttled_calls = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited_responses = 0
+
+    def reserve(self, tokens: int, now: float) -> float:
+        """
+        Takes one request and the tokens from the buckets. The buckets may
+        go negative, so later callers queue behind earlier ones.
+        :return: the seconds the caller has to wait before sending the request
+        """
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+            self.blocked_until - now,
+            0.0,
+        )
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+        if wait > 0:
+            self.throttled_calls += 1
+            self.throttled_seconds += wait
+        return wait
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "request_limit": self.requests.limit,
+            "requests_remaining": round(self.requests.level, 2),
+            "token_limit": self.tokens.limit,
+            "tokens_remaining": round(self.tokens.level, 2),
+            "throttled_calls": self.throttled_calls,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "rate_limited_responses": self.rate_limited_responses,
+        }
+
+
+class RateLimiter:
+    """
+    Shared rate limiter for all LLM requests. Many agents share one API key, so
+    requests are limited per key with token buckets which are calibrated from the
+    provider's x-ratelimit-* headers. Requests are delayed before they hit the
+    provider limit, and after a 429 all requests of the key wait until the reset.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: dict[str, KeyRateLimit] = {}
+
+    def _get(self, key_id: str) -> KeyRateLimit:
+        if key_id not in self._keys:
+            self._keys[key_id] = KeyRateLimit()
+        return self._keys[key_id]
+
+    def reserve(self, key_id: str, tokens: int) -> float:
+        """
+        Reserves a request with the estimated tokens
+        :return: the seconds the caller has to wait before sending the request
+        """
+        with self._lock:
+            wait = self._get(key_id).reserve(tokens, time.monotonic())
+        if wait > 0:
+            logging.info(
+                f"Throttling request of API key {key_id} for {wait:.2f}s"
+            )
+        return wait
+
+    def acquire(self, key_id: str, tokens: int):
+        """
+        blocking acquire, for synchronous clients. It sleeps in the calling
+        thread, synchronous LLM calls must therefore run in a worker thread,
+        never on the event loop.
+        """
+        wait = self.reserve(key_id, tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, key_id: str, tokens: int):
+        wait = self.reserve(key_id, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update(self, key_id: str, status_code: int, headers: httpx.Headers):
+        """
+        Calibrates the buckets of the key from the rate limit headers of a response
+        """
+        with self._lock:
+            key_limit = self._get(key_id)
+            now = time.monotonic()
+            for name, bucket in (
+                ("requests", key_limit.requests),
+                ("tokens", key_limit.tokens),
+            ):
+                limit = headers.get(f"x-ratelimit-limit-{name}")
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if limit is None or remaining is None:
+                    continue
+                try:
+                    bucket.refill(now)
+                    bucket.calibrate(
+                        limit=float(limit),
+                        remaining=float(remaining),
+                        reset=parse_reset_duration(
+                            headers.get(f"x-ratelimit-reset-{name}")
+                        ),
+                    )
+                except ValueError:
+                    logging.warning(
+                        f"Invalid rate limit headers for API key {key_id}: "
+                        f"{limit}, {remaining}"
+                    )
+
+            if status_code == 429:
+                key_limit.rate_limited_responses += 1
+                reset = max(
+                    parse_reset_duration(headers.get("retry-after")),
+                    parse_reset_duration(
+                        headers.get("x-ratelimit-reset-requests")
+                    ),
+                    parse_reset_duration(
+                        headers.get("x-ratelimit-reset-tokens")
+                    ),
+                    1.0,
+                )
+                key_limit.blocked_until = max(
+                    key_limit.blocked_until, now + reset
+                )
+                logging.warning(
+                    f"API key {key_id} hit the rate limit, blocking it for {reset:.2f}s"
+                )
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                key_id: key_limit.to_dict()
+                for key_id, key_limit in self._keys.items()
+            }
+
+
+rate_limiter = RateLimiter()
+
+# request extension which exempts a request from throttling, e.g. the warm-up
+# of a connection, which does not use the budget of generations
+SKIP_RATE_LIMIT_EXTENSION = "xleap_skip_rate_limit"
+
+
+def _get_throttled_key_id(request: httpx.Request) -> str | None:
+    """returns the key ID of a request which has to pass the rate limiter"""
+    if request.extensions.get(SKIP_RATE_LIMIT_EXTENSION):
+        return None
+    return get_key_id(request)
+
+
+def _on_request(request: httpx.Request):
+    key_id = _get_throttled_key_id(request)
+    if key_id is not None:
+        rate_limiter.acquire(key_id, estimate_tokens(request))
+
+
+def _on_response(response: httpx.Response):
+    key_id = get_key_id(response.request)
+    if key_id is not None:
+        rate_limiter.update(key_id, response.status_code, response.headers)
+
+
+async def _on_request_async(request: httpx.Request):
+    key_id = _get_throttled_key_id(request)
+    if key_id is not None:
+        await rate_limiter.acquire_async(key_id, estimate_tokens(request))
+
+
+async def _on_response_async(response: httpx.Response):
+    _on_response(response)
+
+
+# event hooks of the shared HTTP clients
+rate_limit_event_hooks = {
+    "request": [_on_request],
+    "response": [_on_response],
+}
+async_rate_limit_event_hooks = {
+    "request": [_on_request_async],
+    "response": [_on_response_async],
+}
@@ -0,0 +1,147 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.core.config import settings
+
+
+class TokenUsage:
+    """
+    The accumulated token usage of an agent
+    """
+
+    def __init__(self):
+        self.calls = 0
+        # calls whose usage the provider did not report (streamed calls)
+        self.unreported_calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def cached_share(self) -> float:
+        """returns the share of prompt tokens which were served from the provider's cache"""
+        if self.prompt_tokens == 0:
+            return 0.0
+        return self.cached_tokens / self.prompt_tokens
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "unreported_calls": self.unreported_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_share": round(self.cached_share(), 4),
+        }
+
+
+class TokenUsageTracker:
+    """
+    Collects the token usage reported by the provider per agent, so the benefit
+    of prompt prefix caching can be measured.
+    The usage of the least recently used agents is dropped once more than
+    max_agents agents are tracked, deactivated agents are forgotten.
+    """
+
+    def __init__(self, max_agents: int = settings.TOKEN_USAGE_MAX_AGENTS):
+        self._lock = threading.Lock()
+        self._max_agents = max_agents
+        self._usage: OrderedDict[str, TokenUsage] = OrderedDict()
+
+    def _get(self, agent_id: str) -> TokenUsage:
+        """returns the usage of the agent as most recently used"""
+        usage = self._usage.get(agent_id)
+        if usage is None:
+            usage = self._usage[agent_id] = TokenUsage()
+            while len(self._usage) > self._max_agents:
+                self._usage.popitem(last=False)
+        else:
+            self._usage.move_to_end(agent_id)
+        return usage
+
+    def record(
+        self,
+        agent_id: str,
+        prompt_tokens: int,
+        cached_tokens: int,
+        completion_tokens: int,
+    ) -> TokenUsage:
+        with self._lock:
+            usage = self._get(agent_id)
+            usage.calls += 1
+            usage.prompt_tokens += prompt_tokens
+            usage.cached_tokens += cached_tokens
+            usage.completion_tokens += completion_tokens
+            return usage
+
+    def record_unreported(self, agent_id: str) -> TokenUsage:
+        """counts a call whose usage was not reported, e.g. a streamed call"""
+        with self._lock:
+            usage = self._get(agent_id)
+            usage.unreported_calls += 1
+            return usage
+
+    def forget(self, agent_id: str) -> None:
+        """drops the usage of an agent, e.g. when it is deactivated"""
+        with self._lock:
+            self._usage.pop(str(agent_id), None)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                agent_id: usage.to_dict()
+                for agent_id, usage in self._usage.items()
+            }
+
+
+token_usage_tracker = TokenUsageTracker()
+
+
+def _get_cached_tokens(token_usage: dict) -> int:
+    """
+    Extracts the number of cached prompt tokens from the usage reported by the provider
+    (OpenAI: usage.prompt_tokens_details.cached_tokens)
+    """
+    details = token_usage.get("prompt_tokens_details") or {}
+    if not isinstance(details, dict):
+        return 0
+    return details.get("cached_tokens") or 0
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """
+    Langchain callback which reports the prompt, cached and completion tokens of
+    every LLM call of an agent.
+    Streamed calls do not report usage (the OpenAI integration drops the usage
+    chunk of a stream), they are counted as unreported calls so the share of
+    calls the cached share does not cover is visible.
+    """
+
+    def __init__(self, agent_id: str):
+        self.agent_id = agent_id
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if not token_usage:
+            token_usage_tracker.record_unreported(self.agent_id)
+            return
+
+        prompt_tokens = token_usage.get("prompt_tokens") or 0
+        cached_tokens = _get_cached_tokens(token_usage)
+        completion_tokens = token_usage.get("completion_tokens") or 0
+
+        usage = token_usage_tracker.record(
+            agent_id=self.agent_id,
+            prompt_tokens=prompt_tokens,
+            cached_tokens=cached_tokens,
+            completion_tokens=completion_tokens,
+        )
+        logging.info(
+            f"Agent ({self.agent_id}) LLM call used {prompt_tokens} prompt tokens "
+            f"({cached_tokens} cached) and {completion_tokens} completion tokens, "
+            f"cached share so far: {usage.cached_share():.1%}"
+        )
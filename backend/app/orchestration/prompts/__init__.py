@@ -1,5 +1,13 @@
 # isort: skip_file
-from .prompt_manager import langfuse_client, langfuse_handler  # noqa
+from .prompt_manager import close_langfuse_client, get_langfuse_client  # noqa
+from .prompt_store import (  # noqa
+    PromptStore,
+    prompt_store,
+    run_prompt_store_sync,
+)
+from .prompt_cache import CachedPrompt, PromptCache, prompt_cache  # noqa
+from .tracing import JobTrace, Tracer, tracer  # noqa
+from .idea_stream import post_streamed_ideas  # noqa
 from .brainstorm_base import BrainstormBasePrompt  # noqa
 from .base import BasePrompt  # noqa
 
@@ -9,8 +17,18 @@ from .xleap_system_prompt_base import (
 )
 
 __all__ = [
-    "langfuse_client",
-    "langfuse_handler",
+    "close_langfuse_client",
+    "get_langfuse_client",
+    "PromptStore",
+    "prompt_store",
+    "run_prompt_store_sync",
+    "CachedPrompt",
+    "PromptCache",
+    "prompt_cache",
+    "JobTrace",
+    "Tracer",
+    "tracer",
+    "post_streamed_ideas",
     "BrainstormBasePrompt",
     "BasePrompt",
     "GeneratedPrompt",
@@ -4,7 +4,7 @@ from langchain_core.prompts import ChatPromptTemplate
 
 from app.models import AIAgent, Briefing2, Idea
 from app.orchestration.prompts import BrainstormBasePrompt
-from app.utils import TextTypeSwapper
+from app.utils import add_typos
 
 
 class BasePrompt(BrainstormBasePrompt):
@@ -30,8 +30,7 @@ class BasePrompt(BrainstormBasePrompt):
 
     def _alter_generated_idea(self, idea_to_post: str) -> str:
         # Add typos to the generated idea
-        swapper = TextTypeSwapper(text=idea_to_post, typo_prob=0.01)
-        return swapper.add_typos().get_text()
+        return add_typos(idea_to_post, typo_prob=0.01)
 
     @abstractmethod
     async def generate_idea(self) -> str:
@@ -1,6 +1,6 @@
-import json
 import logging
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterable
 from typing import Any
 
 import aiohttp
@@ -8,8 +8,18 @@ from langchain_core.prompts import ChatPromptTemplate
 from sqlmodel import Session
 
 from app.models import AIAgent, Idea
-from app.orchestration.data import resolve_server_addr
-from app.orchestration.prompts import langfuse_client, langfuse_handler
+from app.orchestration.data import (
+    deactivate_refused_agent,
+    idea_outbox,
+    resolve_server_addr_async,
+)
+from app.orchestration.llm import get_current_deadline
+from app.orchestration.prompts import (
+    JobTrace,
+    post_streamed_ideas,
+    prompt_cache,
+    tracer,
+)
 
 
 class BrainstormBasePrompt(ABC):
@@ -17,8 +27,7 @@ class BrainstormBasePrompt(ABC):
     Abstract class for generating prompts
     """
 
-    _langfuse_client = langfuse_client
-    _langfuse_handler = langfuse_handler
+    _prompt_cache = prompt_cache
 
     _agent: AIAgent
     _ideas: list[Idea] | None
@@ -33,12 +42,24 @@ class BrainstormBasePrompt(ABC):
     ):
         self._agent = agent
         self._api_key = agent.api_key
+        self._api_url = agent.api_url
         self._model = agent.model
         self._temperature = temperature
         self._ideas = ideas
         self.generated_idea: str | list[str | dict[Any, Any]] | None = None
         self.task_reference = task_reference
         self._ideas_to_generate = ideas_to_generate
+        # the Langfuse trace of the generation, started with the first call
+        self._trace: JobTrace | None = None
+
+    def _get_trace(self) -> JobTrace:
+        """returns the trace of this generation, all its LLM calls share it"""
+        if self._trace is None:
+            self._trace = tracer.start_trace(
+                name=type(self).__name__,
+                metadata={"agent_id": str(self._agent.id)},
+            )
+        return self._trace
 
     def _alter_generated_idea(self, idea_to_post: str) -> str:
         """
@@ -54,7 +75,8 @@ class BrainstormBasePrompt(ABC):
         self, idea: str | None = None, task_reference: str | None = None
     ) -> None:
         """
-        Post idea to the XLeap
+        Post idea to the XLeap. The idea is delivered through the outbox, a
+        delivery failing for a transient reason is retried in the background.
         :param idea (optional), default self.generated_idea
         :param task_reference (optional, default self.task_reference)
           when an idea is created on demand or by a test briefing request
@@ -68,7 +90,7 @@ class BrainstormBasePrompt(ABC):
             task_reference = self.task_reference
 
         # check if we can resolve the server address in DNS
-        resolve_server_addr(self._agent.server_address)
+        await resolve_server_addr_async(self._agent.server_address)
 
         # Maybe alter generated Idea before sending it
         idea_to_post = self._alter_generated_idea(idea)
@@ -87,18 +109,36 @@ class BrainstormBasePrompt(ABC):
                 """
         )
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url=f"{self._agent.server_address}/services/api/sessions"
-                f"/{self._agent.session_id}/brainstorms/"
-                f"{self._agent.workspace_id}/ideas",
-                data=json.dumps(data),
-                headers={
-                    "Authorization": f"Bearer {self._agent.secret}",
-                    "content-type": "application/json",
-                },
-            ) as response:
-                response.raise_for_status()
+        # the idea is stored first, it is retried if XLeap is unavailable
+        await idea_outbox.post(
+            agent_id=self._agent.id,
+            secret=self._agent.secret,
+            url=f"{self._agent.server_address}/services/api/sessions"
+            f"/{self._agent.session_id}/brainstorms/"
+            f"{self._agent.workspace_id}/ideas",
+            data=data,
+        )
+
+    async def post_streamed_ideas(
+        self,
+        ideas: AsyncIterable[str | None],
+        task_reference: str | None = None,
+    ) -> None:
+        """
+        Posts the ideas of an LLM stream while it is still streaming, the
+        stream is bounded by the deadline of the current job. The ideas keep
+        their order.
+        :param ideas: the stream of ideas
+        :param task_reference (optional, default self.task_reference)
+        :raises aiohttp.ClientResponseError: if XLeap refused an idea
+        """
+
+        async def post(idea: str):
+            await self.post_idea(idea=idea, task_reference=task_reference)
+
+        await post_streamed_ideas(
+            ideas, post, timeout=get_current_deadline().remaining()
+        )
 
     @staticmethod
     def maybe_deactivate_agent(
@@ -108,31 +148,13 @@ class BrainstormBasePrompt(ABC):
         Deactivates the agent is these HTTP status are returned
           402 Payment Required - if the XLeap subscription expired
           409 Conflict - when an agent is not supposed to be active
+        (the same policy as for the ideas refused in the outbox)
 
         :param err: a  ClientResponseError
         :param agent: the current agent
         :param session: the DB session
-        :return: the updated agent object
         """
-        must_deactivate_agent = False
-        # 402 payment required => XLeap license expired
-        if 402 == err.status:
-            logging.info(
-                "XLeap subscription expired, agent is being deactivated"
-            )
-            must_deactivate_agent = True
-        # 409 conflict => The agent should not be generating content since it was deactivated
-        elif 409 == err.status:
-            logging.info("Agent should not have been active, deactivating")
-            must_deactivate_agent = True
-
-        if must_deactivate_agent:
-            # update the agent object before changing it
-            session.refresh(agent)
-            if agent.is_active:
-                agent.is_active = False
-                session.merge(agent)
-                session.commit()
+        deactivate_refused_agent(err, agent, session)
 
     @abstractmethod
     async def generate_idea(self) -> str:
@@ -153,8 +175,7 @@ class BrainstormBasePrompt(ABC):
 
     async def _get_prompt_from_langfuse(self, prompt_name: str) -> str:
         """
-        Get prompt from langfuse
+        Get prompt from langfuse (cached)
         """
-        prompt_obj = self._langfuse_client.get_prompt(prompt_name)
-        prompt = prompt_obj.get_langchain_prompt()
-        return prompt
+        prompt_obj = await self._prompt_cache.get(prompt_name)
+        return prompt_obj.get_langchain_prompt()
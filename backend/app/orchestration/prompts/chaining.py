@@ -1,20 +1,20 @@
-import re
-
 import aiohttp
 from langchain.chains.llm import LLMChain
 from langchain.chains.sequential import SequentialChain
 from langchain_community.document_transformers import LongContextReorder
 from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
 
 from app.api.deps import SessionDep
-from app.core.config import settings
 from app.models import AIAgent
-from app.orchestration.prompts import BasePrompt, langfuse_handler
+from app.orchestration.llm import call_with_deadline, create_chat_model
+from app.orchestration.prompts import BasePrompt
 from app.utils import get_last_n_ideas
 from app.utils.agents import get_agent_by_id
 from app.utils.briefings import get_briefing2_by_agent_id
+from app.utils.output_parsing import SELECTED_IDEA_STOP, extract_selected_idea
 
 ##
 # Currently using briefing.additional_info as the only instruction (previously briefing.question)
@@ -82,31 +82,37 @@ class ChainingPrompt(BasePrompt):
         """
         # Initialize different LLM configurations for each chain step with
         # different temperatures
-        llm_tone = ChatOpenAI(
-            openai_api_key=self._api_key,
-            model_name=self._model,
+        llm_tone = create_chat_model(
+            api_key=self._api_key,
+            base_url=self._api_url,
+            model=self._model,
             # Lower temperature for more consistent and conservative output
             temperature=0.3,
-            openai_proxy=settings.HTTP_PROXY,
+            # the calls are retried within the deadline of the job
+            max_retries=0,
         )
 
-        llm_ideas = ChatOpenAI(
-            openai_api_key=self._api_key,
-            model_name=self._model,
+        llm_ideas = create_chat_model(
+            api_key=self._api_key,
+            base_url=self._api_url,
+            model=self._model,
             # Higher temperature for more creative and diverse ideas
             temperature=0.7,
             top_p=0.7,
             frequency_penalty=0.7,
             presence_penalty=0.7,
-            openai_proxy=settings.HTTP_PROXY,
+            # the calls are retried within the deadline of the job
+            max_retries=0,
         )
 
-        llm_selection = ChatOpenAI(
-            openai_api_key=self._api_key,
-            model_name=self._model,
+        llm_selection = create_chat_model(
+            api_key=self._api_key,
+            base_url=self._api_url,
+            model=self._model,
             # Moderate temperature for balanced idea selection
             temperature=0.5,
-            openai_proxy=settings.HTTP_PROXY,
+            # the calls are retried within the deadline of the job
+            max_retries=0,
         )
 
         # Load examples or any needed data
@@ -122,7 +128,6 @@ class ChainingPrompt(BasePrompt):
             chains=[
                 tone_in_brainstorming,
                 idea_generation_chain,
-                idea_selection_chain,
             ],
             input_variables=[
                 "question",
@@ -132,24 +137,35 @@ class ChainingPrompt(BasePrompt):
                 "language",
                 "context",
             ],
-            output_variables=["selected_idea"],
+            output_variables=["tone", "generated_ideas"],
         )
+        config = {"callbacks": self._get_trace().get_callbacks()}
 
         # Invoke the chain with the input
-        idea = await ss_chain.ainvoke(
-            input={
-                "question": self._briefing.workspace_instruction,
-                "idea": examples,
-                "persona": self._briefing.persona,
-                "setting": self._briefing.participant_info,
-                "context": self._briefing.workspace_info,
-                "language": "German",
-            },
-            config={"callbacks": [langfuse_handler]},
+        values = await call_with_deadline(
+            lambda: ss_chain.ainvoke(
+                input={
+                    "question": self._briefing.workspace_instruction,
+                    "idea": examples,
+                    "persona": self._briefing.persona,
+                    "setting": self._briefing.participant_info,
+                    "context": self._briefing.workspace_info,
+                    "language": "German",
+                },
+                config=config,
+            ),
+            name=f"idea chain of agent {self._agent.id}",
         )
 
-        # Parse the output
-        self.generated_idea = await self._parse_idea(idea["selected_idea"])
+        # The selection is streamed, the LLM stops at the closing tag. The
+        # selected idea is parsed while streaming, a response without a
+        # selected idea raises NoSelectedIdeaError and nothing is posted.
+        self.generated_idea = await call_with_deadline(
+            lambda: extract_selected_idea(
+                idea_selection_chain.astream(input=values, config=config)
+            ),
+            name=f"idea selection of agent {self._agent.id}",
+        )
 
     async def _generate_multiple_ideas(self, llm) -> LLMChain:
         idea_generation_prompt = await self._generate_prompt(
@@ -162,21 +178,23 @@ class ChainingPrompt(BasePrompt):
         )
         return idea_generation_chain
 
-    async def _select_idea(self, llm) -> LLMChain:
+    async def _select_idea(self, llm) -> Runnable[dict, str]:
         """
-        Generate prompt for prompt chaining
+        Generate the chain selecting one of the generated ideas. The LLM
+        stops at the closing tag of the selected idea.
 
         Returns:
-            str: Generated prompt
+            Runnable: the chain streaming the selection
 
         """
         idea_selection_prompt = await self._generate_prompt(
             question="CHAINING_PROMPT_SELECTION"
         )
-        idea_selection_chain: LLMChain = LLMChain(
-            llm=llm, prompt=idea_selection_prompt, output_key="selected_idea"
+        return (
+            idea_selection_prompt
+            | llm.bind(stop=[SELECTED_IDEA_STOP])
+            | StrOutputParser()
         )
-        return idea_selection_chain
 
     async def _describe_tone(self, llm) -> LLMChain:
         """
@@ -237,26 +255,3 @@ class ChainingPrompt(BasePrompt):
             idea_examples += "- " + example.page_content + "\n"
 
         return idea_examples
-
-    @staticmethod
-    async def _parse_idea(idea: str) -> str:
-        """
-        Parse the idea generated by the AI
-
-        Args:
-            idea (str): Idea generated by the AI
-
-        Returns:
-            str: Parsed idea
-        """
-        # Remove the tags from the idea
-        pattern = r"<selected_idea[^>]*>(.*?)<\/selected_idea>"
-        content = re.search(pattern, idea, re.DOTALL).group(1).strip()
-
-        # Remove all occurrences of **
-        content_without_asterisks = content.replace("**", "")
-
-        # Remove all occurrences of "
-        content_without_quotes = content_without_asterisks.replace('"', "")
-
-        return content_without_quotes
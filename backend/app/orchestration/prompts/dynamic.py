@@ -4,9 +4,14 @@ from sqlmodel import Session
 
 from app.core.db import engine
 from app.models import PromptStrategyType
+from app.orchestration.llm import JobType, deadline_scope
 from app.utils import (
     AgentGenerationLock,
+    agent_manager,
+    get_agent_by_id,
+    get_last_ai_idea,
     get_prompt_strategy,
+    should_ai_post_new_idea,
 )
 
 from .chaining import generate_idea_and_post as chaining_generate_idea_and_post
@@ -17,6 +22,14 @@ from .multi_agent import (
 from .xleap_few_shot import (
     generate_idea_and_post as xleap_generate_idea_and_post,
 )
+from .xleap_few_shot import (
+    pregenerate_idea as xleap_pregenerate_idea,
+)
+
+SPECULATIVE_STRATEGY_TYPES = frozenset(
+    {PromptStrategyType.XLEAP_FEW_SHOT, PromptStrategyType.XLEAP_ZERO_SHOT}
+)
+""" the prompt strategies which support speculative ideas """
 
 
 async def generate_idea_and_post(
@@ -37,7 +50,10 @@ async def generate_idea_and_post(
            every generated idea to XLeap
     :return:
     """
-    with Session(engine) as session:
+    job_type = (
+        JobType.PERIODIC if task_reference is None else JobType.ON_DEMAND
+    )
+    with Session(engine) as session, deadline_scope(job_type):
         try:
             strategy = get_prompt_strategy(
                 agent_id=agent_id, host_id=host_id, session=session
@@ -81,4 +97,72 @@ async def generate_idea_and_post(
             lock.set_last_idea(None)
             raise e
         finally:
+            # the triggers which arrived meanwhile were answered by this
+            # generation, a pre-generation must not evaluate them later
+            agent_manager.take_pending_trigger(lock.agent_id)
             lock.release()
+
+
+async def pregenerate_idea(
+    agent_id: str,
+    host_id: str | None,
+    lock: AgentGenerationLock,
+) -> None:
+    """
+    Pre-generates a speculative candidate idea for the specified agent while it holds
+    the generation lock. Only the XLeap prompt strategies support speculative ideas.
+    If the agent was triggered while the candidate was generated, the trigger is
+    evaluated afterwards (even if the pre-generation failed) so it is not lost.
+    :param agent_id: the ID of the agent
+    :param host_id: the ID of the XLeap session's host (used to select the prompt strategy by host ID)
+    :param lock: the lock for generating ideas
+    :return:
+    """
+    try:
+        with Session(engine) as session, deadline_scope(JobType.PERIODIC):
+            try:
+                strategy = get_prompt_strategy(
+                    agent_id=agent_id, host_id=host_id, session=session
+                )
+
+                if strategy.type in SPECULATIVE_STRATEGY_TYPES:
+                    await xleap_pregenerate_idea(agent_id, session)
+                else:
+                    logging.info(
+                        f"Prompt strategy {strategy.type} of agent {agent_id} does not support speculative ideas"
+                    )
+            except Exception as e:
+                lock.set_last_idea(None)
+                raise e
+    finally:
+        answer_trigger = False
+        try:
+            answer_trigger = _should_answer_pending_trigger(agent_id, lock)
+        finally:
+            if not answer_trigger:
+                lock.release()
+        if answer_trigger:
+            # hands the lock over, the generation releases it
+            await generate_idea_and_post(agent_id, host_id, lock)
+
+
+def _should_answer_pending_trigger(
+    agent_id: str, lock: AgentGenerationLock
+) -> bool:
+    """
+    Checks whether the agent was triggered during its pre-generation and must post
+    an idea now. Takes the pending trigger.
+    :param agent_id: the ID of the agent
+    :param lock: the lock for generating ideas (held by the pre-generation)
+    :return: True if an idea must be generated and posted
+    """
+    if not agent_manager.take_pending_trigger(lock.agent_id):
+        return False
+    with Session(engine) as session:
+        agent = get_agent_by_id(agent_id, session)
+        if not agent.is_active or not should_ai_post_new_idea(
+            agent=agent, lock=lock, session=session
+        ):
+            return False
+        lock.set_last_idea(get_last_ai_idea(session, agent.id))
+        return True
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterable, Awaitable, Callable
+
+from app.core.config import settings
+
+
+async def _wait_for(task: asyncio.Future, poster: asyncio.Task):
+    """waits for the task, raises the error of a failed poster right away"""
+    await asyncio.wait([task, poster], return_when=asyncio.FIRST_COMPLETED)
+    # the poster only ends by an error
+    if poster.done():
+        poster.result()
+
+
+async def post_streamed_ideas(
+    ideas: AsyncIterable[str | None],
+    post: Callable[[str], Awaitable[None]],
+    timeout: float | None = None,
+    queue_size: int = settings.IDEA_STREAM_QUEUE_SIZE,
+) -> None:
+    """
+    Posts the ideas of an LLM stream while it is still streaming. The stream
+    fills a bounded queue which a single poster drains, so the stream does not
+    wait for the posts (unless the queue is full). The ideas are posted one
+    after the other in the order of the stream.
+    Ideas streamed before the stream failed (e.g. timed out) are still
+    posted, then the error of the stream is raised.
+    :param ideas: the stream of ideas, empty ideas are skipped
+    :param post: posts an idea
+    :param timeout: (optional) the seconds the stream may take
+    :param queue_size: the number of ideas waiting to be posted
+    :raises: the error of a failed post, the stream is cancelled
+    """
+    queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max(1, queue_size))
+
+    async def stream():
+        async with asyncio.timeout(timeout):
+            async for idea in ideas:
+                logging.info(f"Streamed idea: {idea}")
+                if idea:
+                    await queue.put(idea)
+
+    async def post_ideas():
+        while True:
+            idea = await queue.get()
+            try:
+                await post(idea)
+            finally:
+                queue.task_done()
+
+    poster = asyncio.create_task(post_ideas())
+    streamer = asyncio.create_task(stream())
+    tasks: list[asyncio.Future] = [streamer, poster]
+    try:
+        await _wait_for(streamer, poster)
+        drained = asyncio.ensure_future(queue.join())
+        tasks.append(drained)
+        await _wait_for(drained, poster)
+        # the ideas of the stream are posted, raise its error (if any)
+        streamer.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
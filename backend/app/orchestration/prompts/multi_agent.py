@@ -1,20 +1,30 @@
+import asyncio
 import copy
-import re
+from functools import partial
 
 import aiohttp
 from autogen import AssistantAgent, GroupChat, GroupChatManager, UserProxyAgent
 from langchain_community.document_transformers import LongContextReorder
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
 from app.api.deps import SessionDep
-from app.core.config import settings
 from app.models import AIAgent
-from app.orchestration.prompts import BasePrompt, langfuse_handler
+from app.orchestration.llm import (
+    call_with_deadline,
+    create_chat_model,
+    get_api_base_url,
+    get_http_client,
+)
+from app.orchestration.prompts import BasePrompt
 from app.utils import get_last_n_ideas
 from app.utils.agents import get_agent_by_id
 from app.utils.briefings import get_briefing2_by_agent_id
+from app.utils.output_parsing import (
+    SELECTED_IDEA_STOP,
+    NoSelectedIdeaError,
+    parse_selected_ideas,
+)
 
 
 async def generate_idea_and_post(
@@ -60,6 +70,15 @@ async def generate_idea_and_post(
             raise err
 
 
+def _completes_selected_idea(task: str, message: dict) -> bool:
+    """
+    whether an agent's reply completes the selected idea, the task message
+    (which may show the tags) does not end the discussion
+    """
+    content = message.get("content") or ""
+    return content != task and SELECTED_IDEA_STOP in content
+
+
 class MultiAgent(BasePrompt):
     """
     Class using Langchain and Autogen to facilitate collaborative
@@ -95,7 +114,7 @@ class MultiAgent(BasePrompt):
         messages = await self._conduct_group_discussion(agents, task_prompt)
 
         # Parse the output
-        self.generated_idea = await self._parse_idea(messages)
+        self.generated_idea = self._parse_idea(messages)
 
     def _generate_prompt(self):
         """
@@ -118,28 +137,28 @@ class MultiAgent(BasePrompt):
         tone_prompt = await self._generate_tone_analyis_prompt()
 
         # Initialize LLM to perform tone analysis
-        llm_tone = ChatOpenAI(
-            openai_api_key=self._api_key,
-            model_name=self._model,
+        llm_tone = create_chat_model(
+            api_key=self._api_key,
+            base_url=self._api_url,
+            model=self._model,
             # Lower temperature for more consistent and conservative output
             temperature=0.3,
-            openai_proxy=settings.HTTP_PROXY,
+            # the call is retried within the deadline of the job
+            max_retries=0,
         )
         chain = tone_prompt | llm_tone
 
         # Invoke chain
-        tone = chain.invoke(
-            input={
-                "question": self._briefing.workspace_instruction,
-                "idea": examples,
-            },
-            config={"callbacks": [langfuse_handler]},
+        tone = await call_with_deadline(
+            lambda: chain.ainvoke(
+                input={
+                    "question": self._briefing.workspace_instruction,
+                    "idea": examples,
+                },
+                config={"callbacks": self._get_trace().get_callbacks()},
+            ),
+            name=f"tone analysis of agent {self._agent.id}",
         )
-
-        # Storing trace id. Trace id will be required to upload multi-agent
-        # conversation
-        self._trace_id = langfuse_handler.trace.id
-
         return tone.content
 
     async def _initialize_agents(self, tone: str) -> list[AssistantAgent]:
@@ -172,7 +191,7 @@ class MultiAgent(BasePrompt):
             "OTHER", self._briefing.persona, tone
         )
 
-        #agent_list = [user_proxy, mayor, second_agent]
+        # agent_list = [user_proxy, mayor, second_agent]
         agent_list = [mayor, second_agent]
 
         return agent_list
@@ -183,7 +202,7 @@ class MultiAgent(BasePrompt):
         task: str,
         max_rounds: int = 5,
         allow_repeat_speaker: bool = True,
-    ) -> str:
+    ) -> list[dict]:
         """
         Sets up a group chat environment for the agents with specified
         configurations.
@@ -199,7 +218,7 @@ class MultiAgent(BasePrompt):
                 the same agent to speak consecutively. Default is True.
 
         Returns:
-            str: Concatenated string of all messages from the group chat.
+            List[Dict]: The messages of the group chat.
         """
         # Get configs for discussion
         llm_configs = await self._get_agent_configs()
@@ -213,18 +232,26 @@ class MultiAgent(BasePrompt):
         )
         # This manager will handle the operation and progression of the
         # group chat.
+        # The discussion ends with the first idea an agent selected, no
+        # further rounds are generated after the selection. The reply which
+        # selected it is the last message of the chat.
         manager = GroupChatManager(
-            groupchat=group_chat, llm_config=llm_configs
+            groupchat=group_chat,
+            llm_config=llm_configs,
+            is_termination_msg=partial(_completes_selected_idea, task),
         )
         # The first agent in the list starts the chat by sending an initial
         # message (task) which sets the context or the topic for the group
         # discussion.
-        agents[0].initiate_chat(manager, message=task)
+        # Autogen calls the LLM synchronously, the chat runs in a worker
+        # thread so that it does not block the event loop (e.g. while its
+        # requests are throttled by the rate limiter).
+        await asyncio.to_thread(agents[0].initiate_chat, manager, message=task)
 
         # Add conversation to trace
         await self.add_conversation_to_trace(task, group_chat, agents)
 
-        return manager.messages_to_string(group_chat.messages)
+        return group_chat.messages
 
     async def _generate_tone_analyis_prompt(self) -> ChatPromptTemplate:  # type: ignore
         """
@@ -268,7 +295,7 @@ class MultiAgent(BasePrompt):
             str: The final composed task prompt.
         """
         # Template for task description
-        task_prompt_template = self._langfuse_client.get_prompt(
+        task_prompt_template = await self._prompt_cache.get(
             "MULTI_AGENT_TASK_PROMPT"
         )
 
@@ -305,7 +332,7 @@ class MultiAgent(BasePrompt):
             message by an agent.
         """
         # Template for system message of agent
-        agent_system_prompt_template = self._langfuse_client.get_prompt(
+        agent_system_prompt_template = await self._prompt_cache.get(
             f"SYSTEM_PROMPT_{type}_AGENTS"
         )
 
@@ -370,17 +397,17 @@ class MultiAgent(BasePrompt):
         # Create a deep copy of the dictionary to modify
         config_copy = copy.deepcopy(llm_configs)
 
-        # Remove 'api_key' from the copy
+        # Remove 'api_key' and the HTTP client from the copy
         if "api_key" in config_copy["config_list"][0]:
             del config_copy["config_list"][0]["api_key"]
+        config_copy["config_list"][0].pop("http_client", None)
 
         # Document all input messages
         inputs = {agent.name: agent.system_message for agent in agents}
         inputs["task"] = task
 
-        # Create new nested span
-        langfuse_handler.langfuse.span(
-            trace_id=self._trace_id,
+        # Create new nested span in the trace of this generation
+        self._get_trace().span(
             name="Multi-Agent Conversation",
             metadata=config_copy,
             input=inputs,
@@ -422,7 +449,13 @@ class MultiAgent(BasePrompt):
         # Define the configuration settings for the language model interaction
         llm_config = {
             "config_list": [
-                {"model": self._agent.model, "api_key": self._agent.api_key}
+                {
+                    "model": self._agent.model,
+                    "api_key": self._agent.api_key,
+                    "base_url": get_api_base_url(self._agent.api_url),
+                    # requests pass the shared rate limiter
+                    "http_client": get_http_client(),
+                }
             ],
             "temperature": 0.7,
             # Adjusts the randomness of the model's responses
@@ -433,29 +466,28 @@ class MultiAgent(BasePrompt):
         return llm_config
 
     @staticmethod
-    async def _parse_idea(text: str) -> str:
+    def _parse_idea(messages: list[dict]) -> str:
         """
-        Extracts and processes the final idea from the agents' conversation
-        text.
+        Extracts the final idea from the agents' conversation. The messages
+        are parsed as they are, without the escaping of a JSON transcript.
 
         Args:
-            text (str): The conversation text containing multiple agent
-                interactions.
+            messages (List[Dict]): The messages of the agents' conversation.
 
         Returns:
-            str: The final parsed idea, cleaned and formatted.
+            str: The last selected idea, cleaned and formatted.
+
+        Raises:
+            NoSelectedIdeaError: If no agent selected an idea.
         """
-        # Get all generated ideas without tags
-        pattern = r"<selected_idea.*?>(.*?)<\/selected_idea>"
-        matches = re.findall(pattern, text)
-
-        # Return the content of the last match
-        content = matches[-1]
-        # Transform special characters
-        content = content.strip().encode("utf-8").decode("unicode_escape")
-        # Remove all occurrences of **
-        content = content.replace("**", "")
-        # Remove all occurrences of "
-        content = content.replace('"', "")
-
-        return content
+        contents = [message.get("content") or "" for message in messages]
+        ideas = [
+            idea
+            for content in contents
+            for idea in parse_selected_ideas(content)
+        ]
+        if not ideas:
+            raise NoSelectedIdeaError(
+                "The discussion of the agents selected no idea"
+            )
+        return ideas[-1]
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import time
+from collections.abc import Coroutine
+from typing import Any
+
+from langfuse import Langfuse
+from langfuse.model import BasePromptClient
+
+from app.core.config import settings
+
+from .prompt_manager import get_langfuse_client
+from .prompt_store import PromptStore, prompt_store
+
+
+class CachedPrompt:
+    """
+    A text prompt of Langfuse as held by the PromptCache
+    """
+
+    def __init__(self, name: str, version: int | None, prompt: str):
+        self.name = name
+        self.version = version
+        # the raw prompt text with {{variables}}
+        self.prompt = prompt
+        # the prompt text with langchain {variables}
+        self.langchain_prompt = BasePromptClient._get_langchain_prompt_string(
+            prompt
+        )
+
+    def get_langchain_prompt(self) -> str:
+        return self.langchain_prompt
+
+    def compile(self, **kwargs: Any) -> str:
+        """fills the variables into the prompt (like TextPromptClient.compile)"""
+        return BasePromptClient._compile_template_string(self.prompt, kwargs)
+
+
+class _CacheEntry:
+    def __init__(self, prompt: CachedPrompt, ttl_seconds: float):
+        self.prompt = prompt
+        self.refresh_at = time.monotonic() + ttl_seconds
+
+    def is_stale(self) -> bool:
+        return time.monotonic() >= self.refresh_at
+
+
+class PromptCache:
+    """
+    In-process cache of Langfuse prompts keyed by prompt name and version.
+    Entries older than the TTL are served while they are refreshed in the
+    background. If Langfuse is slow or down the stale entries are served
+    further on, so only the first request of a prompt depends on Langfuse.
+    Prompts which are not cached yet are read from the prompt store first
+    (and refreshed from Langfuse on their next request), prompts fetched from
+    Langfuse are stored.
+    All access happens in the event loop, Langfuse and the store are called in
+    a thread.
+    """
+
+    def __init__(
+        self,
+        client: Langfuse | None = None,
+        ttl_seconds: float = settings.PROMPT_CACHE_TTL_SECONDS,
+        retry_seconds: float = settings.PROMPT_CACHE_RETRY_SECONDS,
+        store: PromptStore | None = None,
+    ):
+        # None: the Langfuse client of the service
+        self._client = client
+        # None: prompts are not stored
+        self._store = store
+        self._ttl_seconds = ttl_seconds
+        self._retry_seconds = retry_seconds
+        self._entries: dict[tuple[str, int | None], _CacheEntry] = {}
+        self._fetches: dict[tuple[str, int | None], asyncio.Future] = {}
+        # background refreshes and saves, the event loop only keeps weak
+        # references to tasks
+        self._tasks: set[asyncio.Task] = set()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._store_hits = 0
+        self._refreshes = 0
+        self._refresh_errors = 0
+        self._refresh_seconds_total = 0.0
+        self._refresh_seconds_max = 0.0
+
+    async def get(self, name: str, version: int | None = None) -> CachedPrompt:
+        """
+        returns the prompt, stale prompts are refreshed in the background
+        :raises the error of Langfuse if the prompt is not cached yet
+        """
+        key = (name, version)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return await self._fetch(key, from_store=True)
+
+        if entry.is_stale():
+            self._stale_hits += 1
+            if key not in self._fetches:
+                # do not refresh again before the retry interval
+                entry.refresh_at = time.monotonic() + self._retry_seconds
+                self._start_task(self._refresh(key))
+        else:
+            self._hits += 1
+        return entry.prompt
+
+    def put(self, name: str, version: int | None, prompt: str) -> CachedPrompt:
+        """adds a prompt, e.g. after it was created in Langfuse"""
+        cached_prompt = CachedPrompt(name=name, version=version, prompt=prompt)
+        self._entries[(name, version)] = _CacheEntry(
+            cached_prompt, self._ttl_seconds
+        )
+        return cached_prompt
+
+    async def load_store(self) -> int:
+        """
+        Adds all stored prompts (e.g. on startup), they are refreshed from
+        Langfuse on their first request
+        :return: the number of added prompts
+        """
+        if self._store is None:
+            return 0
+        stored_prompts = await asyncio.to_thread(self._store.load_all)
+        for stored in stored_prompts:
+            if (stored.name, None) not in self._entries:
+                self._put_stored(stored.name, stored.prompt)
+        return len(stored_prompts)
+
+    def _put_stored(self, name: str, prompt: str) -> CachedPrompt:
+        cached_prompt = self.put(name, None, prompt)
+        # the stored prompt may be outdated
+        self._entries[(name, None)].refresh_at = time.monotonic()
+        return cached_prompt
+
+    def invalidate(self, name: str):
+        """removes all versions of a prompt"""
+        for key in [key for key in self._entries if key[0] == name]:
+            del self._entries[key]
+
+    async def _fetch(
+        self, key: tuple[str, int | None], from_store: bool = False
+    ) -> CachedPrompt:
+        """
+        fetches the prompt, concurrent requests share one fetch
+        :param from_store: whether the prompt store is read before Langfuse
+        """
+        fetch = self._fetches.get(key)
+        if fetch is None:
+            fetch = asyncio.ensure_future(
+                self._fetch_from_store(key)
+                if from_store
+                else self._fetch_from_langfuse(key)
+            )
+            self._fetches[key] = fetch
+            fetch.add_done_callback(lambda _: self._fetches.pop(key, None))
+        return await asyncio.shield(fetch)
+
+    async def _fetch_from_store(
+        self, key: tuple[str, int | None]
+    ) -> CachedPrompt:
+        name, version = key
+        # the store holds the current version of each prompt only
+        if self._store is not None and version is None:
+            try:
+                stored = await asyncio.to_thread(self._store.load, name)
+            except Exception as err:
+                logging.warning(
+                    f"Loading prompt {name} from the store failed: {err}"
+                )
+                stored = None
+            if stored is not None:
+                self._store_hits += 1
+                return self._put_stored(name, stored.prompt)
+        return await self._fetch_from_langfuse(key)
+
+    async def _fetch_from_langfuse(
+        self, key: tuple[str, int | None]
+    ) -> CachedPrompt:
+        name, version = key
+        started = time.monotonic()
+        # cache_ttl_seconds=0 bypasses the cache of the Langfuse client
+        client = self._client or get_langfuse_client()
+        prompt_client = await asyncio.to_thread(
+            client.get_prompt, name, version, cache_ttl_seconds=0
+        )
+        elapsed = time.monotonic() - started
+        self._refreshes += 1
+        self._refresh_seconds_total += elapsed
+        self._refresh_seconds_max = max(self._refresh_seconds_max, elapsed)
+
+        entry = self._entries.get(key)
+        if (
+            self._store is not None
+            and version is None
+            and (entry is None or entry.prompt.prompt != prompt_client.prompt)
+        ):
+            self._start_task(
+                self._save(name, prompt_client.version, prompt_client.prompt)
+            )
+        return self.put(name, version, prompt_client.prompt)
+
+    def _start_task(self, coro: Coroutine[Any, Any, None]):
+        """runs the coroutine in the background until it completes"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _save(self, name: str, version: int | None, prompt: str):
+        try:
+            await asyncio.to_thread(self._store.save, name, version, prompt)  # type: ignore
+        except Exception as err:
+            logging.warning(f"Storing prompt {name} failed: {err}")
+
+    async def _refresh(self, key: tuple[str, int | None]):
+        try:
+            await self._fetch(key)
+        except Exception as err:
+            self._refresh_errors += 1
+            logging.warning(
+                f"Refreshing prompt {key[0]} (version {key[1]}) failed, "
+                f"serving the cached prompt: {err}"
+            )
+
+    def stats(self) -> dict[str, Any]:
+        requests = self._hits + self._stale_hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "misses": self._misses,
+            "store_hits": self._store_hits,
+            "hit_ratio": round(
+                (self._hits + self._stale_hits) / requests if requests else 0,
+                4,
+            ),
+            "refreshes": self._refreshes,
+            "refresh_errors": self._refresh_errors,
+            "refresh_seconds_avg": round(
+                self._refresh_seconds_total / self._refreshes
+                if self._refreshes
+                else 0,
+                4,
+            ),
+            "refresh_seconds_max": round(self._refresh_seconds_max, 4),
+        }
+
+
+prompt_cache = PromptCache(store=prompt_store)
@@ -1,18 +1,40 @@
+import threading
+
 from langfuse import Langfuse
-from langfuse.callback import CallbackHandler
 
 from app.core.config import settings
 
-# Initialize Langfuse client (prompt management)
-langfuse_client = Langfuse(
-    public_key=settings.LANGFUSE_PUBLIC_KEY,
-    secret_key=settings.LANGFUSE_SECRET_KEY,
-    host=settings.LANGFUSE_SERVER_URL,
-)
+_lock = threading.Lock()
+_langfuse_client: Langfuse | None = None
+
+
+def get_langfuse_client() -> Langfuse:
+    """
+    returns the Langfuse client (prompt management and tracing), it is created
+    on first use because it starts threads to export the traces
+    """
+    global _langfuse_client
+    with _lock:
+        if _langfuse_client is None:
+            _langfuse_client = Langfuse(
+                public_key=settings.LANGFUSE_PUBLIC_KEY,
+                secret_key=settings.LANGFUSE_SECRET_KEY,
+                host=settings.LANGFUSE_SERVER_URL,
+                threads=settings.LANGFUSE_EXPORT_THREADS,
+                flush_at=settings.LANGFUSE_FLUSH_AT,
+                flush_interval=settings.LANGFUSE_FLUSH_INTERVAL_SECONDS,
+            )
+        return _langfuse_client
+
 
-# Initialize Langfuse CallbackHandler for Langchain (tracing)
-langfuse_handler = CallbackHandler(
-    public_key=settings.LANGFUSE_PUBLIC_KEY,
-    secret_key=settings.LANGFUSE_SECRET_KEY,
-    host=settings.LANGFUSE_SERVER_URL,
-)
+def close_langfuse_client():
+    """
+    Exports the queued trace events and stops the threads of the Langfuse
+    client (if it was created). Blocks until the events are exported.
+    """
+    global _langfuse_client
+    with _lock:
+        client = _langfuse_client
+        _langfuse_client = None
+    if client is not None:
+        client.shutdown()
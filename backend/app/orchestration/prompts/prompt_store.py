@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from langfuse import Langfuse
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import LangfusePrompt
+
+from .prompt_manager import get_langfuse_client
+
+
+class PromptStore:
+    """
+    Mirrors the text prompts of Langfuse in the database of the service, so
+    prompts can be loaded without Langfuse (e.g. during outages or after a
+    restart). Prompts are stored when they are created or fetched from
+    Langfuse and synchronized periodically.
+    All methods block, call them in a thread.
+    """
+
+    def __init__(self, engine: Engine | None = None):
+        # None: the engine of the service (imported late, app.core.db
+        # depends on this package)
+        self._engine = engine
+
+    def _get_engine(self) -> Engine:
+        if self._engine is None:
+            from app.core.db import engine
+
+            self._engine = engine
+        return self._engine
+
+    def load(self, name: str) -> LangfusePrompt | None:
+        """returns the stored prompt, None if the prompt is not stored"""
+        with Session(self._get_engine()) as session:
+            return session.get(LangfusePrompt, name)
+
+    def load_all(self) -> list[LangfusePrompt]:
+        """returns all stored prompts (one query)"""
+        with Session(self._get_engine()) as session:
+            return list(session.exec(select(LangfusePrompt)).all())
+
+    def save(self, name: str, version: int | None, prompt: str):
+        """stores (inserts or updates) a prompt"""
+        with Session(self._get_engine()) as session:
+            session.merge(
+                LangfusePrompt(
+                    name=name,
+                    version=version,
+                    prompt=prompt,
+                    synced_at=datetime.utcnow(),
+                )
+            )
+            session.commit()
+
+    def sync(self, client: Langfuse) -> int:
+        """
+        Updates the stored prompts from Langfuse, settings.PROMPT_FETCH_CONCURRENCY
+        prompts are fetched concurrently. Prompts which cannot be fetched keep
+        their stored text.
+        :return: the number of updated prompts
+        """
+
+        def sync_prompt(stored: LangfusePrompt) -> bool:
+            try:
+                prompt_client = client.get_prompt(
+                    stored.name, None, cache_ttl_seconds=0
+                )
+            except Exception as err:
+                logging.warning(f"Syncing prompt {stored.name} failed: {err}")
+                return False
+            if (
+                prompt_client.prompt == stored.prompt
+                and prompt_client.version == stored.version
+            ):
+                return False
+            self.save(stored.name, prompt_client.version, prompt_client.prompt)
+            return True
+
+        stored_prompts = self.load_all()
+        if not stored_prompts:
+            return 0
+        workers = max(
+            1, min(len(stored_prompts), settings.PROMPT_FETCH_CONCURRENCY)
+        )
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return sum(executor.map(sync_prompt, stored_prompts))
+
+
+prompt_store = PromptStore()
+
+
+async def run_prompt_store_sync():
+    """
+    Synchronizes the prompt store with Langfuse every
+    settings.PROMPT_STORE_SYNC_SECONDS (forever)
+    """
+    while True:
+        await asyncio.sleep(settings.PROMPT_STORE_SYNC_SECONDS)
+        try:
+            updated = await asyncio.to_thread(
+                prompt_store.sync, get_langfuse_client()
+            )
+            logging.info(f"Synced prompt store, {updated} prompts updated")
+        except Exception as err:
+            logging.warning(f"Syncing the prompt store failed: {err}")
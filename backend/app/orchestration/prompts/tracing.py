@@ -0,0 +1,111 @@
+import logging
+import random
+import threading
+from typing import Any
+
+from langfuse import Langfuse
+from langfuse.callback import CallbackHandler
+from langfuse.client import StatefulTraceClient
+
+from app.core.config import settings
+from app.orchestration.llm import JobType, get_current_deadline
+
+from .prompt_manager import get_langfuse_client
+
+
+def _get_sample_rate(job_type: JobType) -> float:
+    match job_type:
+        case JobType.ON_DEMAND:
+            return settings.LANGFUSE_SAMPLE_RATE_ON_DEMAND
+        case JobType.TEST:
+            return settings.LANGFUSE_SAMPLE_RATE_TEST
+        case _:
+            return settings.LANGFUSE_SAMPLE_RATE_PERIODIC
+
+
+class JobTrace:
+    """
+    The Langfuse trace of one generation job. All LLM calls of the job are
+    traced with its own callback handler, hence concurrent jobs do not share
+    (and overwrite) the state of a handler.
+    """
+
+    def __init__(self, trace: StatefulTraceClient | None):
+        # None if the job is not sampled
+        self.trace = trace
+        self.handler = (
+            None if trace is None else CallbackHandler(stateful_client=trace)
+        )
+
+    @property
+    def trace_id(self) -> str | None:
+        return None if self.trace is None else self.trace.id
+
+    def get_callbacks(self) -> list:
+        """returns the callbacks to trace a langchain call, none if not sampled"""
+        return [] if self.handler is None else [self.handler]
+
+    def span(self, **kwargs: Any):
+        """adds a span to the trace (if sampled)"""
+        if self.trace is not None:
+            self.trace.span(**kwargs)
+
+
+class Tracer:
+    """
+    Creates the traces of generation jobs. Jobs are sampled with the rate of
+    their job type. Traces are exported by the Langfuse client in the
+    background (see settings.LANGFUSE_FLUSH_AT), its queue is bounded and
+    events are dropped (not awaited) once it is full, so tracing does not slow
+    down the generations under load.
+    """
+
+    def __init__(self, client: Langfuse | None = None):
+        # None: the Langfuse client of the service
+        self._client = client
+        self._lock = threading.Lock()
+        self._sampled = 0
+        self._skipped = 0
+
+    def start_trace(
+        self,
+        name: str,
+        job_type: JobType | None = None,
+        metadata: dict[str, Any] | None = None,
+    ) -> JobTrace:
+        """
+        Starts the trace of a job
+        :param name: the name of the trace, e.g. the prompt strategy
+        :param job_type: (optional) default the job type of the current deadline
+        :param metadata: (optional) e.g. the ID of the agent
+        :return: the trace, without a Langfuse trace if the job is not sampled
+        """
+        if job_type is None:
+            job_type = get_current_deadline().job_type
+
+        if random.random() >= _get_sample_rate(job_type):
+            with self._lock:
+                self._skipped += 1
+            return JobTrace(None)
+
+        with self._lock:
+            self._sampled += 1
+        try:
+            client = self._client or get_langfuse_client()
+            trace = client.trace(
+                name=name, metadata=metadata, tags=[str(job_type)]
+            )
+        except Exception as err:
+            logging.warning(f"Could not start the trace of {name}: {err}")
+            trace = None
+        return JobTrace(trace)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "sampled_jobs": self._sampled,
+                "skipped_jobs": self._skipped,
+            }
+
+
+tracer = Tracer()
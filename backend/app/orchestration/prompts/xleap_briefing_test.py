@@ -1,17 +1,19 @@
 import logging
 
-import aiohttp
 from langchain_core.prompts import (
     ChatPromptTemplate,
 )
-from langchain_openai import ChatOpenAI
 from sqlmodel import Session
 
-from app.core.config import settings
 from app.core.db import engine
 from app.crud import get_ai_agent_references
 from app.models import AIAgent, Briefing2, Briefing2Reference
-from app.orchestration.prompts import BrainstormBasePrompt, langfuse_handler
+from app.orchestration.llm import (
+    JobType,
+    create_chat_model,
+    deadline_scope,
+)
+from app.orchestration.prompts import BrainstormBasePrompt
 from app.utils.agents import get_agent_by_id
 from app.utils.briefings import get_briefing2_by_agent_id
 from app.utils.streaming_briefing_test_token_consumer import (
@@ -30,7 +32,7 @@ async def generate_ideas_and_post(
     Generate idea and post it to the XLeap server
     """
 
-    with Session(engine) as session:
+    with Session(engine) as session, deadline_scope(JobType.TEST):
         attached_agent = get_agent_by_id(agent_id, session)
         attached_briefing = get_briefing2_by_agent_id(agent_id, session)
 
@@ -90,33 +92,25 @@ class XLeapBriefingTest(BrainstormBasePrompt, XLeapSystemPromptBase):
         """
         final_prompt = await self._generate_prompt()
 
-        llm = ChatOpenAI(
-            openai_api_key=self._api_key,  # type: ignore
-            model_name=self._model,
+        llm = create_chat_model(
+            api_key=self._api_key,
+            base_url=self._api_url,
+            model=self._model,
             temperature=self._temperature,
-            openai_proxy=settings.HTTP_PROXY,
         )
 
         tokenizer = XLeapStreamingTokenizer()
 
         chain = final_prompt | llm | tokenizer
 
-        try:
-            async for chunk in chain.astream(
+        # the ideas are posted while the LLM is still streaming
+        await self.post_streamed_ideas(
+            chain.astream(
                 input=self._lang_chain_input,
-                config={"callbacks": [langfuse_handler]},
-            ):
-                logging.info(
-                    f"""
-                    XLeapBriefingTest.generate_and_post_ideas
-                    chunk is {chunk}
-                """
-                )
-                await self.post_idea(
-                    idea=chunk, task_reference=self._test_secret
-                )
-        except aiohttp.ClientResponseError as err:
-            raise err
+                config={"callbacks": self._get_trace().get_callbacks()},
+            ),
+            task_reference=self._test_secret,
+        )
 
     async def generate_test_prompt(self) -> GeneratedPrompt:
         """
@@ -1,5 +1,4 @@
 import logging
-import re
 
 import aiohttp
 from langchain_core.prompts import (
@@ -11,10 +10,22 @@ from app.api.deps import SessionDep
 from app.core.config import settings
 from app.crud import get_ai_agent_references
 from app.models import AIAgent, Briefing2, Briefing2Reference, Idea
-from app.orchestration.prompts import BrainstormBasePrompt, langfuse_handler
-from app.utils import get_last_n_ideas
+from app.orchestration.llm import (
+    TokenUsageCallbackHandler,
+    call_with_deadline,
+    create_chat_model,
+    generation_batcher,
+)
+from app.orchestration.prompts import BrainstormBasePrompt
+from app.utils import (
+    SpeculativeIdea,
+    agent_manager,
+    get_last_n_ideas,
+    is_speculative_idea_stale,
+)
 from app.utils.agents import get_agent_by_id
 from app.utils.briefings import get_briefing2_by_agent_id
+from app.utils.output_parsing import parse_selected_ideas
 from app.utils.streaming_briefing_test_token_consumer import (
     XLeapStreamingTokenizer,
 )
@@ -35,30 +46,36 @@ async def describe_system_prompt(
     return system_prompt
 
 
-async def generate_idea_and_post(
-    agent_id: str,
+def _create_xleap_prompt(
+    attached_agent: AIAgent,
     session: SessionDep,
     ideas_to_generate: int = 1,
     task_reference: str | None = None,
-) -> None:
+) -> tuple["XLeapBasicPrompt", list[Idea]]:
     """
-    Generate idea and post it to the XLeap server
-    :param agent_id: the ID of the agent
+    Creates the XLeapBasicPrompt for the agent from its briefing, references and latest ideas
+    :param attached_agent: the agent
     :param session: the database session
     :param ideas_to_generate: the number of ideas to generate
-    :param task_reference: if a task reference is given this is an on-demand generation
-      which can ignore the agent active check
-    :return:
+    :param task_reference: the task reference of an on-demand generation
+    :return: the prompt and the ideas it was created from
     """
-    attached_agent = get_agent_by_id(agent_id, session)
-    attached_briefing = get_briefing2_by_agent_id(agent_id, session)
+    attached_briefing = get_briefing2_by_agent_id(
+        str(attached_agent.id), session
+    )
 
     ideas_to_select = attached_briefing.frequency * 3
     if attached_briefing.frequency <= 0:
         ideas_to_select = 50
 
+    # the cacheable layout slides the window of ideas in whole blocks, and
+    # therefore may need up to one block more than the regular window
+    ideas_to_fetch = ideas_to_select
+    if settings.PROMPT_PREFIX_CACHING:
+        ideas_to_fetch += settings.PROMPT_PREFIX_CHUNK_SIZE
+
     attached_ideas = get_last_n_ideas(
-        session, n=ideas_to_select, agent_id=attached_agent.id
+        session, n=ideas_to_fetch, agent_id=attached_agent.id
     )
     references = get_ai_agent_references(session=session, agent=attached_agent)
 
@@ -69,25 +86,110 @@ async def generate_idea_and_post(
         references=references,
         task_reference=task_reference,
         ideas_to_generate=ideas_to_generate,
+        ideas_window=ideas_to_select,
+    )
+    return xleap_prompt, attached_ideas
+
+
+async def _maybe_post_speculative_idea(
+    attached_agent: AIAgent,
+    xleap_prompt: "XLeapBasicPrompt",
+    session: SessionDep,
+) -> bool:
+    """
+    Posts the candidate idea which was pre-generated for the agent, unless it became stale
+    :return: True if the candidate was posted, False if an idea must be generated
+    """
+    candidate = agent_manager.take_speculative_idea(attached_agent.id)
+    if candidate is None:
+        return False
+
+    if is_speculative_idea_stale(session, attached_agent.id, candidate):
+        return False
+
+    logging.info(f"Agent {attached_agent.id} is posting its speculative idea")
+    xleap_prompt.generated_idea = candidate.text
+    await xleap_prompt.post_idea()
+    return True
+
+
+async def generate_idea_and_post(
+    agent_id: str,
+    session: SessionDep,
+    ideas_to_generate: int = 1,
+    task_reference: str | None = None,
+) -> None:
+    """
+    Generate idea and post it to the XLeap server
+    :param agent_id: the ID of the agent
+    :param session: the database session
+    :param ideas_to_generate: the number of ideas to generate
+    :param task_reference: if a task reference is given this is an on-demand generation
+      which can ignore the agent active check
+    :return:
+    """
+    attached_agent = get_agent_by_id(agent_id, session)
+    xleap_prompt, _ = _create_xleap_prompt(
+        attached_agent, session, ideas_to_generate, task_reference
+    )
+    # only periodic generations of single ideas use speculative ideas
+    use_speculative_idea = (
+        settings.SPECULATIVE_GENERATION
+        and ideas_to_generate == 1
+        and task_reference is None
     )
-    # noinspection PyBroadException
     try:
-        try:
-            await xleap_prompt.generate_idea()
-        except (
-            aiohttp.ClientResponseError
-        ) as err:  # error when generated idea was sent to XLeap
-            session.refresh(attached_agent)
-            xleap_prompt.maybe_deactivate_agent(err, attached_agent, session)
-            raise err
-        except Exception:
-            await xleap_prompt.generate_idea()
+        if use_speculative_idea and await _maybe_post_speculative_idea(
+            attached_agent, xleap_prompt, session
+        ):
+            return
+        # LLM calls are retried within the deadline of the job
+        await xleap_prompt.generate_idea()
     except (
         aiohttp.ClientResponseError
     ) as err:  # error when generated idea was sent to XLeap
+        session.refresh(attached_agent)
+        xleap_prompt.maybe_deactivate_agent(err, attached_agent, session)
         raise err
 
 
+async def pregenerate_idea(agent_id: str, session: SessionDep) -> None:
+    """
+    Generates a candidate idea without posting it. The candidate is stored with the
+    agent manager and posted by the next periodic generate_idea_and_post unless it
+    became stale in the meantime.
+    :param agent_id: the ID of the agent
+    :param session: the database session
+    """
+    attached_agent = get_agent_by_id(agent_id, session)
+    # read before the briefing, a briefing change during the generation
+    # makes the candidate stale
+    briefing_generation = agent_manager.briefing_generation(attached_agent.id)
+    xleap_prompt, attached_ideas = _create_xleap_prompt(
+        attached_agent, session
+    )
+
+    candidate_text = await xleap_prompt.generate_candidate()
+    last_idea_count = max(
+        (idea.idea_count for idea in attached_ideas), default=0
+    )
+    stored = agent_manager.store_speculative_idea(
+        attached_agent.id,
+        SpeculativeIdea(
+            text=candidate_text,
+            last_idea_count=last_idea_count,
+            briefing_generation=briefing_generation,
+        ),
+    )
+    if not stored:
+        logging.info(
+            f"Agent {attached_agent.id} discarded a speculative idea, "
+            "its briefing changed during the generation"
+        )
+        return
+    logging.info(f"Agent {attached_agent.id} pre-generated a speculative idea")
+
+
 class XLeapBasicPrompt(BrainstormBasePrompt, XLeapSystemPromptBase):
     """
     Class using basic XLeap prompting and Langchain API to generate ideas
@@ -104,6 +206,7 @@ class XLeapBasicPrompt(BrainstormBasePrompt, XLeapSystemPromptBase):
         temperature: float = 0.5,
         task_reference: str | None = None,
         ideas_to_generate: int = 1,
+        ideas_window: int = 0,
     ):
         super().__init__(
             agent=agent,
@@ -114,6 +217,8 @@ class XLeapBasicPrompt(BrainstormBasePrompt, XLeapSystemPromptBase):
         )
         self._briefing = briefing
         self._references = references
+        # the number of latest human ideas the prompt must contain (0 = all)
+        self._ideas_window = ideas_window
 
     async def generate_idea(self) -> None:  # type: ignore
         """
@@ -124,45 +229,91 @@ class XLeapBasicPrompt(BrainstormBasePrompt, XLeapSystemPromptBase):
         """
         final_prompt = await self._generate_prompt()
 
-        llm = ChatOpenAI(
-            openai_api_key=self._api_key,  # type: ignore
-            model_name=self._model,
-            temperature=self._temperature,
-            openai_proxy=settings.HTTP_PROXY,
-        )
-
         if self._ideas_to_generate > 1:
+            # streamed ideas are posted immediately, therefore the stream
+            # cannot be retried as a whole. The OpenAI client retries the
+            # request, the stream is bounded by the deadline of the job.
+            llm = self._create_llm(max_retries=2)
             tokenizer = XLeapStreamingTokenizer()
             chain = final_prompt | llm | tokenizer
 
-            try:
-                async for chunk in chain.astream(
+            # the ideas are posted while the LLM is still streaming
+            await self.post_streamed_ideas(
+                chain.astream(
                     input=self._lang_chain_input,
-                    config={"callbacks": [langfuse_handler]},
-                ):
-                    logging.info(
-                        f"""
-                    XLeapBasicPrompt.generate_idea
-                    chunk is {chunk}
-                """
-                    )
-                    await self.post_idea(
-                        idea=chunk, task_reference=self.task_reference
-                    )
-            except aiohttp.ClientResponseError as err:
-                raise err
+                    config={"callbacks": self._get_callbacks()},
+                ),
+                task_reference=self.task_reference,
+            )
         else:
-            chain = final_prompt | llm
+            idea = await self.generate_candidate(final_prompt)
+            await self.post_idea(idea=idea, task_reference=self.task_reference)
 
-            idea = chain.invoke(
-                input=self._lang_chain_input,
-                config={"callbacks": [langfuse_handler]},
-            )
+    async def generate_candidate(
+        self, final_prompt: ChatPromptTemplate | None = None
+    ) -> str:
+        """
+        Generates a single idea without posting it.
+        The LLM call is retried within the deadline of the current job.
+        With settings.GENERATION_BATCHING the call is batched with the
+        generations of other agents.
 
-            self.generated_idea = idea.content
-            await self.post_idea(
-                idea=idea.content, task_reference=self.task_reference
+        Returns:
+            str: Generated idea
+        """
+        if final_prompt is None:
+            final_prompt = await self._generate_prompt()
+
+        if settings.GENERATION_BATCHING:
+            prompt_value = await final_prompt.ainvoke(self._lang_chain_input)
+            idea = await generation_batcher.generate(
+                api_key=self._api_key,
+                base_url=self._api_url,
+                model=self._model,
+                temperature=self._temperature,
+                messages=prompt_value.to_messages(),
+                callbacks=self._get_callbacks(),
             )
+            self.generated_idea = self._parse_candidate(idea)
+            return self.generated_idea
+
+        chain = final_prompt | self._create_llm(max_retries=0)
+
+        idea = await call_with_deadline(
+            lambda: chain.ainvoke(
+                input=self._lang_chain_input,
+                config={"callbacks": self._get_callbacks()},
+            ),
+            name=f"idea generation of agent {self._agent.id}",
+        )
+
+        self.generated_idea = self._parse_candidate(idea.content)
+        return self.generated_idea
+
+    @staticmethod
+    def _parse_candidate(text: str) -> str:
+        """
+        returns the content of the <selected_idea> tag if the LLM used it,
+        else the generated text as it is
+        """
+        ideas = parse_selected_ideas(text, remove_quotes=False)
+        return ideas[0] if ideas else text
+
+    def _create_llm(self, max_retries: int) -> ChatOpenAI:
+        return create_chat_model(
+            api_key=self._api_key,
+            base_url=self._api_url,
+            model=self._model,
+            temperature=self._temperature,
+            max_retries=max_retries,
+        )
+
+    def _get_callbacks(self) -> list:
+        """returns the callbacks for tracing and token usage reporting"""
+        return [
+            *self._get_trace().get_callbacks(),
+            TokenUsageCallbackHandler(agent_id=str(self._agent.id)),
+        ]
 
     async def _generate_prompt(self) -> ChatPromptTemplate:
         """
@@ -177,9 +328,16 @@ class XLeapBasicPrompt(BrainstormBasePrompt, XLeapSystemPromptBase):
             briefing=self._briefing, references=self._references
         )
 
-        participant_prompts = await self.generate_idea_prompts(
-            ideas=self._ideas
-        )
+        if settings.PROMPT_PREFIX_CACHING:
+            participant_prompts = await self.generate_cacheable_idea_prompts(
+                ideas=self._ideas,
+                max_human_ideas=self._ideas_window,
+                chunk_size=settings.PROMPT_PREFIX_CHUNK_SIZE,
+            )
+        else:
+            participant_prompts = await self.generate_idea_prompts(
+                ideas=self._ideas
+            )
 
         task_prompt = await self.generate_task_prompt(
             briefing=self._briefing,
@@ -210,46 +368,3 @@ class XLeapBasicPrompt(BrainstormBasePrompt, XLeapSystemPromptBase):
             idea_examples += "- " + example.text + "\n"
 
         return idea_examples
-
-    @staticmethod
-    async def _parse_idea(idea: str) -> str:
-        """
-        Parse the idea generated by the AI
-
-        Args:
-            idea (str): Idea generated by the AI
-
-        Returns:
-            str: Parsed idea
-        """
-        logging.info(
-            f"""
-
-
-
-
-
-
-
-        Raw idea: {idea}
-
-
-
-
-
-
-
-
-
-
-"""
-        )
-
-        # Remove the tags from the idea
-        pattern = r"<selected_idea[^>]*>(.*?)<\/selected_idea>"
-        content = re.search(pattern, idea, re.DOTALL).group(1).strip()
-
-        # Remove all occurrences of **
-        content_without_asterisks = content.replace("**", "")
-
-        return content_without_asterisks
@@ -1,5 +1,7 @@
+import asyncio
 from abc import ABC, abstractmethod
 
+from app.core.config import settings
 from app.models import Briefing2, Briefing2Reference, Idea
 
 
@@ -25,6 +27,29 @@ class XLeapSystemPromptBase(ABC):
     async def _get_prompt_from_langfuse(self, prompt_name: str) -> str:
         raise NotImplementedError
 
+    async def _get_prompts_from_langfuse(
+        self, prompt_names: list[str]
+    ) -> dict[str, str]:
+        """
+        Fetches the prompts concurrently, at most settings.PROMPT_FETCH_CONCURRENCY
+        at a time
+        :param prompt_names: the names of the prompts (may contain duplicates)
+        :return: the prompts by name
+        """
+        unique_names = list(dict.fromkeys(prompt_names))
+        semaphore = asyncio.Semaphore(
+            max(1, settings.PROMPT_FETCH_CONCURRENCY)
+        )
+
+        async def fetch(prompt_name: str) -> str:
+            async with semaphore:
+                return await self._get_prompt_from_langfuse(
+                    prompt_name=prompt_name
+                )
+
+        prompts = await asyncio.gather(*(fetch(name) for name in unique_names))
+        return dict(zip(unique_names, prompts, strict=True))
+
     @staticmethod
     def _get_file_references(
         references: list[Briefing2Reference],
@@ -40,22 +65,19 @@ class XLeapSystemPromptBase(ABC):
         self,
         ref_type: str,
         references: list[Briefing2Reference],
-        prompt_parts: list[str],
+        prompt_names: list[str],
         lang_chain_input: dict,
     ) -> None:
         """
-        Collects all templates for the given type to prompt_parts and
-        put the corresponding variables to lang_chain_input
+        Collects the template names of all references of the given type to prompt_names
+        and put the corresponding variables to lang_chain_input
         :param ref_type: the reference type (link, file, xleap, exemplar)
-        :param prompt_parts: the list of prompt parts
+        :param prompt_names: the list of prompt names
         :param lang_chain_input: the dictionary of variable
         """
         for ref in references:
             if ref.type == ref_type:
-                prompt = await self._get_prompt_from_langfuse(
-                    prompt_name=ref.langfuse_name
-                )
-                prompt_parts.append(prompt)
+                prompt_names.append(ref.langfuse_name)
 
                 match ref_type:
                     case "link":
@@ -158,50 +180,36 @@ class XLeapSystemPromptBase(ABC):
         # 12. Response language (optional)
         #    - Please send your contributions in {{response_language}}
 
-        prompt_parts = []
+        # the prompts are collected first and then fetched concurrently
+        prompt_names: list[str] = []
         lang_chain_input = {}
 
         # 1. host info
         # actually always true
         if briefing.with_host_info:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.host_info_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.host_info_langfuse_name)
             lang_chain_input["host_info"] = briefing.host_info
 
         # 2. context
-        prompt = await self._get_prompt_from_langfuse(
-            prompt_name=briefing.context_intro_langfuse_name
-        )
-        prompt_parts.append(prompt)
+        prompt_names.append(briefing.context_intro_langfuse_name)
 
         # 3. session purpose
         if briefing.with_session_info:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.session_info_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.session_info_langfuse_name)
             lang_chain_input["session_info"] = briefing.session_info
 
         # 4. participants
         if briefing.with_participant_info:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.participant_info_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.participant_info_langfuse_name)
             lang_chain_input["participant_info"] = briefing.participant_info
 
         # 5. workspace info
         if briefing.with_workspace_info:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.workspace_info_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.workspace_info_langfuse_name)
             lang_chain_input["workspace_info"] = briefing.workspace_info
 
             await self._append_reference_templates(
-                "link", references, prompt_parts, lang_chain_input
+                "link", references, prompt_names, lang_chain_input
             )
 
             # TODO handle file content
@@ -212,65 +220,45 @@ class XLeapSystemPromptBase(ABC):
 
         # 6. workspace instruction
         if briefing.with_workspace_instruction:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.workspace_instruction_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.workspace_instruction_langfuse_name)
             lang_chain_input[
                 "workspace_instruction"
             ] = briefing.workspace_instruction
 
         # 7. additional info
         if briefing.with_additional_info:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.additional_info_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.additional_info_langfuse_name)
             lang_chain_input["additional_info"] = briefing.additional_info
 
         # 8. persona
         if briefing.with_persona:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.persona_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.persona_langfuse_name)
             lang_chain_input["persona"] = briefing.persona
 
         # 9. tone
         if briefing.with_tone:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.tone_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.tone_langfuse_name)
             lang_chain_input["tone"] = briefing.tone
 
         # 10. exemplar
         if briefing.with_num_exemplar > 0:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.exemplar_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.exemplar_langfuse_name)
             lang_chain_input["num_exemplar"] = briefing.with_num_exemplar
 
             await self._append_reference_templates(
-                "exemplar", references, prompt_parts, lang_chain_input
+                "exemplar", references, prompt_names, lang_chain_input
             )
 
         # 11. response length
-        prompt = await self._get_prompt_from_langfuse(
-            prompt_name=briefing.response_length_langfuse_name
-        )
-        prompt_parts.append(prompt)
+        prompt_names.append(briefing.response_length_langfuse_name)
 
         # 12. response language
         if briefing.with_response_language:
-            prompt = await self._get_prompt_from_langfuse(
-                prompt_name=briefing.response_language_langfuse_name
-            )
-            prompt_parts.append(prompt)
+            prompt_names.append(briefing.response_language_langfuse_name)
             lang_chain_input["response_language"] = briefing.response_language
 
-        system_prompt = "\n".join(prompt_parts)
+        prompts = await self._get_prompts_from_langfuse(prompt_names)
+        system_prompt = "\n".join(prompts[name] for name in prompt_names)
 
         return GeneratedPrompt(
             prompt=system_prompt, lang_chain_input=lang_chain_input
@@ -287,6 +275,56 @@ class XLeapSystemPromptBase(ABC):
                 result.append(("human", idea.text))
         return result
 
+    async def generate_cacheable_idea_prompts(
+        self,
+        ideas: list[Idea] | None,
+        max_human_ideas: int = 0,
+        chunk_size: int = 10,
+    ) -> list[tuple[str, str]]:
+        """
+        Generates the idea messages such that consecutive generations share an
+        append-only prefix which the provider can cache.
+        Ideas are ordered by their idea count and grouped into blocks of chunk_size
+        (by idea count), so a new idea only changes the last block. Within a block
+        consecutive ideas of the same origin are merged into one message.
+        The window of human ideas slides by whole blocks instead of one idea at a time.
+        :param ideas: the ideas from participants or this agent
+        :param max_human_ideas: (optional, default 0 = all) the number of latest human
+          ideas which must be part of the window
+        :param chunk_size: (optional, default 10) the number of ideas per block
+        :return: the list of messages
+        """
+        if not ideas:
+            return []
+        chunk_size = max(1, chunk_size)
+        ordered = sorted(ideas, key=lambda idea: idea.idea_count)
+
+        # align the start of the window of human ideas to a block boundary
+        window_start = 0
+        human_counts = [
+            idea.idea_count for idea in ordered if not idea.created_by_ai
+        ]
+        if 0 < max_human_ideas < len(human_counts):
+            first_count = human_counts[-max_human_ideas]
+            window_start = first_count - first_count % chunk_size
+
+        result: list[tuple[str, str]] = []
+        lines: list[str] = []
+        current: tuple[str, int] | None = None
+        for idea in ordered:
+            if not idea.created_by_ai and idea.idea_count < window_start:
+                continue
+            role = "assistant" if idea.created_by_ai else "human"
+            block = (role, idea.idea_count // chunk_size)
+            if lines and block != current:
+                result.append((current[0], "\n".join(lines)))
+                lines = []
+            current = block
+            lines.append(f"- {idea.text}")
+        if lines:
+            result.append((current[0], "\n".join(lines)))
+        return result
+
     async def generate_task_prompt(
         self,
         briefing: Briefing2,
@@ -1,8 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
-from app.core.config import settings
-from app.orchestration.prompts import BasePrompt, langfuse_handler
+from app.orchestration.llm import call_with_deadline, create_chat_model
+from app.orchestration.prompts import BasePrompt
 
 # async def generate_idea_and_post(agent: AIAgent, briefing: Briefing2, session:
 # SessionDep) -> None:
@@ -33,18 +32,23 @@ class ZeroShotPrompt(BasePrompt):
         """
         final_prompt = await self._generate_prompt()
 
-        llm = ChatOpenAI(
-            openai_api_key=self._api_key,  # type: ignore
-            model_name=self._model,
+        llm = create_chat_model(
+            api_key=self._api_key,
+            base_url=self._api_url,
+            model=self._model,
             temperature=self._temperature,
-            openai_proxy=settings.HTTP_PROXY,
+            # the call is retried within the deadline of the job
+            max_retries=0,
         )
 
         chain = final_prompt | llm
 
-        idea = chain.invoke(
-            input={"question": self._briefing.additional_info},
-            config={"callbacks": [langfuse_handler]},
+        idea = await call_with_deadline(
+            lambda: chain.ainvoke(
+                input={"question": self._briefing.additional_info},
+                config={"callbacks": self._get_trace().get_callbacks()},
+            ),
+            name=f"idea generation of agent {self._agent.id}",
         )
         self.generated_idea = idea.content
 
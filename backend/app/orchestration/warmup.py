@@ -0,0 +1,131 @@
+import asyncio
+import logging
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.crud import get_ai_agent_references
+from app.models import (
+    AIAgent,
+    AIBriefing2LangfuseBase,
+    Briefing2,
+    Briefing2Reference,
+)
+from app.orchestration.data import resolve_server_addr_async
+from app.orchestration.llm import (
+    SKIP_RATE_LIMIT_EXTENSION,
+    get_api_base_url,
+    get_async_http_client,
+)
+from app.orchestration.prompts import prompt_cache
+from app.utils.agents import get_agent_by_id
+from app.utils.briefings import get_briefing2_by_agent_id
+
+
+def get_briefing_prompt_names(
+    briefing: Briefing2, references: list[Briefing2Reference]
+) -> list[str]:
+    """
+    returns the names of all Langfuse prompts the briefing and its references use
+    """
+    names = [
+        getattr(briefing, field, "")
+        for field in AIBriefing2LangfuseBase.model_fields
+    ]
+    names += [reference.langfuse_name for reference in references]
+    return list(dict.fromkeys(name for name in names if name))
+
+
+async def _prefetch_prompts(prompt_names: list[str]):
+    semaphore = asyncio.Semaphore(max(1, settings.PROMPT_FETCH_CONCURRENCY))
+
+    async def prefetch(prompt_name: str):
+        async with semaphore:
+            try:
+                await prompt_cache.get(prompt_name)
+            except Exception as err:
+                logging.warning(
+                    f"Warm-up of prompt {prompt_name} failed: {err}"
+                )
+
+    await asyncio.gather(*(prefetch(name) for name in prompt_names))
+
+
+async def _resolve_host(agent: AIAgent):
+    try:
+        await resolve_server_addr_async(agent.server_address)
+    except Exception as err:
+        logging.warning(
+            f"Warm-up of agent {agent.id} could not resolve "
+            f"{agent.server_address}: {err}"
+        )
+
+
+async def _open_llm_connection(agent: AIAgent):
+    """
+    Opens a (pooled) connection to the LLM API of the agent. Listing the models
+    does not use any tokens, the request is not throttled by the rate limiter.
+    """
+    base_url = get_api_base_url(agent.api_url) or "https://api.openai.com/v1"
+    try:
+        await get_async_http_client().get(
+            f"{base_url.rstrip('/')}/models",
+            headers={"Authorization": f"Bearer {agent.api_key}"},
+            extensions={SKIP_RATE_LIMIT_EXTENSION: True},
+        )
+    except Exception as err:
+        logging.warning(
+            f"Warm-up of agent {agent.id} could not connect to the LLM: {err}"
+        )
+
+
+def _load_agent(agent_id: str) -> tuple[AIAgent, list[str]]:
+    """
+    returns the agent and the names of the Langfuse prompts of its briefing
+    """
+    with Session(engine) as session:
+        agent = get_agent_by_id(agent_id, session)
+        briefing = get_briefing2_by_agent_id(agent_id, session)
+        references = get_ai_agent_references(session=session, agent=agent)
+        return agent, get_briefing_prompt_names(briefing, references)
+
+
+def _load_active_agent_ids() -> list:
+    with Session(engine) as session:
+        return list(
+            session.exec(
+                select(AIAgent.id).where(AIAgent.is_active == True)  # noqa
+            ).all()
+        )
+
+
+async def warm_up_agent(agent_id: str) -> None:
+    """
+    Prepares the first generation of an agent: prefetches the Langfuse prompts of
+    its briefing, resolves the XLeap host and opens the connection to the LLM.
+    Failures are logged only, the generation will try again.
+    :param agent_id: the ID of the agent
+    """
+    # the database is not queried on the event loop
+    agent, prompt_names = await asyncio.to_thread(_load_agent, agent_id)
+
+    await asyncio.gather(
+        _prefetch_prompts(prompt_names),
+        _resolve_host(agent),
+        _open_llm_connection(agent),
+    )
+    logging.info(f"Warmed up agent {agent_id} ({len(prompt_names)} prompts)")
+
+
+async def warm_up_active_agents() -> None:
+    """
+    Warms up all active agents, e.g. when the worker starts
+    """
+    agent_ids = await asyncio.to_thread(_load_active_agent_ids)
+
+    for agent_id in agent_ids:
+        try:
+            await warm_up_agent(str(agent_id))
+        except Exception as err:
+            logging.warning(f"Warm-up of agent {agent_id} failed: {err}")
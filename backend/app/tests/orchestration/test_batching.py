@@ -0,0 +1,147 @@
+import asyncio
+from collections.abc import Generator
+from typing import Any
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+
+from app.orchestration.llm.batching import GenerationBatcher
+from app.tests.utils.llm_server import StandInLLMServer
+
+
+@pytest.fixture
+def stand_in_server() -> Generator[StandInLLMServer, None, None]:
+    with StandInLLMServer() as server:
+        yield server
+
+
+async def _generate_all(
+    batcher: GenerationBatcher, base_url: str, personas: list[str]
+) -> list[str]:
+    return await asyncio.gather(
+        *(
+            batcher.generate(
+                api_key="local-key",
+                base_url=base_url,
+                model="local-model",
+                temperature=0.7,
+                messages=[
+                    SystemMessage(content=persona),
+                    HumanMessage(content="Any idea?"),
+                ],
+                callbacks=[],
+            )
+            for persona in personas
+        )
+    )
+
+
+def test_identical_prompts_are_one_multi_choice_request(
+    stand_in_server: StandInLLMServer,
+) -> None:
+    batcher = GenerationBatcher()
+
+    ideas = asyncio.run(
+        _generate_all(
+            batcher,
+            stand_in_server.base_url,
+            ["Designer", "Designer", "Designer", "Engineer"],
+        )
+    )
+
+    # every agent receives its own choice
+    assert sorted(ideas[:3]) == [
+        "A local idea 0",
+        "A local idea 1",
+        "A local idea 2",
+    ]
+    assert ideas[3] == "A local idea 0"
+    assert sorted(
+        request["body"]["n"] for request in stand_in_server.requests
+    ) == [1, 3]
+    assert batcher.stats() == {
+        "batches": 1,
+        "jobs": 4,
+        "requests": 2,
+        "multi_choice_requests": 1,
+    }
+
+
+class _UsageRecorder(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.results: list[LLMResult] = []
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.results.append(response)
+
+
+def test_usage_is_split_among_the_jobs(
+    stand_in_server: StandInLLMServer,
+) -> None:
+    batcher = GenerationBatcher()
+    recorders = [_UsageRecorder() for _ in range(3)]
+
+    async def generate_all() -> list[str]:
+        return await asyncio.gather(
+            *(
+                batcher.generate(
+                    api_key="local-key",
+                    base_url=stand_in_server.base_url,
+                    model="local-model",
+                    temperature=0.7,
+                    messages=[HumanMessage(content="Any idea?")],
+                    callbacks=[recorder],
+                )
+                for recorder in recorders
+            )
+        )
+
+    ideas = asyncio.run(generate_all())
+
+    assert len(stand_in_server.requests) == 1
+    usages = []
+    for idea, recorder in zip(ideas, recorders, strict=True):
+        # every job sees its own choice
+        [result] = recorder.results
+        assert result.generations[0][0].text == idea
+        usages.append(result.llm_output["token_usage"])  # type: ignore
+    # 5 prompt and 3 completion tokens are shared by the 3 jobs
+    assert [usage["prompt_tokens"] for usage in usages] == [2, 2, 1]
+    assert [usage["completion_tokens"] for usage in usages] == [1, 1, 1]
+    assert not batcher._flush_tasks
+
+
+def test_cancelled_job_does_not_fail_its_batch(
+    stand_in_server: StandInLLMServer,
+) -> None:
+    batcher = GenerationBatcher()
+
+    async def generate_both() -> str:
+        jobs = [
+            asyncio.create_task(
+                batcher.generate(
+                    api_key="local-key",
+                    base_url=stand_in_server.base_url,
+                    model="local-model",
+                    temperature=0.7,
+                    messages=[HumanMessage(content="Any idea?")],
+                    callbacks=[],
+                )
+            )
+            for _ in range(2)
+        ]
+        # let both jobs join the batch, then cancel the first one
+        await asyncio.sleep(0)
+        jobs[0].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await jobs[0]
+        return await jobs[1]
+
+    idea = asyncio.run(generate_both())
+
+    assert idea == "A local idea 1"
+    [request] = stand_in_server.requests
+    assert request["body"]["n"] == 2
+    assert not batcher._flush_tasks
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine
+
+from app.models import AIAgent, AIBriefing2Base, BriefingSyncState
+from app.orchestration import briefing_sync
+from app.orchestration.briefing_sync import BriefingSynchronizer
+from app.orchestration.data import get_agent_briefing, xleap_client
+
+_BRIEFING = b'{"instance_id": "instance", "frequency": 5}'
+_ETAG = '"v1"'
+
+
+class _XLeapHandler(BaseHTTPRequestHandler):
+    """Serves the briefing, revalidates it by ETag"""
+
+    protocol_version = "HTTP/1.1"
+    sent_bodies = 0
+
+    def do_GET(self) -> None:
+        if self.headers.get("If-None-Match") == _ETAG:
+            self.send_response(304)
+            self.send_header("ETag", _ETAG)
+            self.end_headers()
+            return
+        _XLeapHandler.sent_bodies += 1
+        self.send_response(200)
+        self.send_header("ETag", _ETAG)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_BRIEFING)))
+        self.end_headers()
+        self.wfile.write(_BRIEFING)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server_address() -> Any:
+    _XLeapHandler.sent_bodies = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _XLeapHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def _create_agent(server_address: str) -> AIAgent:
+    return AIAgent(
+        server_address=server_address,
+        session_id="session",
+        workspace_id="workspace",
+        instance_id="instance",
+        secret="secret",
+        api_type="openai",
+        model="gpt-4",
+        api_key="key",
+        is_active=True,
+    )
+
+
+def _run(coro: Any) -> Any:
+    async def run() -> Any:
+        try:
+            return await coro
+        finally:
+            await xleap_client.close()
+
+    return asyncio.run(run())
+
+
+def test_briefing_is_revalidated(server_address: str) -> None:
+    agent = _create_agent(server_address)
+
+    fetched = _run(get_agent_briefing(agent))
+    assert fetched.briefing.frequency == 5
+    assert fetched.etag == _ETAG
+
+    revalidated = _run(get_agent_briefing(agent, etag=fetched.etag))
+    assert revalidated.briefing is None
+    assert revalidated.etag == _ETAG
+    assert _XLeapHandler.sent_bodies == 1
+
+
+def _create_engine() -> Any:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    AIAgent.__table__.create(engine)  # type: ignore
+    BriefingSyncState.__table__.create(engine)  # type: ignore
+    return engine
+
+
+def test_unchanged_briefings_are_not_stored(server_address: str) -> None:
+    engine = _create_engine()
+    with Session(engine) as session:
+        agent = _create_agent(server_address)
+        session.add(agent)
+        # the briefing was stored before, without validators
+        session.add(
+            BriefingSyncState(
+                agent_id=agent.id,
+                digest=hashlib.sha256(_BRIEFING).hexdigest(),
+            )
+        )
+        session.commit()
+        agent_id = str(agent.id)
+
+    synchronizer = BriefingSynchronizer(engine=engine)
+    assert _run(synchronizer.sync_agents()) == 0
+    assert _run(synchronizer.sync_agents([agent_id])) == 0
+
+    stats = synchronizer.stats()
+    assert stats["unchanged"] == 1
+    assert stats["not_modified"] == 1
+    assert stats["errors"] == 0
+    assert _XLeapHandler.sent_bodies == 1
+    with Session(engine) as session:
+        state = session.get(BriefingSyncState, agent.id)
+        assert state is not None and state.etag == _ETAG
+
+
+def test_new_agent_is_seeded_without_rewriting_its_briefing(
+    server_address: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    warmed_up: list[str] = []
+
+    async def warm_up_agent(agent_id: str) -> None:
+        warmed_up.append(agent_id)
+
+    monkeypatch.setattr(briefing_sync, "warm_up_agent", warm_up_agent)
+    engine = _create_engine()
+    with Session(engine) as session:
+        agent = _create_agent(server_address)
+        session.add(agent)
+        session.commit()
+        agent_id = str(agent.id)
+
+    synchronizer = BriefingSynchronizer(engine=engine)
+    # the agent was created with the briefing XLeap serves (the briefing
+    # tables do not exist, a write would fail)
+    _run(
+        synchronizer.seed_agent(
+            agent_id, AIBriefing2Base.model_validate_json(_BRIEFING)
+        )
+    )
+
+    stats = synchronizer.stats()
+    assert stats["unchanged"] == 1
+    assert stats["errors"] == 0
+    assert warmed_up == []
+    with Session(engine) as session:
+        state = session.get(BriefingSyncState, agent.id)
+        assert state is not None and state.etag == _ETAG
+        assert state.digest == hashlib.sha256(_BRIEFING).hexdigest()
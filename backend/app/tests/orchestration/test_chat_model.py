@@ -0,0 +1,75 @@
+import asyncio
+from collections.abc import Generator
+
+import pytest
+
+from app.orchestration.llm import create_chat_model, rate_limiter
+from app.tests.utils.llm_server import StandInLLMServer
+
+
+@pytest.fixture
+def stand_in_server() -> Generator[StandInLLMServer, None, None]:
+    with StandInLLMServer(
+        headers={
+            "x-ratelimit-limit-requests": "100",
+            "x-ratelimit-remaining-requests": "99",
+            "x-ratelimit-reset-requests": "600ms",
+        }
+    ) as server:
+        yield server
+
+
+def test_chat_model_uses_api_url(stand_in_server: StandInLLMServer) -> None:
+    llm = create_chat_model(
+        api_key="local-key",
+        model="local-model",
+        base_url=stand_in_server.base_url,
+        max_retries=0,
+    )
+
+    result = llm.invoke("Any idea?")
+
+    assert result.content == "A local idea 0"
+    assert len(stand_in_server.requests) == 1
+    request = stand_in_server.requests[0]
+    assert request["path"] == "/v1/chat/completions"
+    assert request["authorization"] == "Bearer local-key"
+    assert request["body"]["model"] == "local-model"
+
+
+async def _ainvoke(base_url: str) -> str:
+    llm = create_chat_model(
+        api_key="local-key",
+        model="local-model",
+        base_url=base_url,
+        max_retries=0,
+    )
+    result = await llm.ainvoke("Any idea?")
+    return result.content
+
+
+def test_async_chat_model_uses_api_url(
+    stand_in_server: StandInLLMServer,
+) -> None:
+    assert asyncio.run(_ainvoke(stand_in_server.base_url)) == "A local idea 0"
+    assert stand_in_server.requests[0]["path"] == "/v1/chat/completions"
+
+
+def test_rate_limiter_is_calibrated_from_headers(
+    stand_in_server: StandInLLMServer,
+) -> None:
+    llm = create_chat_model(
+        api_key="calibration-key",
+        model="local-model",
+        base_url=stand_in_server.base_url,
+        max_retries=0,
+    )
+
+    llm.invoke("Any idea?")
+
+    limits = [
+        key_limit
+        for key_limit in rate_limiter.stats().values()
+        if key_limit["request_limit"] == 100
+    ]
+    assert limits
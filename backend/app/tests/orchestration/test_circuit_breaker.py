@@ -0,0 +1,60 @@
+from app.orchestration.data import (
+    BreakerState,
+    CircuitBreaker,
+    XLeapCircuitBreakers,
+)
+
+
+def test_breaker_opens_after_consecutive_failures() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == BreakerState.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.is_paused()
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_sends_one_probe() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == BreakerState.HALF_OPEN
+    # generations may run until a probe is sent
+    assert not breaker.is_paused()
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert breaker.is_paused()
+
+    # a failed probe opens the breaker again, a successful one closes it
+    breaker.record_failure()
+    assert breaker.times_opened == 2
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_released_probe_can_be_sent_again() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_breakers_are_shared_by_the_agents_of_a_server() -> None:
+    breakers = XLeapCircuitBreakers()
+    breaker = breakers.get("https://xleap.example.com")
+    assert breakers.get("https://xleap.example.com/services/api") is breaker
+    for _ in range(5):
+        breaker.record_failure()
+
+    assert breakers.should_pause_generation("https://xleap.example.com")
+    assert not breakers.should_pause_generation("https://other.example.com")
+    stats = breakers.stats()["xleap.example.com"]
+    assert stats["state"] == "open"
+    assert stats["paused_generations"] == 1
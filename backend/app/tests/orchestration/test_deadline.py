@@ -0,0 +1,147 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.core.config import settings
+from app.orchestration.llm import deadline
+from app.orchestration.llm.deadline import (
+    JobType,
+    LatencyRecorder,
+    call_with_deadline,
+    deadline_scope,
+)
+
+
+@pytest.fixture
+def recorder(monkeypatch: Any) -> LatencyRecorder:
+    recorder = LatencyRecorder()
+    monkeypatch.setattr(deadline, "latency_recorder", recorder)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "LLM_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "LLM_HEDGE_ON_DEMAND", False)
+    return recorder
+
+
+def _run(coro_factory: Any, job_type: JobType = JobType.PERIODIC) -> Any:
+    async def run() -> Any:
+        with deadline_scope(job_type):
+            return await coro_factory()
+
+    return asyncio.run(run())
+
+
+def test_failed_attempts_are_retried(recorder: LatencyRecorder) -> None:
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise TimeoutError()
+        return "idea"
+
+    assert _run(lambda: call_with_deadline(call)) == "idea"
+    stats = recorder.stats()["periodic"]
+    assert stats["calls"] == 1
+    assert stats["attempts"] == 3
+    assert stats["failures"] == 0
+
+
+def test_attempts_are_limited(recorder: LatencyRecorder) -> None:
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        raise TimeoutError()
+
+    with pytest.raises(TimeoutError):
+        _run(lambda: call_with_deadline(call))
+    assert calls == 3
+    assert recorder.stats()["periodic"]["failures"] == 1
+
+
+def test_other_errors_are_not_retried(recorder: LatencyRecorder) -> None:
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        raise ValueError("invalid prompt")
+
+    with pytest.raises(ValueError):
+        _run(lambda: call_with_deadline(call))
+    assert calls == 1
+
+
+def test_slow_attempt_times_out(
+    recorder: LatencyRecorder, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "LLM_ATTEMPT_TIMEOUT_SECONDS", 0.05)
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(10)
+        return "idea"
+
+    assert _run(lambda: call_with_deadline(call)) == "idea"
+    assert calls == 2
+
+
+def test_expired_deadline_is_not_called(
+    recorder: LatencyRecorder, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "LLM_DEADLINE_PERIODIC_SECONDS", 0)
+
+    async def call() -> str:
+        raise AssertionError("called after the deadline")
+
+    with pytest.raises(TimeoutError):
+        _run(lambda: call_with_deadline(call))
+
+
+def test_slow_on_demand_call_is_hedged(
+    recorder: LatencyRecorder, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "LLM_HEDGE_ON_DEMAND", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_PERCENTILE", 0.9)
+    for _ in range(10):
+        recorder.record("on_demand", 0.05, 1, False)
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            # the first request hangs, the duplicate answers
+            await asyncio.sleep(10)
+            return "slow"
+        return "fast"
+
+    assert _run(lambda: call_with_deadline(call), JobType.ON_DEMAND) == "fast"
+    assert calls == 2
+    stats = recorder.stats()["on_demand"]
+    assert stats["hedged_calls"] == 1
+    assert stats["p50_seconds"] == pytest.approx(0.05)
+
+
+def test_periodic_calls_are_not_hedged(
+    recorder: LatencyRecorder, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "LLM_HEDGE_ON_DEMAND", True)
+    for _ in range(10):
+        recorder.record("periodic", 0.01, 1, False)
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "idea"
+
+    assert _run(lambda: call_with_deadline(call)) == "idea"
+    assert calls == 1
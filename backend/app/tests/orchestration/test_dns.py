@@ -0,0 +1,81 @@
+import asyncio
+import socket
+from typing import Any
+
+import aiohttp
+import pytest
+
+from app.orchestration.data import CachingResolver, dns
+from app.tests.utils.llm_server import StandInLLMServer
+
+
+def test_addresses_are_cached() -> None:
+    resolver = CachingResolver(ttl_seconds=60)
+
+    async def resolve_concurrently_and_again() -> list[str]:
+        results = await asyncio.gather(
+            *(resolver.resolve("localhost", 8080) for _ in range(5))
+        )
+        results.append(await resolver.resolve("localhost", 443))
+        return [result[0]["host"] for result in results]
+
+    addresses = asyncio.run(resolve_concurrently_and_again())
+
+    assert set(addresses) == {"127.0.0.1"}
+    # one lookup shared by the concurrent requests, then cache hits
+    assert resolver.stats()["failures"] == 0
+    assert resolver.stats()["entries"] == 1
+    assert resolver.stats()["hits"] == 1
+
+
+def test_failed_lookups_are_cached() -> None:
+    resolver = CachingResolver(negative_ttl_seconds=60)
+
+    async def resolve_twice() -> None:
+        for _ in range(2):
+            with pytest.raises(OSError):
+                await resolver.resolve("host.invalid", 443, socket.AF_INET)
+
+    asyncio.run(resolve_twice())
+
+    assert resolver.stats()["failures"] == 1
+    assert resolver.stats()["hits"] == 1
+
+
+def test_cache_is_bounded() -> None:
+    resolver = CachingResolver(max_size=1)
+
+    async def resolve_hosts() -> None:
+        await resolver.resolve("localhost")
+        await resolver.resolve("127.0.0.1")
+
+    asyncio.run(resolve_hosts())
+
+    assert resolver.stats()["entries"] == 1
+
+
+def test_server_address_and_connector_share_the_cache(
+    monkeypatch: Any,
+) -> None:
+    resolver = CachingResolver(ttl_seconds=60)
+    monkeypatch.setattr(dns, "dns_resolver", resolver)
+
+    async def resolve_and_connect(port: int) -> str:
+        address = await dns.resolve_server_addr_async("http://localhost")
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                resolver=resolver, use_dns_cache=False
+            )
+        ) as session:
+            async with session.get(f"http://localhost:{port}/v1/models"):
+                pass
+        return address
+
+    with StandInLLMServer() as server:
+        address = asyncio.run(resolve_and_connect(server.server_port))
+
+    assert address == "127.0.0.1"
+    # the connection uses the address resolved for the server address
+    assert resolver.stats()["entries"] == 1
+    assert resolver.stats()["misses"] == 1
+    assert resolver.stats()["hits"] == 1
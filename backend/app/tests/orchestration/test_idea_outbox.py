@@ -0,0 +1,287 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import aiohttp
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine, select, update
+from yarl import URL
+
+from app.core.config import settings
+from app.models import AIAgent, OutboxIdea, OutboxIdeaStatus
+from app.orchestration.data import (
+    CircuitBreaker,
+    IdeaOutbox,
+    XLeapCircuitBreakers,
+    XLeapClient,
+)
+
+
+class _XLeapHandler(BaseHTTPRequestHandler):
+    """Answers with the queued status codes (201 once empty)"""
+
+    protocol_version = "HTTP/1.1"
+    statuses: list[int] = []
+    received: list[tuple[str, str]] = []
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        status = self.statuses.pop(0) if self.statuses else 201
+        if status == 201:
+            text = json.loads(body)["text"]
+            self.received.append((text, self.headers["Idempotency-Key"]))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url() -> Any:
+    _XLeapHandler.statuses = []
+    _XLeapHandler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _XLeapHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/ideas"
+    server.shutdown()
+
+
+@pytest.fixture
+def engine() -> Any:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    AIAgent.__table__.create(engine)  # type: ignore
+    OutboxIdea.__table__.create(engine)  # type: ignore
+    return engine
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    # retries are due right away
+    monkeypatch.setattr(settings, "IDEA_OUTBOX_BACKOFF_SECONDS", 0.0)
+
+
+def _create_agent(engine: Any) -> AIAgent:
+    agent = AIAgent(
+        server_address="http://127.0.0.1",
+        session_id="session",
+        workspace_id="workspace",
+        instance_id="instance",
+        secret="secret",
+        api_type="openai",
+        model="gpt-4",
+        api_key="key",
+        is_active=True,
+    )
+    with Session(engine) as session:
+        session.add(agent)
+        session.commit()
+        session.refresh(agent)
+    return agent
+
+
+def _outbox_ideas(engine: Any) -> list[OutboxIdea]:
+    with Session(engine) as session:
+        return list(session.exec(select(OutboxIdea)).all())
+
+
+def _run(client: XLeapClient, coro: Any) -> Any:
+    async def run() -> Any:
+        try:
+            return await coro
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_transient_failures_are_retried(engine: Any, server_url: str) -> None:
+    agent = _create_agent(engine)
+    client = XLeapClient()
+    outbox = IdeaOutbox(
+        engine=engine, client=client, breakers=XLeapCircuitBreakers()
+    )
+    _XLeapHandler.statuses = [503]
+
+    async def post_and_retry() -> int:
+        await outbox.post(agent.id, agent.secret, server_url, {"text": "a"})
+        assert _outbox_ideas(engine)[0].last_error is not None
+        return await outbox.deliver_due()
+
+    assert _run(client, post_and_retry()) == 1
+    assert [text for text, _ in _XLeapHandler.received] == ["a"]
+    assert _outbox_ideas(engine) == []
+    assert outbox.stats()["retries"] == 1
+    assert outbox.stats()["delivered"] == 1
+
+
+def test_ideas_of_a_host_are_delivered_in_order(
+    engine: Any, server_url: str
+) -> None:
+    agent = _create_agent(engine)
+    client = XLeapClient()
+    outbox = IdeaOutbox(
+        engine=engine, client=client, breakers=XLeapCircuitBreakers()
+    )
+    _XLeapHandler.statuses = [500]
+
+    async def post_and_retry() -> int:
+        for text in ["a", "b", "c"]:
+            await outbox.post(
+                agent.id, agent.secret, server_url, {"text": text}
+            )
+        # "b" and "c" wait for "a"
+        assert _XLeapHandler.received == []
+        return await outbox.deliver_due()
+
+    assert _run(client, post_and_retry()) == 3
+    assert [text for text, _ in _XLeapHandler.received] == ["a", "b", "c"]
+    keys = {key for _, key in _XLeapHandler.received}
+    assert len(keys) == 3
+
+
+def test_ideas_wait_for_an_idea_being_delivered(
+    engine: Any, server_url: str
+) -> None:
+    agent = _create_agent(engine)
+    client = XLeapClient()
+    outbox = IdeaOutbox(
+        engine=engine, client=client, breakers=XLeapCircuitBreakers()
+    )
+    _XLeapHandler.statuses = [503]
+    send = outbox._send
+
+    async def send_and_post_next(outbox_idea: OutboxIdea, secret: str) -> None:
+        if outbox_idea.attempts == 1 and (
+            json.loads(outbox_idea.payload)["text"] == "a"
+        ):
+            # the next idea is posted while the first one is being delivered
+            await outbox.post(
+                agent.id, agent.secret, server_url, {"text": "b"}
+            )
+        await send(outbox_idea, secret)
+
+    outbox._send = send_and_post_next  # type: ignore
+
+    async def post_and_retry() -> int:
+        await outbox.post(agent.id, agent.secret, server_url, {"text": "a"})
+        # the delivery of "a" failed transiently, "b" waits for it
+        assert _XLeapHandler.received == []
+        return await outbox.deliver_due()
+
+    assert _run(client, post_and_retry()) == 2
+    assert [text for text, _ in _XLeapHandler.received] == ["a", "b"]
+    assert _outbox_ideas(engine) == []
+
+
+def test_refused_ideas_are_dead_lettered(engine: Any, server_url: str) -> None:
+    agent = _create_agent(engine)
+    client = XLeapClient()
+    outbox = IdeaOutbox(
+        engine=engine, client=client, breakers=XLeapCircuitBreakers()
+    )
+    _XLeapHandler.statuses = [409]
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        _run(
+            client,
+            outbox.post(agent.id, agent.secret, server_url, {"text": "a"}),
+        )
+
+    (outbox_idea,) = _outbox_ideas(engine)
+    assert outbox_idea.status == OutboxIdeaStatus.DEAD
+    with Session(engine) as session:
+        assert not session.get(AIAgent, agent.id).is_active  # type: ignore
+    # dead ideas are not retried
+    assert _run(client, outbox.deliver_due()) == 0
+
+
+def test_ideas_wait_while_the_breaker_is_open(
+    engine: Any, server_url: str
+) -> None:
+    agent = _create_agent(engine)
+    client = XLeapClient()
+    breakers = XLeapCircuitBreakers()
+    outbox = IdeaOutbox(engine=engine, client=client, breakers=breakers)
+    breaker = breakers._breakers["127.0.0.1"] = CircuitBreaker(
+        failure_threshold=1, open_seconds=60
+    )
+    breaker.record_failure()
+
+    async def post_and_deliver() -> int:
+        await outbox.post(agent.id, agent.secret, server_url, {"text": "a"})
+        return await outbox.deliver_due()
+
+    assert _run(client, post_and_deliver()) == 0
+    assert _XLeapHandler.received == []
+    assert len(_outbox_ideas(engine)) == 1
+
+    # the pending idea is the probe of the half-open breaker
+    breaker._open_seconds = 0
+    assert _run(client, outbox.deliver_due()) == 1
+    assert breaker.state == "closed"
+
+
+def _add_pending(
+    engine: Any, agent: AIAgent, url: str, text: str, **fields: Any
+) -> None:
+    with Session(engine) as session:
+        session.add(
+            OutboxIdea(
+                agent_id=agent.id,
+                host=URL(url).host,
+                url=url,
+                payload=json.dumps({"text": text}),
+                **fields,
+            )
+        )
+        session.commit()
+
+
+def test_failing_host_does_not_hold_up_other_hosts(
+    engine: Any, server_url: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "IDEA_OUTBOX_BATCH_SIZE", 2)
+    agent = _create_agent(engine)
+    client = XLeapClient()
+    outbox = IdeaOutbox(
+        engine=engine, client=client, breakers=XLeapCircuitBreakers()
+    )
+    # the older ideas of a host which refuses connections wait for their
+    # next attempt
+    for text in ["a", "b", "c"]:
+        _add_pending(
+            engine,
+            agent,
+            "http://127.0.0.2:1/ideas",
+            text,
+            attempts=3,
+            last_error="ClientConnectorError()",
+            next_attempt_at=datetime.utcnow() + timedelta(minutes=10),
+        )
+    _add_pending(engine, agent, server_url, "d")
+
+    assert _run(client, outbox.deliver_due()) == 1
+    assert [text for text, _ in _XLeapHandler.received] == ["d"]
+
+    # the failing host is due again, its first idea fails
+    with Session(engine) as session:
+        session.exec(  # type: ignore
+            update(OutboxIdea).values(next_attempt_at=datetime.utcnow())
+        )
+        session.commit()
+    _add_pending(engine, agent, server_url, "e")
+
+    assert _run(client, outbox.deliver_due()) == 1
+    assert [text for text, _ in _XLeapHandler.received] == ["d", "e"]
+    assert len(_outbox_ideas(engine)) == 3
+    assert outbox.stats()["retries"] == 1
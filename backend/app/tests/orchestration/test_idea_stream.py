@@ -0,0 +1,64 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+
+import pytest
+
+from app.orchestration.prompts import post_streamed_ideas
+
+
+async def _stream(
+    ideas: list[str], seconds_per_idea: float = 0.0, error: bool = False
+) -> AsyncIterator[str]:
+    for idea in ideas:
+        await asyncio.sleep(seconds_per_idea)
+        yield idea
+    if error:
+        raise TimeoutError
+
+
+def test_posts_overlap_the_stream() -> None:
+    ideas = [f"idea {i}" for i in range(12)]
+    posted: list[str] = []
+
+    async def post(idea: str) -> None:
+        await asyncio.sleep(0.02)
+        posted.append(idea)
+
+    started = time.monotonic()
+    asyncio.run(post_streamed_ideas(_stream(ideas, 0.02), post))
+    elapsed = time.monotonic() - started
+
+    assert posted == ideas
+    # sequential streaming and posting would take 0.48 seconds
+    assert elapsed < 0.4
+
+
+def test_streamed_ideas_are_posted_before_the_stream_error() -> None:
+    posted: list[str] = []
+
+    async def post(idea: str) -> None:
+        posted.append(idea)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(
+            post_streamed_ideas(_stream(["a", "", "b"], error=True), post)
+        )
+    assert posted == ["a", "b"]
+
+
+def test_failed_post_cancels_the_stream() -> None:
+    streamed: list[str] = []
+
+    async def stream() -> AsyncIterator[str]:
+        for idea in ["a", "b", "c", "d"]:
+            streamed.append(idea)
+            yield idea
+            await asyncio.sleep(0.01)
+
+    async def post(idea: str) -> None:
+        raise ValueError(idea)
+
+    with pytest.raises(ValueError, match="a"):
+        asyncio.run(post_streamed_ideas(stream(), post, queue_size=1))
+    assert len(streamed) < 4
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine
+
+from app.models import LangfusePrompt
+from app.orchestration.prompts import PromptCache, PromptStore
+
+
+class _Prompt:
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.version = 1
+
+
+class _Langfuse:
+    """Serves prompts like the Langfuse client, can be taken down"""
+
+    def __init__(self):
+        self.calls = 0
+        self.available = True
+        self.text = "Question: {{question}}"
+
+    def get_prompt(
+        self, name: str, version: int | None, cache_ttl_seconds: int
+    ) -> _Prompt:
+        self.calls += 1
+        if not self.available:
+            raise ConnectionError("Langfuse is down")
+        return _Prompt(self.text)
+
+
+async def _get_twice(cache: PromptCache) -> list[str]:
+    first = await cache.get("PROMPT")
+    second = await cache.get("PROMPT")
+    return [first.get_langchain_prompt(), second.compile(question="Why?")]
+
+
+def test_prompts_are_cached() -> None:
+    langfuse = _Langfuse()
+    cache = PromptCache(client=langfuse, ttl_seconds=60, retry_seconds=60)
+
+    assert asyncio.run(_get_twice(cache)) == [
+        "Question: {question}",
+        "Question: Why?",
+    ]
+    assert langfuse.calls == 1
+    assert cache.stats()["hit_ratio"] == 0.5
+
+
+async def _get_stale(cache: PromptCache) -> str:
+    await cache.get("PROMPT")
+    prompt = await cache.get("PROMPT")
+    # let the background refresh run
+    await asyncio.sleep(0.1)
+    return prompt.prompt
+
+
+def test_stale_prompts_are_served_when_langfuse_is_down() -> None:
+    langfuse = _Langfuse()
+    cache = PromptCache(client=langfuse, ttl_seconds=0, retry_seconds=60)
+
+    async def take_down_after_first_fetch() -> str:
+        await cache.get("PROMPT")
+        langfuse.available = False
+        return await _get_stale(cache)
+
+    assert (
+        asyncio.run(take_down_after_first_fetch()) == "Question: {{question}}"
+    )
+    assert cache.stats()["refresh_errors"] == 1
+
+
+def test_stale_prompts_are_refreshed() -> None:
+    langfuse = _Langfuse()
+    cache = PromptCache(client=langfuse, ttl_seconds=0, retry_seconds=0)
+
+    async def update_prompt() -> str:
+        await cache.get("PROMPT")
+        langfuse.text = "New question: {{question}}"
+        await _get_stale(cache)
+        return (await cache.get("PROMPT")).prompt
+
+    assert asyncio.run(update_prompt()) == "New question: {{question}}"
+
+
+def test_missing_prompts_raise() -> None:
+    langfuse = _Langfuse()
+    langfuse.available = False
+    cache = PromptCache(client=langfuse)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(cache.get("PROMPT"))
+
+
+def _create_store() -> PromptStore:
+    # one in-memory database shared by the threads of the store
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    LangfusePrompt.__table__.create(engine)  # type: ignore
+    return PromptStore(engine=engine)
+
+
+def test_stored_prompts_are_served_when_langfuse_is_down() -> None:
+    langfuse = _Langfuse()
+    langfuse.available = False
+    store = _create_store()
+    store.save("PROMPT", 3, "Stored question: {{question}}")
+    cache = PromptCache(client=langfuse, store=store)
+
+    prompt = asyncio.run(cache.get("PROMPT"))
+
+    assert prompt.compile(question="Why?") == "Stored question: Why?"
+    assert langfuse.calls == 0
+    assert cache.stats()["store_hits"] == 1
+
+
+def test_fetched_prompts_are_stored() -> None:
+    langfuse = _Langfuse()
+    store = _create_store()
+    cache = PromptCache(client=langfuse, store=store)
+
+    async def fetch() -> None:
+        await cache.get("PROMPT")
+        # let the background save run
+        await asyncio.sleep(0.1)
+        # the completed save is released
+        assert not cache._tasks
+
+    asyncio.run(fetch())
+
+    stored = store.load("PROMPT")
+    assert stored is not None
+    assert (stored.version, stored.prompt) == (1, "Question: {{question}}")
+
+
+def test_store_is_synced_with_langfuse() -> None:
+    langfuse = _Langfuse()
+    store = _create_store()
+    store.save("PROMPT", None, "Old question: {{question}}")
+
+    assert store.sync(langfuse) == 1  # type: ignore
+    assert store.load("PROMPT").prompt == "Question: {{question}}"  # type: ignore
+    assert store.sync(langfuse) == 0  # type: ignore
+
+
+def test_all_stored_prompts_are_synced() -> None:
+    langfuse = _Langfuse()
+    store = _create_store()
+    for index in range(20):
+        store.save(f"PROMPT-{index}", 1, "Question: {{question}}")
+    store.save("PROMPT-20", None, "Old question: {{question}}")
+
+    assert store.sync(langfuse) == 1  # type: ignore
+    assert langfuse.calls == 21
+    assert store.load("PROMPT-20").version == 1  # type: ignore
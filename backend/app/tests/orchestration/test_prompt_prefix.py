@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk, LLMResult
+
+from app.orchestration.llm import usage
+from app.orchestration.llm.usage import (
+    TokenUsageCallbackHandler,
+    TokenUsageTracker,
+)
+from app.orchestration.prompts import XLeapSystemPromptBase
+
+
+def _idea(count: int) -> SimpleNamespace:
+    # every third idea was posted by the agent
+    return SimpleNamespace(
+        idea_count=count, text=f"idea {count}", created_by_ai=count % 3 == 0
+    )
+
+
+class _Prompts(XLeapSystemPromptBase):
+    async def _get_prompt_from_langfuse(self, prompt_name: str) -> str:
+        return prompt_name
+
+
+def _messages(
+    ideas: list[SimpleNamespace], max_human_ideas: int = 0
+) -> list[tuple[str, str]]:
+    prompts = _Prompts()
+    return asyncio.run(
+        prompts.generate_cacheable_idea_prompts(
+            ideas,  # type: ignore
+            max_human_ideas=max_human_ideas,
+            chunk_size=10,
+        )
+    )
+
+
+def _shares_prefix(
+    earlier: list[tuple[str, str]], later: list[tuple[str, str]]
+) -> bool:
+    """only the last block of the earlier messages was appended to"""
+    last = len(earlier) - 1
+    return later[:last] == earlier[:last] and later[last][1].startswith(
+        earlier[last][1]
+    )
+
+
+def test_prefix_stays_identical_when_ideas_arrive() -> None:
+    ideas = [_idea(count) for count in range(1, 36)]
+    messages = _messages(ideas)
+
+    for count in range(36, 60):
+        ideas.append(_idea(count))
+        # the ideas arrive in any order
+        later = _messages(list(reversed(ideas)))
+        assert _shares_prefix(messages, later)
+        messages = later
+
+
+def test_window_slides_by_whole_blocks() -> None:
+    ideas = [_idea(count) for count in range(1, 36)]
+    messages = _messages(ideas, max_human_ideas=20)
+
+    window_moves = 0
+    for count in range(36, 80):
+        ideas.append(_idea(count))
+        later = _messages(ideas, max_human_ideas=20)
+        if not _shares_prefix(messages, later):
+            window_moves += 1
+        messages = later
+    # 44 new ideas move the window about 4 blocks, not once per idea
+    assert 0 < window_moves <= 5
+
+
+def test_usage_of_least_recent_agents_is_dropped() -> None:
+    tracker = TokenUsageTracker(max_agents=2)
+    for agent_id in ["a", "b", "a", "c"]:
+        tracker.record(agent_id, 10, 5, 1)
+
+    stats = tracker.stats()
+    assert list(stats) == ["a", "c"]
+    assert stats["a"]["calls"] == 2
+
+    tracker.forget("a")
+    assert list(tracker.stats()) == ["c"]
+
+
+def test_streamed_calls_are_counted_as_unreported(monkeypatch: Any) -> None:
+    tracker = TokenUsageTracker()
+    monkeypatch.setattr(usage, "token_usage_tracker", tracker)
+    handler = TokenUsageCallbackHandler(agent_id="a")
+
+    handler.on_llm_end(
+        LLMResult(
+            generations=[
+                [ChatGenerationChunk(message=AIMessageChunk(content="x"))]
+            ]
+        )
+    )
+    handler.on_llm_end(
+        LLMResult(
+            generations=[],
+            llm_output={
+                "token_usage": {"prompt_tokens": 10, "completion_tokens": 2}
+            },
+        )
+    )
+
+    stats = tracker.stats()["a"]
+    assert stats["calls"] == 1
+    assert stats["unreported_calls"] == 1
+    assert stats["prompt_tokens"] == 10
@@ -0,0 +1,136 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.orchestration.llm.rate_limiter import (
+    RateLimiter,
+    estimate_tokens,
+    get_key_id,
+    parse_reset_duration,
+)
+
+
+def _headers(**values: str) -> httpx.Headers:
+    return httpx.Headers(
+        {name.replace("_", "-"): value for name, value in values.items()}
+    )
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [
+        ("1s", 1.0),
+        ("6m0s", 360.0),
+        ("20ms", 0.02),
+        ("1h2m", 3720.0),
+        ("2.5", 2.5),
+        ("", 0.0),
+        (None, 0.0),
+        ("soon", 0.0),
+    ],
+)
+def test_reset_durations(value: str | None, seconds: float) -> None:
+    assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+def test_key_id_depends_on_api_and_key() -> None:
+    first = httpx.Request(
+        "POST", "https://api.example/v1", headers={"Authorization": "a"}
+    )
+    other_key = httpx.Request(
+        "POST", "https://api.example/v1", headers={"Authorization": "b"}
+    )
+    other_api = httpx.Request(
+        "POST", "https://llm.example/v1", headers={"Authorization": "a"}
+    )
+    assert get_key_id(first) != get_key_id(other_key)
+    assert get_key_id(first) != get_key_id(other_api)
+    assert get_key_id(httpx.Request("GET", "https://api.example")) is None
+    # a short hash, the key is not exposed
+    assert len(get_key_id(first)) == 12  # type: ignore
+
+
+def test_tokens_are_estimated_from_the_body() -> None:
+    request = httpx.Request("POST", "https://api.example", content="x" * 400)
+    assert estimate_tokens(request) == 100
+
+
+def test_requests_are_not_throttled_before_calibration() -> None:
+    limiter = RateLimiter()
+    for _ in range(100):
+        assert limiter.reserve("key", 10_000) == 0
+
+
+def test_buckets_are_calibrated_from_the_headers() -> None:
+    limiter = RateLimiter()
+    limiter.update(
+        "key",
+        200,
+        _headers(
+            x_ratelimit_limit_requests="60",
+            x_ratelimit_remaining_requests="1",
+            x_ratelimit_reset_requests="59s",
+            x_ratelimit_limit_tokens="1000",
+            x_ratelimit_remaining_tokens="1000",
+        ),
+    )
+    stats = limiter.stats()["key"]
+    assert stats["request_limit"] == 60
+    assert stats["token_limit"] == 1000
+
+    # the remaining request is taken, the next one waits for the refill of
+    # one request (59 requests in 59s)
+    assert limiter.reserve("key", 10) == 0
+    assert limiter.reserve("key", 10) == pytest.approx(1.0, abs=0.05)
+    # callers queue behind each other
+    assert limiter.reserve("key", 10) == pytest.approx(2.0, abs=0.05)
+    assert limiter.stats()["key"]["throttled_calls"] == 2
+
+
+def test_large_requests_wait_for_tokens() -> None:
+    limiter = RateLimiter()
+    limiter.update(
+        "key",
+        200,
+        _headers(
+            x_ratelimit_limit_tokens="600",
+            x_ratelimit_remaining_tokens="0",
+            x_ratelimit_reset_tokens="6s",
+        ),
+    )
+    # 100 tokens per second
+    assert limiter.reserve("key", 300) == pytest.approx(3.0, abs=0.05)
+
+
+def test_rate_limited_key_is_blocked_until_the_reset() -> None:
+    limiter = RateLimiter()
+    limiter.update("key", 429, _headers(retry_after="2"))
+
+    assert limiter.reserve("key", 1) == pytest.approx(2.0, abs=0.05)
+    assert limiter.reserve("other key", 1) == 0
+    assert limiter.stats()["key"]["rate_limited_responses"] == 1
+
+
+def test_rate_limited_key_is_blocked_at_least_one_second() -> None:
+    limiter = RateLimiter()
+    limiter.update("key", 429, _headers())
+    assert limiter.reserve("key", 1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_throttled_requests_do_not_block_the_event_loop() -> None:
+    limiter = RateLimiter()
+    limiter.update("key", 429, _headers(retry_after="0.2"))
+    ticks = 0
+
+    async def tick() -> None:
+        nonlocal ticks
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    async def run() -> None:
+        await asyncio.gather(limiter.acquire_async("key", 1), tick())
+
+    asyncio.run(run())
+    assert ticks == 5
@@ -0,0 +1,36 @@
+import asyncio
+
+from app.orchestration.llm import (
+    JobType,
+    close_http_clients,
+    deadline_scope,
+    get_async_http_client,
+    wait_for_running_jobs,
+)
+
+
+def test_shutdown_waits_for_running_jobs() -> None:
+    async def job() -> None:
+        with deadline_scope(JobType.PERIODIC):
+            await asyncio.sleep(0.3)
+
+    async def shut_down_during_job() -> tuple[bool, bool]:
+        task = asyncio.create_task(job())
+        await asyncio.sleep(0)
+        timed_out = await wait_for_running_jobs(timeout=0.1)
+        drained = await wait_for_running_jobs(timeout=1)
+        await task
+        return timed_out, drained
+
+    assert asyncio.run(shut_down_during_job()) == (False, True)
+
+
+def test_closed_http_clients_are_created_again() -> None:
+    async def close_and_get() -> bool:
+        client = get_async_http_client()
+        await close_http_clients()
+        new_client = get_async_http_client()
+        await close_http_clients()
+        return client.is_closed and new_client is not client
+
+    assert asyncio.run(close_and_get())
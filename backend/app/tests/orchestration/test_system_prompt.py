@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.orchestration.prompts import XLeapSystemPromptBase
+
+
+class _SlowPrompts(XLeapSystemPromptBase):
+    """Answers prompts in reverse order of the requests"""
+
+    def __init__(self):
+        self.requested: list[str] = []
+        self.running = 0
+        self.max_running = 0
+
+    async def _get_prompt_from_langfuse(self, prompt_name: str) -> str:
+        self.requested.append(prompt_name)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.05 - len(self.requested) * 0.002)
+        self.running -= 1
+        return f"<{prompt_name}>"
+
+
+def _briefing() -> SimpleNamespace:
+    briefing = SimpleNamespace()
+    for part in [
+        "host_info",
+        "session_info",
+        "participant_info",
+        "workspace_info",
+        "workspace_instruction",
+        "additional_info",
+        "persona",
+        "tone",
+        "response_language",
+    ]:
+        setattr(briefing, f"with_{part}", True)
+        setattr(briefing, part, part)
+        setattr(briefing, f"{part}_langfuse_name", part.upper())
+    briefing.context_intro_langfuse_name = "CONTEXT"
+    briefing.with_num_exemplar = 1
+    briefing.exemplar_langfuse_name = "EXEMPLAR"
+    # the same prompt used twice
+    briefing.response_length_langfuse_name = "TONE"
+    return briefing
+
+
+def test_system_prompt_keeps_the_order_of_the_parts() -> None:
+    prompts = _SlowPrompts()
+    references = [
+        SimpleNamespace(
+            type="link", langfuse_name="LINK", ref_number=1, text="t", url="u"
+        ),
+        SimpleNamespace(
+            type="exemplar",
+            langfuse_name="EXEMPLAR_REF",
+            ref_number=1,
+            text="e",
+        ),
+    ]
+
+    result = asyncio.run(
+        prompts.generate_system_prompt(
+            briefing=_briefing(), references=references
+        )
+    )
+
+    assert result.prompt.split("\n") == [
+        "<HOST_INFO>",
+        "<CONTEXT>",
+        "<SESSION_INFO>",
+        "<PARTICIPANT_INFO>",
+        "<WORKSPACE_INFO>",
+        "<LINK>",
+        "<WORKSPACE_INSTRUCTION>",
+        "<ADDITIONAL_INFO>",
+        "<PERSONA>",
+        "<TONE>",
+        "<EXEMPLAR>",
+        "<EXEMPLAR_REF>",
+        "<TONE>",
+        "<RESPONSE_LANGUAGE>",
+    ]
+    assert result.lang_chain_input["link_url_1"] == "u"
+    assert result.lang_chain_input["exemplar_1"] == "e"
+    # every prompt is fetched once, several at a time
+    assert sorted(prompts.requested) == sorted(set(prompts.requested))
+    assert prompts.max_running > 1
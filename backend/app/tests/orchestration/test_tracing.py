@@ -0,0 +1,69 @@
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+from langfuse import Langfuse
+
+from app.core.config import settings
+from app.orchestration.llm import JobType, deadline_scope
+from app.orchestration.prompts import Tracer
+
+
+class _IngestionHandler(BaseHTTPRequestHandler):
+    """Accepts the trace events like the ingestion API of Langfuse"""
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        response = b'{"successes": [], "errors": []}'
+        self.send_response(207)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def tracer() -> Iterator[Tracer]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Langfuse(
+        public_key="pk-test",
+        secret_key="sk-test",
+        host=f"http://127.0.0.1:{server.server_port}",
+    )
+    yield Tracer(client=client)
+    client.flush()
+    server.shutdown()
+
+
+def test_every_job_has_its_own_trace(tracer: Tracer) -> None:
+    first = tracer.start_trace("job", job_type=JobType.ON_DEMAND)
+    second = tracer.start_trace("job", job_type=JobType.ON_DEMAND)
+
+    assert first.trace_id is not None
+    assert first.trace_id != second.trace_id
+    assert first.get_callbacks()[0] is not second.get_callbacks()[0]
+    assert first.get_callbacks()[0].trace.id == first.trace_id
+
+
+def test_jobs_are_sampled_per_job_type(
+    tracer: Tracer, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "LANGFUSE_SAMPLE_RATE_PERIODIC", 0.0)
+    monkeypatch.setattr(settings, "LANGFUSE_SAMPLE_RATE_TEST", 1.0)
+
+    with deadline_scope(JobType.PERIODIC):
+        periodic = tracer.start_trace("job")
+    with deadline_scope(JobType.TEST):
+        test = tracer.start_trace("job")
+
+    assert periodic.get_callbacks() == []
+    periodic.span(name="ignored")
+    assert len(test.get_callbacks()) == 1
+    assert tracer.stats()["sampled_jobs"] == 1
+    assert tracer.stats()["skipped_jobs"] == 1
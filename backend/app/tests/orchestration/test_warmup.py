@@ -0,0 +1,155 @@
+import asyncio
+import time
+import uuid as uuid_pkg
+from collections.abc import Generator
+from typing import Any
+
+import httpx
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine
+
+from app.models import AIAgent, Briefing2, Briefing2Reference
+from app.orchestration import warmup
+from app.orchestration.llm import close_http_clients, rate_limiter
+from app.orchestration.llm.rate_limiter import get_key_id
+from app.tests.utils.llm_server import StandInLLMServer
+
+
+class _PromptCache:
+    def __init__(self) -> None:
+        self.names: list[str] = []
+
+    async def get(self, name: str) -> None:
+        self.names.append(name)
+        if name == "MISSING":
+            raise ConnectionError("Langfuse is down")
+
+
+@pytest.fixture
+def stand_in_server() -> Generator[StandInLLMServer, None, None]:
+    with StandInLLMServer() as server:
+        yield server
+
+
+@pytest.fixture
+def prompt_cache(monkeypatch: Any) -> _PromptCache:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    AIAgent.__table__.create(engine)  # type: ignore
+    Briefing2.__table__.create(engine)  # type: ignore
+    Briefing2Reference.__table__.create(engine)  # type: ignore
+    cache = _PromptCache()
+    resolved: list[str] = []
+
+    async def resolve(server_address: str) -> None:
+        resolved.append(server_address)
+
+    monkeypatch.setattr(warmup, "engine", engine)
+    monkeypatch.setattr(warmup, "prompt_cache", cache)
+    monkeypatch.setattr(warmup, "resolve_server_addr_async", resolve)
+    return cache
+
+
+def _add_agent(api_url: str, is_active: bool = True) -> str:
+    agent_id = uuid_pkg.uuid4()
+    with Session(warmup.engine) as session:
+        session.add(
+            AIAgent(
+                id=agent_id,
+                server_address="http://xleap",
+                session_id="session",
+                workspace_id="workspace",
+                instance_id=str(agent_id),
+                secret="secret",
+                api_type="openai",
+                api_url=api_url,
+                model="local-model",
+                api_key="local-key",
+                is_active=is_active,
+            )
+        )
+        session.add(
+            Briefing2(
+                agent_id=agent_id,
+                instance_id=str(agent_id),
+                persona_langfuse_name="PERSONA",
+                tone_langfuse_name="MISSING",
+            )
+        )
+        session.add(
+            Briefing2Reference(
+                agent_id=agent_id,
+                ref_id="ref",
+                type="text",
+                text="a reference",
+                langfuse_name="PERSONA",
+                url="",
+                url_expires_at="",
+                filename="",
+            )
+        )
+        session.commit()
+    return str(agent_id)
+
+
+def _run(coro: Any) -> Any:
+    async def run() -> Any:
+        try:
+            return await coro
+        finally:
+            await close_http_clients()
+
+    return asyncio.run(run())
+
+
+def test_agent_is_warmed_up(
+    prompt_cache: _PromptCache, stand_in_server: StandInLLMServer
+) -> None:
+    agent_id = _add_agent(stand_in_server.base_url)
+
+    # the failing prompt is logged only
+    _run(warmup.warm_up_agent(agent_id))
+
+    assert sorted(prompt_cache.names) == ["MISSING", "PERSONA"]
+    assert stand_in_server.requests == [
+        {"path": "/v1/models", "authorization": "Bearer local-key"}
+    ]
+
+
+def test_warm_up_is_not_throttled(
+    prompt_cache: _PromptCache, stand_in_server: StandInLLMServer
+) -> None:
+    agent_id = _add_agent(stand_in_server.base_url)
+    key_id = get_key_id(
+        httpx.Request(
+            "GET",
+            stand_in_server.base_url,
+            headers={"Authorization": "Bearer local-key"},
+        )
+    )
+    # the key is blocked for a minute
+    rate_limiter.update(key_id, 429, httpx.Headers({"retry-after": "60"}))  # type: ignore
+
+    started = time.monotonic()
+    _run(warmup.warm_up_agent(agent_id))
+
+    assert time.monotonic() - started < 10
+    assert len(stand_in_server.requests) == 1
+    assert rate_limiter.stats()[key_id]["throttled_calls"] == 0  # type: ignore
+
+
+def test_active_agents_are_warmed_up(
+    prompt_cache: _PromptCache, stand_in_server: StandInLLMServer
+) -> None:
+    _add_agent(stand_in_server.base_url)
+    _add_agent(stand_in_server.base_url)
+    _add_agent(stand_in_server.base_url, is_active=False)
+
+    _run(warmup.warm_up_active_agents())
+
+    assert len(stand_in_server.requests) == 2
+    assert prompt_cache.names.count("PERSONA") == 2
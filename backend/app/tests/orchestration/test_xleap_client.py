@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import aiohttp
+import pytest
+
+from app.orchestration.data import XLeapClient
+
+
+class _XLeapHandler(BaseHTTPRequestHandler):
+    """Accepts ideas like an XLeap server, keeps connections alive"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        status = 409 if self.path.endswith("/inactive") else 201
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url() -> Any:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _XLeapHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+async def _post(client: XLeapClient, url: str) -> None:
+    async with client.request("POST", url, data="{}") as response:
+        response.raise_for_status()
+
+
+def test_connections_are_reused(server_url: str) -> None:
+    client = XLeapClient()
+
+    async def post_ideas() -> None:
+        for _ in range(3):
+            await _post(client, f"{server_url}/ideas")
+        await client.close()
+
+    asyncio.run(post_ideas())
+
+    stats = client.stats()["127.0.0.1"]
+    assert stats["requests"] == 3
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_errors_are_counted(server_url: str) -> None:
+    client = XLeapClient()
+
+    async def post_idea_of_inactive_agent() -> None:
+        try:
+            await _post(client, f"{server_url}/inactive")
+        finally:
+            await client.close()
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(post_idea_of_inactive_agent())
+    assert client.stats()["127.0.0.1"]["errors"] == 1
@@ -0,0 +1,10 @@
+import os
+
+import pytest
+
+# the benchmarks compare wall-clock times, which depend on the machine and
+# its load, they only run with RUN_BENCHMARKS=1
+benchmark = pytest.mark.skipif(
+    not os.environ.get("RUN_BENCHMARKS"),
+    reason="benchmarks run with RUN_BENCHMARKS=1 only",
+)
@@ -0,0 +1,101 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Answers chat completions like an OpenAI compatible server"""
+
+    server: "StandInLLMServer"
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(
+            {
+                "path": self.path,
+                "authorization": self.headers["Authorization"],
+                "body": body,
+            }
+        )
+        choices = [
+            {
+                "index": index,
+                "message": {
+                    "role": "assistant",
+                    "content": f"{self.server.content} {index}",
+                },
+                "finish_reason": "stop",
+            }
+            for index in range(body.get("n") or 1)
+        ]
+        response = json.dumps(
+            {
+                "id": "chatcmpl-stand-in",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": choices,
+                "usage": {
+                    "prompt_tokens": 5,
+                    "completion_tokens": 3,
+                    "total_tokens": 8,
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        for name, value in self.server.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_GET(self) -> None:
+        self.server.requests.append(
+            {"path": self.path, "authorization": self.headers["Authorization"]}
+        )
+        response = json.dumps(
+            {
+                "object": "list",
+                "data": [{"id": "local-model", "object": "model"}],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class StandInLLMServer(ThreadingHTTPServer):
+    """
+    A local OpenAI compatible chat completions (and models) server for tests.
+    The content of choice i is "<content> <i>".
+    """
+
+    def __init__(
+        self,
+        content: str = "A local idea",
+        headers: dict[str, str] | None = None,
+    ):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.content = content
+        self.headers = headers or {}
+        self.requests: list[dict] = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+    def __enter__(self) -> "StandInLLMServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,152 @@
+from sqlalchemy import event
+from sqlmodel import Session, create_engine, select
+
+from app.models import (
+    BriefingCategory,
+    BriefingSubCategory,
+    BriefingSubCategoryDifferentiator,
+    LangfusePrompt,
+    XLeapBriefingPrompt,
+)
+from app.utils.briefings import (
+    LangfusePromptNameResolver,
+    _PromptSpec,
+    get_template_digest,
+)
+
+
+class _Prompt:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _Langfuse:
+    """Creates prompts like the Langfuse client"""
+
+    def __init__(self):
+        self.created: list[str] = []
+
+    def create_prompt(
+        self, name: str, prompt: str, is_active: bool
+    ) -> _Prompt:
+        self.created.append(prompt)
+        return _Prompt(name)
+
+
+_SPECS = [
+    _PromptSpec(
+        cat=BriefingCategory.PERSONA,
+        sub_category=BriefingSubCategory.NONE,
+        template="You are {persona}",
+    ),
+    _PromptSpec(
+        cat=BriefingCategory.TASK_TEMPLATE,
+        sub_category=BriefingSubCategory.WS_BRAINSTORM,
+        template="Generate an idea",
+        differentiator=BriefingSubCategoryDifferentiator.TASK_ONE_NN,
+    ),
+    _PromptSpec(
+        cat=BriefingCategory.LINK,
+        sub_category=BriefingSubCategory.NONE,
+        template="Read {link}",
+        ref_number=2,
+    ),
+]
+
+
+def _create_session() -> tuple[Session, list[str]]:
+    engine = create_engine("sqlite://")
+    XLeapBriefingPrompt.__table__.create(engine)  # type: ignore
+    LangfusePrompt.__table__.create(engine)  # type: ignore
+    statements: list[str] = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    return Session(engine), statements
+
+
+def test_missing_prompts_are_created_in_one_batch() -> None:
+    session, statements = _create_session()
+    langfuse = _Langfuse()
+    resolver = LangfusePromptNameResolver(client=langfuse)
+
+    names = resolver.resolve(session, _SPECS)
+
+    # one SELECT of all templates, the mappings and the prompts are stored
+    # in one transaction
+    selects = [s for s in statements if s.startswith("SELECT")]
+    assert len([s for s in selects if "xleap_briefing_prompt" in s]) == 1
+    assert len([s for s in statements if s.startswith("INSERT")]) == 2
+    assert sorted(langfuse.created) == sorted(spec.template for spec in _SPECS)
+    assert names[_SPECS[1].key].startswith("xleap-task_template-")
+    assert names[_SPECS[2].key].startswith("xleap-link-2-")
+    stored = session.exec(select(XLeapBriefingPrompt)).all()
+    assert {(p.category, p.sub_category) for p in stored} == {
+        ("persona", "none"),
+        ("task_template", "ws_brainstorm_1_nn"),
+        ("link", "none@2"),
+    }
+    assert all(
+        p.template_digest == get_template_digest(p.template) for p in stored
+    )
+    assert {p.prompt for p in session.exec(select(LangfusePrompt))} == {
+        spec.template for spec in _SPECS
+    }
+
+
+def test_resolved_names_are_cached() -> None:
+    session, statements = _create_session()
+    langfuse = _Langfuse()
+    resolver = LangfusePromptNameResolver(client=langfuse)
+    names = resolver.resolve(session, _SPECS)
+    statements.clear()
+
+    assert resolver.resolve(session, reversed(_SPECS)) == names
+    assert statements == []
+    assert len(langfuse.created) == len(_SPECS)
+    assert resolver.stats()["hits"] == len(_SPECS)
+
+
+def test_stored_prompts_are_reused() -> None:
+    session, _ = _create_session()
+    langfuse = _Langfuse()
+    LangfusePromptNameResolver(client=langfuse).resolve(session, _SPECS)
+
+    # e.g. another worker or a restart: the cache is empty
+    names = LangfusePromptNameResolver(client=langfuse, max_size=1).resolve(
+        session, _SPECS
+    )
+
+    assert len(names) == len(_SPECS)
+    assert len(langfuse.created) == len(_SPECS)
+
+
+class _SameSecondLangfuse(_Langfuse):
+    """Names every prompt alike, like requests within the same second"""
+
+    def create_prompt(
+        self, name: str, prompt: str, is_active: bool
+    ) -> _Prompt:
+        super().create_prompt(name, prompt, is_active)
+        return _Prompt("xleap-persona-2024-01-01_00-00-00")
+
+
+def test_prompt_of_the_same_name_is_replaced_in_the_store() -> None:
+    session, _ = _create_session()
+    # stored by a concurrent request
+    session.add(
+        LangfusePrompt(
+            name="xleap-persona-2024-01-01_00-00-00", prompt="You are a host"
+        )
+    )
+    session.commit()
+
+    names = LangfusePromptNameResolver(client=_SameSecondLangfuse()).resolve(
+        session, _SPECS[:1]
+    )
+
+    assert names[_SPECS[0].key] == "xleap-persona-2024-01-01_00-00-00"
+    [stored] = session.exec(select(LangfusePrompt)).all()
+    assert stored.prompt == "You are {persona}"
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import re
+import time
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from app.orchestration.prompts.multi_agent import (
+    MultiAgent,
+    _completes_selected_idea,
+)
+from app.orchestration.prompts.xleap_few_shot import XLeapBasicPrompt
+from app.tests.utils.benchmarks import benchmark
+from app.utils.output_parsing import (
+    NoSelectedIdeaError,
+    SelectedIdeaExtractor,
+    clean_idea,
+    extract_selected_idea,
+    parse_selected_idea,
+    parse_selected_ideas,
+)
+
+_RESPONSE = (
+    "1. first\n2. second\n"
+    '<selected_idea id="2"> A shared bike station </selected_idea>\n'
+    "The idea was selected because"
+)
+
+
+def _tokens(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_idea_is_returned_by_the_closing_tag() -> None:
+    for size in [1, 3, 7, len(_RESPONSE)]:
+        extractor = SelectedIdeaExtractor()
+        tokens = _tokens(_RESPONSE, size)
+        ideas = [extractor.feed(token) for token in tokens]
+
+        completed_at = next(i for i, idea in enumerate(ideas) if idea)
+        assert "</selected_idea>" in "".join(tokens[: completed_at + 1])
+        assert "</selected_idea>" not in "".join(tokens[:completed_at])
+        assert ideas[completed_at] == "A shared bike station"
+        assert extractor.finish() == "A shared bike station"
+
+
+def test_stopped_response_has_no_closing_tag() -> None:
+    extractor = SelectedIdeaExtractor()
+    for token in _tokens("<selected_idea>\nA bike station\n", 4):
+        assert extractor.feed(token) is None
+    assert extractor.finish() == "A bike station"
+
+
+def test_response_without_tag() -> None:
+    extractor = SelectedIdeaExtractor()
+    assert extractor.feed("no <selected idea") is None
+    assert extractor.finish() is None
+
+
+def test_stream_is_closed_after_the_selection() -> None:
+    consumed: list[str] = []
+    closed = False
+
+    async def stream() -> AsyncGenerator[str, None]:
+        nonlocal closed
+        try:
+            for token in _tokens(_RESPONSE, 5):
+                await asyncio.sleep(0)
+                consumed.append(token)
+                yield token
+        finally:
+            closed = True
+
+    idea = asyncio.run(extract_selected_idea(stream()))
+
+    assert idea == "A shared bike station"
+    assert closed
+    assert "because" not in "".join(consumed)
+
+
+def test_response_without_tag_is_no_idea() -> None:
+    async def stream() -> AsyncGenerator[str, None]:
+        for token in ["  **Bike", ' stations**"', " "]:
+            yield token
+
+    with pytest.raises(NoSelectedIdeaError):
+        asyncio.run(extract_selected_idea(stream()))
+
+
+def test_cleanup() -> None:
+    assert clean_idea(' **"A bike station"** ') == "A bike station"
+    assert clean_idea('**"Bike"**', remove_quotes=False) == '"Bike"'
+
+
+def test_multiple_ideas() -> None:
+    text = (
+        "<selected_idea>**First**</selected_idea> because\n"
+        '<selected_idea id="2">\n"Second"\n</selected_idea>\n'
+        "<selected_idea>Third, stopped"
+    )
+    assert parse_selected_ideas(text) == ["First", "Second", "Third, stopped"]
+    assert parse_selected_idea(text) == "First"
+
+
+def test_missing_tags() -> None:
+    assert parse_selected_ideas("An idea without tags") == []
+    with pytest.raises(NoSelectedIdeaError):
+        parse_selected_idea(" **An idea** without tags ")
+    with pytest.raises(NoSelectedIdeaError):
+        parse_selected_idea("")
+
+
+def test_candidate_without_tag_is_kept_as_generated() -> None:
+    assert XLeapBasicPrompt._parse_candidate(' **Bike** "stations" ') == (
+        ' **Bike** "stations" '
+    )
+    assert (
+        XLeapBasicPrompt._parse_candidate(
+            'Idea: <selected_idea>**Bike** "stations"</selected_idea>'
+        )
+        == 'Bike "stations"'
+    )
+
+
+def test_conversation_keeps_non_ascii_text() -> None:
+    messages = [
+        {"content": "task", "name": "Mayor"},
+        {"content": "<selected_idea>Grüne Dächer</selected_idea>"},
+        {"content": "Besser: <selected_idea>Grüne Dächer 🌱</selected_idea>"},
+        {"content": None},
+    ]
+    assert MultiAgent._parse_idea(messages) == "Grüne Dächer 🌱"
+    with pytest.raises(NoSelectedIdeaError):
+        MultiAgent._parse_idea([{"content": "Nur Text"}])
+
+
+def test_discussion_ends_with_the_first_selection_of_an_agent() -> None:
+    task = "Answer with <selected_idea>...</selected_idea>"
+    # the task shows the tags, it does not end the discussion
+    assert not _completes_selected_idea(task, {"content": task})
+    assert not _completes_selected_idea(task, {"content": None})
+    assert _completes_selected_idea(
+        task, {"content": "<selected_idea>Green roofs</selected_idea>"}
+    )
+
+
+def _reference_parse(messages: list[dict]) -> str:
+    """the previous parsing of the JSON transcript of MultiAgent"""
+    text = json.dumps(messages)
+    content = re.findall(r"<selected_idea.*?>(.*?)<\/selected_idea>", text)[-1]
+    content = content.strip().encode("utf-8").decode("unicode_escape")
+    return content.replace("**", "").replace('"', "")
+
+
+def _transcript(messages: int) -> list[dict]:
+    discussion = "We could build bike stations at every station. " * 40
+    return [
+        {
+            "content": f"{discussion}\n<selected_idea>Idea {i}</selected_idea>",
+            "name": "Mayor",
+        }
+        for i in range(messages)
+    ]
+
+
+@benchmark
+def test_benchmark_large_transcripts() -> None:
+    transcript = _transcript(2_000)
+
+    started = time.perf_counter()
+    reference = _reference_parse(transcript)
+    reference_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    idea = MultiAgent._parse_idea(transcript)
+    elapsed = time.perf_counter() - started
+
+    assert idea == reference == "Idea 1999"
+    assert elapsed * 2 < reference_elapsed
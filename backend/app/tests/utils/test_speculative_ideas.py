@@ -0,0 +1,209 @@
+import asyncio
+import uuid as uuid_pkg
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine
+
+from app.api.routes import ideas as idea_routes
+from app.models import AIAgent, Idea, PromptStrategy, PromptStrategyType
+from app.orchestration.prompts import dynamic
+from app.utils import SpeculativeIdea, agent_manager, is_speculative_idea_stale
+
+
+@pytest.fixture
+def session() -> Any:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    AIAgent.__table__.create(engine)  # type: ignore
+    Idea.__table__.create(engine)  # type: ignore
+    PromptStrategy.__table__.create(engine)  # type: ignore
+    with Session(engine) as session:
+        yield session
+
+
+def _use_strategy(session: Session, strategy_type: PromptStrategyType) -> None:
+    session.add(PromptStrategy(type=strategy_type, host_id=""))
+    session.commit()
+
+
+def _create_agent(session: Session) -> AIAgent:
+    agent = AIAgent(
+        server_address="http://xleap",
+        session_id="session",
+        workspace_id="workspace",
+        instance_id=str(uuid_pkg.uuid4()),
+        secret="secret",
+        api_type="openai",
+        model="gpt-4",
+        api_key="key",
+        is_active=True,
+    )
+    session.add(agent)
+    session.commit()
+    return agent
+
+
+def _add_idea(
+    session: Session,
+    agent: AIAgent,
+    count: int,
+    text: str = "",
+    created_by_ai: bool = False,
+) -> None:
+    session.add(
+        Idea(
+            id=f"idea-{count}",
+            text=text or f"participant idea number {count}",
+            created_by_ai=created_by_ai,
+            agent_id=agent.id,
+            idea_count=count,
+        )
+    )
+    session.commit()
+
+
+def _candidate() -> SpeculativeIdea:
+    return SpeculativeIdea(text="bike stations at the lake", last_idea_count=5)
+
+
+def test_candidate_is_stale_after_many_human_ideas(session: Session) -> None:
+    agent = _create_agent(session)
+    # ideas the candidate was generated from
+    _add_idea(session, agent, 5)
+
+    for count in range(6, 9):
+        _add_idea(session, agent, count)
+        assert not is_speculative_idea_stale(session, agent.id, _candidate())
+
+    _add_idea(session, agent, 9)
+    assert is_speculative_idea_stale(session, agent.id, _candidate())
+
+
+def test_candidate_is_stale_after_an_ai_idea(session: Session) -> None:
+    agent = _create_agent(session)
+    _add_idea(session, agent, 6, created_by_ai=True)
+    assert is_speculative_idea_stale(session, agent.id, _candidate())
+
+
+def test_candidate_is_stale_if_similar_or_old(session: Session) -> None:
+    agent = _create_agent(session)
+    assert not is_speculative_idea_stale(session, agent.id, _candidate())
+
+    old = _candidate()
+    old.created_at = datetime.now(UTC) - timedelta(days=1)
+    assert is_speculative_idea_stale(session, agent.id, old)
+
+    _add_idea(session, agent, 6, text="Bike stations at the lake!")
+    assert is_speculative_idea_stale(session, agent.id, _candidate())
+
+
+def test_stale_candidate_is_regenerated(session: Session) -> None:
+    agent = _create_agent(session)
+    _use_strategy(session, PromptStrategyType.XLEAP_FEW_SHOT)
+    assert idea_routes._needs_speculative_idea(agent, session)
+
+    agent_manager.store_speculative_idea(agent.id, _candidate())
+    assert not idea_routes._needs_speculative_idea(agent, session)
+
+    for count in range(6, 10):
+        _add_idea(session, agent, count)
+    assert idea_routes._needs_speculative_idea(agent, session)
+    assert agent_manager.get_speculative_idea(agent.id) is None
+
+
+def test_generation_consumes_the_pending_trigger(monkeypatch: Any) -> None:
+    agent_id = uuid_pkg.uuid4()
+
+    def fail(**kwargs: Any) -> None:
+        raise RuntimeError("no strategy")
+
+    monkeypatch.setattr(dynamic, "get_prompt_strategy", fail)
+    lock = agent_manager.try_acquire_generation_lock(agent_id)
+    # the agent is triggered while it generates
+    agent_manager.add_pending_trigger(agent_id)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(dynamic.generate_idea_and_post(str(agent_id), None, lock))
+
+    assert not agent_manager.take_pending_trigger(agent_id)
+    lock = agent_manager.try_acquire_generation_lock(agent_id)
+    assert lock.acquired
+    lock.release()
+
+
+def test_candidates_are_only_generated_for_xleap_strategies(
+    session: Session,
+) -> None:
+    agent = _create_agent(session)
+    _use_strategy(session, PromptStrategyType.MULTI_AGENT)
+    assert not idea_routes._needs_speculative_idea(agent, session)
+
+
+def test_candidate_of_a_discarded_briefing_is_rejected() -> None:
+    agent_id = uuid_pkg.uuid4()
+    # the pre-generation reads the briefing generation first
+    candidate = _candidate()
+    candidate.briefing_generation = agent_manager.briefing_generation(agent_id)
+
+    # the briefing changes while the candidate is generated
+    agent_manager.discard_speculative_idea(agent_id)
+
+    assert not agent_manager.store_speculative_idea(agent_id, candidate)
+    assert agent_manager.get_speculative_idea(agent_id) is None
+
+    candidate.briefing_generation = agent_manager.briefing_generation(agent_id)
+    assert agent_manager.store_speculative_idea(agent_id, candidate)
+    agent_manager.discard_speculative_idea(agent_id)
+
+
+def test_failed_pregeneration_answers_the_pending_trigger(
+    session: Session, monkeypatch: Any
+) -> None:
+    agent = _create_agent(session)
+    generations: list[tuple[str, bool]] = []
+
+    def fail(**kwargs: Any) -> None:
+        raise RuntimeError("no strategy")
+
+    async def generate(agent_id: str, host_id: Any, lock: Any) -> None:
+        # the lock is handed over to the generation
+        generations.append((agent_id, lock.acquired))
+        lock.release()
+
+    monkeypatch.setattr(dynamic, "engine", session.get_bind())
+    monkeypatch.setattr(dynamic, "get_prompt_strategy", fail)
+    monkeypatch.setattr(dynamic, "should_ai_post_new_idea", lambda **_: True)
+    monkeypatch.setattr(dynamic, "generate_idea_and_post", generate)
+    lock = agent_manager.try_acquire_generation_lock(agent.id)
+    # the agent is triggered while it pre-generates
+    agent_manager.add_pending_trigger(agent.id)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(dynamic.pregenerate_idea(str(agent.id), None, lock))
+
+    assert generations == [(str(agent.id), True)]
+    assert not agent_manager.take_pending_trigger(agent.id)
+    lock = agent_manager.try_acquire_generation_lock(agent.id)
+    assert lock.acquired
+    lock.release()
+
+
+def test_pregeneration_releases_the_lock_without_trigger(
+    session: Session, monkeypatch: Any
+) -> None:
+    agent = _create_agent(session)
+    _use_strategy(session, PromptStrategyType.MULTI_AGENT)
+    monkeypatch.setattr(dynamic, "engine", session.get_bind())
+    lock = agent_manager.try_acquire_generation_lock(agent.id)
+
+    asyncio.run(dynamic.pregenerate_idea(str(agent.id), None, lock))
+
+    lock = agent_manager.try_acquire_generation_lock(agent.id)
+    assert lock.acquired
+    lock.release()
@@ -0,0 +1,68 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+from langchain_core.messages import AIMessageChunk
+
+from app.utils.streaming_briefing_test_token_consumer import (
+    ContributionParser,
+    XLeapStreamingTokenizer,
+)
+
+_RESPONSE = (
+    'Sure!\n##--##\n"First idea"\n##--##\nSecond idea\n##--##\nThird idea'
+)
+
+
+def _tokens(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_contributions_are_emitted_at_their_separator() -> None:
+    parser = ContributionParser()
+    emitted = [parser.feed(token) for token in _tokens(_RESPONSE, 3)]
+
+    contributions = [c for batch in emitted for c in batch]
+    assert contributions == ["First idea", "Second idea"]
+    # the first idea is emitted by the token completing the second separator
+    first_at = next(i for i, batch in enumerate(emitted) if batch)
+    tokens = _tokens(_RESPONSE, 3)
+    assert "".join(tokens[:first_at]).count("##--##") == 1
+    assert "".join(tokens[: first_at + 1]).count("##--##") == 2
+    assert parser.finish() == "Third idea"
+
+
+def test_any_token_size_gives_the_same_contributions() -> None:
+    for size in [1, 2, 5, 7, len(_RESPONSE)]:
+        parser = ContributionParser()
+        contributions = [
+            c for token in _tokens(_RESPONSE, size) for c in parser.feed(token)
+        ]
+        contributions.append(parser.finish())
+        assert contributions == ["First idea", "Second idea", "Third idea"]
+
+
+def test_response_without_separator() -> None:
+    parser = ContributionParser()
+    assert parser.feed("no ideas") == []
+    assert parser.finish() is None
+
+
+async def _chunks(text: str) -> AsyncIterator[AIMessageChunk]:
+    for token in _tokens(text, 2):
+        await asyncio.sleep(0)
+        yield AIMessageChunk(content=token)
+
+
+def test_concurrent_streams_do_not_interleave() -> None:
+    tokenizer = XLeapStreamingTokenizer()
+    other = "##--##A\n##--##B"
+
+    async def collect(text: str) -> list[str]:
+        return [c async for c in tokenizer.gen(_chunks(text))]
+
+    async def stream_both() -> list[list[str]]:
+        return await asyncio.gather(collect(_RESPONSE), collect(other))
+
+    first, second = asyncio.run(stream_both())
+    assert first == ["First idea", "Second idea", "Third idea"]
+    assert second == ["A", "B"]
@@ -0,0 +1,96 @@
+import random
+import time
+
+import pytest
+
+from app.tests.utils.benchmarks import benchmark
+from app.utils.text_type_swapper import (
+    _NEARBY_KEYS,
+    TextTypeSwapper,
+    add_typos,
+    add_typos_to_texts,
+)
+
+
+class _ReferenceSwapper:
+    """The previous TextTypeSwapper (without printing the skipped keys)"""
+
+    def __init__(self, text, typo_prob=0.02):
+        self._message = list(text)
+        self._typo_prob = typo_prob
+        self._capitalization = [False] * len(self._message)
+        self._nearbykeys = {k: list(v) for k, v in _NEARBY_KEYS.items()}
+
+    def add_typos(self):
+        for i in range(len(self._message)):
+            self._capitalization[i] = self._message[i].isupper()
+            self._message[i] = self._message[i].lower()
+
+        n_chars_to_flip = int(len(self._message) * self._typo_prob)
+        pos_to_flip = random.sample(range(len(self._message)), n_chars_to_flip)
+
+        for pos in pos_to_flip:
+            try:
+                typo_arrays = self._nearbykeys[self._message[pos]]
+                new_char = random.choice(typo_arrays)
+                self._message[pos] = new_char
+            except Exception:
+                continue
+
+        for i in range(len(self._message)):
+            if self._capitalization[i]:
+                self._message[i] = self._message[i].upper()
+
+        return self
+
+    def get_text(self):
+        return "".join(self._message)
+
+
+_CONTRIBUTION = (
+    "Die Stadt Könnte Fahrradstationen an allen Bahnhöfen bauen, "
+    "damit Pendler: ohne Auto zur Arbeit kommen. It's CHEAP. "
+)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_typos_match_the_reference(seed: int) -> None:
+    """the same seed gives the same typos as the previous swapper"""
+    text = _CONTRIBUTION * (seed + 1)
+    random.seed(seed)
+    expected = _ReferenceSwapper(text, typo_prob=0.1).add_typos().get_text()
+
+    assert add_typos(text, 0.1, random.Random(seed)) == expected
+    swapper = TextTypeSwapper(text, typo_prob=0.1, rng=random.Random(seed))
+    assert swapper.add_typos().get_text() == expected
+
+
+def test_batch_is_reproducible() -> None:
+    texts = [_CONTRIBUTION * n for n in range(1, 6)]
+    first = add_typos_to_texts(texts, 0.05, random.Random(1))
+    second = add_typos_to_texts(texts, 0.05, random.Random(1))
+
+    assert first == second
+    assert len(first) == len(texts)
+    assert first != texts
+
+
+def test_text_without_nearby_keys_is_unchanged() -> None:
+    assert add_typos("1234 5678 ?!", typo_prob=1.0) == "1234 5678 ?!"
+    assert add_typos("", typo_prob=1.0) == ""
+
+
+@benchmark
+def test_benchmark_long_contributions() -> None:
+    texts = [_CONTRIBUTION * 40] * 50
+
+    started = time.perf_counter()
+    for text in texts:
+        _ReferenceSwapper(text, typo_prob=0.01).add_typos().get_text()
+    reference_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    add_typos_to_texts(texts, typo_prob=0.01, rng=random.Random(0))
+    elapsed = time.perf_counter() - started
+
+    assert elapsed * 3 < reference_elapsed
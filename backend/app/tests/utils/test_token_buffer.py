@@ -0,0 +1,183 @@
+import random
+import time
+
+import pytest
+
+from app.tests.utils.benchmarks import benchmark
+from app.utils.token_buffer import TokenBuffer
+
+
+class _ReferenceBuffer:
+    """The previous TokenBuffer (with its buffer per instance)"""
+
+    def __init__(self):
+        self._buffer: list[str] = []
+
+    def append(self, token: str):
+        self._buffer.extend(token)
+
+    def index(self, search: str, start: int = 0) -> int:
+        search_length = len(search)
+        buff = self._buffer
+        buff_length = len(buff)
+        if search_length > buff_length or start > buff_length:
+            return -1
+        buffer_index = -1 + start
+        while True:
+            buffer_index += 1
+            if buffer_index >= buff_length:
+                return -1
+
+            try:
+                idx = self._buffer.index(search[0], buffer_index)
+            except ValueError:
+                return -1
+
+            if search_length + idx > buff_length:
+                return -1
+            search_index = 0
+            while (
+                search_index + 1 < search_length
+                and idx + 1 + search_index < buff_length
+            ):
+                search_index += 1
+                if buff[idx + search_index] != search[search_index]:
+                    break
+            if (
+                search_index == search_length - 1
+                and buff[idx + search_index] == search[search_index]
+            ):
+                return idx
+
+    def length(self) -> int:
+        return len(self._buffer)
+
+    def substring(self, start: int, end: int) -> str:
+        return "".join(self._buffer[start:end])
+
+    def delete(self, start: int, end: int):
+        del self._buffer[start:end]
+
+
+_ALPHABET = "ab#-\n"
+_SEARCHES = ["#", "##", "##--##", "\n##--##", "a#", "b"]
+
+
+def _random_token(rng: random.Random) -> str:
+    return "".join(rng.choices(_ALPHABET, k=rng.randint(0, 6)))
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_behaves_like_the_reference(seed: int) -> None:
+    """random sequences of operations return the same results"""
+    rng = random.Random(seed)
+    buffer, reference = TokenBuffer(), _ReferenceBuffer()
+
+    for _ in range(300):
+        operation = rng.random()
+        if operation < 0.5:
+            token = _random_token(rng)
+            buffer.append(token)
+            reference.append(token)
+        elif operation < 0.85:
+            search = rng.choice(_SEARCHES)
+            start = rng.randint(0, reference.length() + 1)
+            assert buffer.index(search, start) == reference.index(
+                search, start
+            )
+        else:
+            start = rng.randint(0, reference.length())
+            # mostly delete the start, like the tokenizer
+            if rng.random() < 0.5:
+                start = 0
+            end = rng.randint(start, reference.length())
+            buffer.delete(start, end)
+            reference.delete(start, end)
+
+        assert buffer.length() == reference.length()
+        assert buffer.substring(0, buffer.length()) == reference.substring(
+            0, reference.length()
+        )
+
+
+def test_instances_do_not_share_their_tokens() -> None:
+    first, second = TokenBuffer(), TokenBuffer()
+    first.append("abc")
+    assert second.length() == 0
+
+
+def test_search_resumes_across_tokens() -> None:
+    buffer = TokenBuffer()
+    for token in ["idea one\n#", "#-", "-##", " idea two"]:
+        buffer.append(token)
+    assert buffer.index("\n##--##") == 8
+
+    buffer.delete(0, 8)
+    assert buffer.index("\n##--##") == 0
+    assert buffer.index("\n##--##", 1) == -1
+
+
+def _stream(tokens: int) -> list[str]:
+    rng = random.Random(tokens)
+    stream = ["##--##"]
+    for i in range(tokens):
+        stream.append(rng.choice([" an", " idea", " with", " words"]))
+        if i % 50 == 49:
+            stream.append("\n##--##")
+    return stream
+
+
+class _CountingBuffer(TokenBuffer):
+    """counts the characters the searches copy from the buffer"""
+
+    def __init__(self):
+        super().__init__()
+        self.copied = 0
+
+    def substring(self, start: int, end: int) -> str:
+        self.copied += max(0, end - start)
+        return super().substring(start, end)
+
+
+def _consume(stream: list[str], buffer: TokenBuffer | None = None) -> int:
+    """extracts the ideas like the streaming tokenizer"""
+    if buffer is None:
+        buffer = TokenBuffer()
+    ideas = 0
+    for token in stream:
+        buffer.append(token)
+        start = buffer.index("##--##")
+        end = buffer.index("\n##--##", start + 6)
+        if start >= 0 and end >= 0:
+            buffer.delete(start, end)
+            ideas += 1
+    return ideas
+
+
+def test_stream_is_consumed_in_linear_operations() -> None:
+    copied = []
+    for tokens in [10_000, 20_000]:
+        stream = _stream(tokens)
+        buffer = _CountingBuffer()
+        assert _consume(stream, buffer) == tokens // 50
+        # every character is scanned by the two searches (and their overlap
+        # with the previous token), not again after each token
+        assert buffer.copied < 3 * sum(len(token) for token in stream)
+        copied.append(buffer.copied)
+    # linear: a stream twice as long copies about twice as much
+    assert copied[1] < copied[0] * 2.2
+
+
+@benchmark
+def test_benchmark_10k_token_stream() -> None:
+    started = time.perf_counter()
+    assert _consume(_stream(10_000)) == 200
+    elapsed = time.perf_counter() - started
+
+    # linear: a stream twice as long takes about twice as long
+    started = time.perf_counter()
+    _consume(_stream(20_000))
+    elapsed_twice = time.perf_counter() - started
+
+    assert elapsed < 1.0
+    assert elapsed_twice < elapsed * 4
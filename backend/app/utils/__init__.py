@@ -1,5 +1,13 @@
-from .text_type_swapper import TextTypeSwapper  # isort: skip  # noqa
-from .agent_manager import AgentGenerationLock, agent_manager
+from .text_type_swapper import (  # isort: skip  # noqa
+    TextTypeSwapper,
+    add_typos,
+    add_typos_to_texts,
+)
+from .agent_manager import (
+    AgentGenerationLock,
+    SpeculativeIdea,
+    agent_manager,
+)
 from .agents import check_agent_exists_by_instance_id, get_agent_by_id
 from .api_keys import is_api_key_valid
 from .briefings import (
@@ -9,6 +17,8 @@ from .briefings import (
     get_briefing_by_agent_id,
     langfuse_base_from_briefing_base,
     langfuse_base_from_briefing_reference_base,
+    langfuse_bases_from_briefing_reference_bases,
+    prompt_name_resolver,
 )
 from .ideas import (
     check_if_idea_exists,
@@ -17,11 +27,14 @@ from .ideas import (
     get_human_ideas_since,
     get_last_ai_idea,
     get_last_n_ideas,
+    is_speculative_idea_stale,
     should_ai_post_new_idea,
 )
 from .prompts import get_prompt_strategy
 
 __all__ = [
+    "add_typos",
+    "add_typos_to_texts",
     "agent_manager",
     "AgentGenerationLock",
     "check_agent_exists_by_instance_id",
@@ -38,8 +51,12 @@ __all__ = [
     "get_human_ideas_since",
     "delete_idea_by_agent_and_id",
     "is_api_key_valid",
+    "is_speculative_idea_stale",
     "langfuse_base_from_briefing_base",
     "langfuse_base_from_briefing_reference_base",
+    "langfuse_bases_from_briefing_reference_bases",
+    "prompt_name_resolver",
     "should_ai_post_new_idea",
+    "SpeculativeIdea",
     "TextTypeSwapper",
 ]
@@ -10,6 +10,22 @@ class AgentContext:
         self.last_idea = idea
 
 
+class SpeculativeIdea:
+    """A candidate idea which was generated ahead of time for an agent
+    and is waiting to be posted when the agent is triggered next
+    """
+
+    def __init__(
+        self, text: str, last_idea_count: int, briefing_generation: int = 0
+    ):
+        self.text = text
+        # the highest idea count of the ideas the candidate was generated from
+        self.last_idea_count = last_idea_count
+        # the briefing generation of the agent the candidate was generated for
+        self.briefing_generation = briefing_generation
+        self.created_at = datetime.now(UTC)
+
+
 class AgentGenerationLock:
     """Represents the result of a AgentManager.try_acquire_generation_lock method
     You must check 'lock.acquired' before you enter the code which requires the lock
@@ -87,6 +103,12 @@ class AgentManager:
     """ the last time the _generation_lock for an agent was returned """
     _generation_context: dict[uuid_pkg.uuid4, AgentContext] = {}
     """ map from Agent uuid to lock to the last uuid the agent contribution was triggered for """
+    _speculative_ideas: dict[uuid_pkg.uuid4, SpeculativeIdea] = {}
+    """ map from Agent uuid to the candidate idea pre-generated for that agent """
+    _pending_triggers: set[uuid_pkg.uuid4] = set()
+    """ agents which were triggered while their generation lock was held """
+    _briefing_generations: dict[uuid_pkg.uuid4, int] = {}
+    """ map from Agent uuid to the number of times its candidate idea was discarded """
 
     _internalLock = threading.Lock()
 
@@ -195,6 +217,66 @@ class AgentManager:
 
             lock.release()
 
+    def briefing_generation(self, agent_id: uuid_pkg.uuid4) -> int:
+        """returns the briefing generation of an agent, a candidate idea must be
+        stamped with it before the briefing is read
+        """
+        with self._internalLock:
+            return self._briefing_generations.get(agent_id, 0)
+
+    def store_speculative_idea(
+        self, agent_id: uuid_pkg.uuid4, candidate: SpeculativeIdea
+    ) -> bool:
+        """stores (or replaces) the pre-generated candidate idea of an agent
+        :returns False if the candidate was rejected because it was generated
+        from a briefing which was discarded in the meantime
+        """
+        with self._internalLock:
+            generation = self._briefing_generations.get(agent_id, 0)
+            if candidate.briefing_generation != generation:
+                return False
+            self._speculative_ideas[agent_id] = candidate
+            return True
+
+    def take_speculative_idea(
+        self, agent_id: uuid_pkg.uuid4
+    ) -> SpeculativeIdea | None:
+        """removes and returns the pre-generated candidate idea of an agent
+        :returns the candidate or None if there is no candidate
+        """
+        with self._internalLock:
+            return self._speculative_ideas.pop(agent_id, None)
+
+    def get_speculative_idea(
+        self, agent_id: uuid_pkg.uuid4
+    ) -> SpeculativeIdea | None:
+        """returns the pre-generated candidate idea of an agent without removing it"""
+        with self._internalLock:
+            return self._speculative_ideas.get(agent_id)
+
+    def discard_speculative_idea(self, agent_id: uuid_pkg.uuid4):
+        """discards the candidate idea of an agent, e.g. when its briefing changed
+        A candidate which is still being generated is rejected when it is stored.
+        """
+        with self._internalLock:
+            self._speculative_ideas.pop(agent_id, None)
+            self._briefing_generations[agent_id] = (
+                self._briefing_generations.get(agent_id, 0) + 1
+            )
+
+    def add_pending_trigger(self, agent_id: uuid_pkg.uuid4):
+        """remembers that an agent was triggered while its generation lock was held"""
+        with self._internalLock:
+            self._pending_triggers.add(agent_id)
+
+    def take_pending_trigger(self, agent_id: uuid_pkg.uuid4) -> bool:
+        """returns True (once) if the agent was triggered while its generation lock was held"""
+        with self._internalLock:
+            if agent_id in self._pending_triggers:
+                self._pending_triggers.remove(agent_id)
+                return True
+            return False
+
     def last_generation_completed(self, agent_id: uuid_pkg.uuid4):
         """returns the last time an agent completed a task or None if the agent
         has not completed a task yet
@@ -1,8 +1,8 @@
+import asyncio
 import logging
 import threading
 
 from fastapi import HTTPException
-from langchain_openai import ChatOpenAI
 from langfuse.api.resources.commons.errors import (
     NotFoundError as PromptNotFoundError,
 )
@@ -17,8 +17,13 @@ from openai import (
 )
 from starlette import status
 
-from app.core.config import settings
-from app.orchestration.prompts import langfuse_client, langfuse_handler
+from app.orchestration.llm import JobType, create_chat_model
+from app.orchestration.prompts import (
+    get_langfuse_client,
+    prompt_cache,
+    prompt_store,
+    tracer,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -27,7 +32,7 @@ logging.basicConfig(
 )
 
 
-def _get_or_create_api_key_validation_prompt_under_lock():
+async def _get_or_create_api_key_validation_prompt_under_lock():
     """returns the API validation prompt
     If the prompt is not present it will be created.
     This method acquires lock
@@ -35,25 +40,35 @@ def _get_or_create_api_key_validation_prompt_under_lock():
     lock = threading.Lock()
     lock.acquire()
     try:
-        return langfuse_client.get_prompt(
+        return await prompt_cache.get(
             "API_KEY_VALIDATION"
         )  # check again if the prompt exists
     except PromptNotFoundError:  # otherwise created
-        return langfuse_client.create_prompt(
+        created_prompt = await asyncio.to_thread(
+            get_langfuse_client().create_prompt,
             name="API_KEY_VALIDATION",
             prompt='Are you currently accepting any prompts? Answer with "YES"',
             is_active=True,
         )
+        await asyncio.to_thread(
+            prompt_store.save,
+            "API_KEY_VALIDATION",
+            created_prompt.version,
+            created_prompt.prompt,
+        )
+        return prompt_cache.put(
+            "API_KEY_VALIDATION", None, created_prompt.prompt
+        )
     finally:
         lock.release()
 
 
-def _get_api_key_validation_prompt():
-    """returns the API validation prompt
+async def _get_api_key_validation_prompt():
+    """returns the API validation prompt (cached)
     If the prompt is not present it will be created
     """
     try:
-        return langfuse_client.get_prompt("API_KEY_VALIDATION")
+        return await prompt_cache.get("API_KEY_VALIDATION")
     except PromptAuthenticationError:
         logging.error("Internal Error: Got Unauthorized from Langfuse")
         raise HTTPException(
@@ -61,11 +76,14 @@ def _get_api_key_validation_prompt():
             detail="Langfuse authentication error",
         )
     except PromptNotFoundError:
-        return _get_or_create_api_key_validation_prompt_under_lock()
+        return await _get_or_create_api_key_validation_prompt_under_lock()
 
 
 async def is_api_key_valid(
-    api_key: str, org_id: str | None, llm_model: str = "gpt-3.5-turbo"
+    api_key: str,
+    org_id: str | None,
+    llm_model: str = "gpt-3.5-turbo",
+    api_url: str | None = None,
 ) -> None:
     """Validates API Key asynchronously.
 
@@ -74,6 +92,8 @@ async def is_api_key_valid(
         org_id: (str|None): OpenAI organization ID.
         llm_model: (str): OpenAI language model. Defaults to
             "gpt-3.5-turbo-instruct".
+        api_url: (str|None): URL of an OpenAI compatible API. Defaults to
+            OpenAI.
 
     Raises:
         HTTPException - 401: If the API key is invalid.
@@ -85,7 +105,7 @@ async def is_api_key_valid(
     """
 
     try:
-        langfuse_prompt_obj = _get_api_key_validation_prompt()
+        langfuse_prompt_obj = await _get_api_key_validation_prompt()
     except PromptAuthenticationError:
         logging.error("Internal Error: Got Unauthorized from Langfuse")
         raise HTTPException(
@@ -99,23 +119,20 @@ async def is_api_key_valid(
         )
 
     try:
-        if org_id:
-            llm = ChatOpenAI(
-                openai_api_key=api_key,  # type: ignore
-                openai_organization=org_id,
-                model_name=llm_model,
-                openai_proxy=settings.HTTP_PROXY,
-            )
-        else:
-            llm = ChatOpenAI(
-                openai_api_key=api_key,  # type: ignore
-                model_name=llm_model,
-                openai_proxy=settings.HTTP_PROXY,
-            )
-
-        llm.invoke(
+        llm = create_chat_model(
+            api_key=api_key,
+            organization=org_id or None,
+            base_url=api_url,
+            model=llm_model,
+        )
+
+        await llm.ainvoke(
             langfuse_prompt_obj.prompt,
-            config={"callbacks": [langfuse_handler]},
+            config={
+                "callbacks": tracer.start_trace(
+                    "validate_api_key", job_type=JobType.ON_DEMAND
+                ).get_callbacks()
+            },
         )
 
     except AuthenticationError:
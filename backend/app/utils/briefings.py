@@ -1,10 +1,19 @@
+import hashlib
 import logging
-from collections.abc import Sequence
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, NamedTuple
 
 from fastapi import HTTPException
+from langfuse import Langfuse
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
+from app.core.config import settings
 from app.models import (
     AIBriefing2Base,
     AIBriefing2LangfuseBase,
@@ -16,9 +25,10 @@ from app.models import (
     BriefingCategory,
     BriefingSubCategory,
     BriefingSubCategoryDifferentiator,
+    LangfusePrompt,
     XLeapBriefingPrompt,
 )
-from app.orchestration.prompts import langfuse_client
+from app.orchestration.prompts import get_langfuse_client
 
 
 def get_briefing_by_agent_id(agent_id: str, session: Session) -> Briefing:
@@ -122,23 +132,220 @@ def get_briefing2_references_by_agent(
     return session.exec(query).all()
 
 
-def _create_xleap_prompt(
-    *,
-    session: Session,
-    cat: BriefingCategory,
-    db_sub_cat: str,
-    template: str,
-    langfuse_prompt: str,
-) -> None:
-    db_prompt = XLeapBriefingPrompt(
-        category=cat,
-        sub_category=db_sub_cat,
-        template=template,
-        langfuse_prompt=langfuse_prompt,
+def get_template_digest(template: str) -> str:
+    """
+    returns the SHA-256 digest (hex) of a template, templates are looked up by
+    their digest
+    """
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+class _PromptSpec(NamedTuple):
+    """An XLeap template and the usage it is resolved for"""
+
+    cat: BriefingCategory
+    sub_category: BriefingSubCategory
+    template: str
+    ref_number: int = 0
+    """ required for references """
+    differentiator: BriefingSubCategoryDifferentiator = (
+        BriefingSubCategoryDifferentiator.NONE
     )
-    session.add(db_prompt)
-    session.commit()
-    session.refresh(db_prompt)
+    """ default NONE="", used TASK_TEMPLATES """
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        """the primary key (category, sub_category, template_digest) of the
+        XLeapBriefingPrompt"""
+        db_sub_cat = self.sub_category + self.differentiator
+        if self.ref_number > 0:
+            db_sub_cat = db_sub_cat + "@" + str(self.ref_number)
+        return str(self.cat), db_sub_cat, get_template_digest(self.template)
+
+    def new_prompt_name(self) -> str:
+        """returns the name for a new prompt in Langfuse"""
+        cat = self.cat
+        sub_category = self.sub_category
+        differentiator = self.differentiator
+        ref_number = self.ref_number
+        date_str = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
+
+        if BriefingSubCategory.NONE == sub_category:
+            if ref_number == 0:
+                return f"xleap-{cat}-{date_str}"
+            return f"xleap-{cat}-{ref_number}-{date_str}"
+        if ref_number == 0:
+            return f"xleap-{cat}-{sub_category}{differentiator}-{date_str}"
+        return f"xleap-{cat}-{sub_category}{differentiator}-{ref_number}-{date_str}"
+
+
+class LangfusePromptNameResolver:
+    """
+    Resolves XLeap templates to the names of their prompts in Langfuse.
+    All templates of a briefing are looked up with one query, the missing
+    prompts are created in Langfuse concurrently and stored in one transaction.
+    The prompt of a template never changes, hence the names are kept in an LRU
+    cache and repeated briefings do not query the database at all.
+    """
+
+    def __init__(
+        self,
+        client: Langfuse | None = None,
+        max_size: int = settings.BRIEFING_PROMPT_CACHE_SIZE,
+    ):
+        # None: the Langfuse client of the service
+        self._client = client
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._names: OrderedDict[tuple[str, str, str], str] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._created = 0
+
+    def resolve(
+        self, session: Session, specs: Iterable[_PromptSpec]
+    ) -> dict[tuple[str, str, str], str]:
+        """
+        Resolves the templates, creates the prompts which do not exist yet
+        :param session: the SQL session
+        :param specs: the templates and their usage
+        :return: the names of the prompts in Langfuse by _PromptSpec.key
+        """
+        specs_by_key = {spec.key: spec for spec in specs}
+        names: dict[tuple[str, str, str], str] = {}
+        with self._lock:
+            for key in specs_by_key:
+                name = self._names.get(key)
+                if name is not None:
+                    self._names.move_to_end(key)
+                    names[key] = name
+            self._hits += len(names)
+            self._misses += len(specs_by_key) - len(names)
+
+        missing = [key for key in specs_by_key if key not in names]
+        if not missing:
+            return names
+
+        found = self._load(session, missing)
+        to_create = [specs_by_key[key] for key in missing if key not in found]
+        if to_create:
+            found.update(self._create(session, to_create))
+
+        with self._lock:
+            for key, name in found.items():
+                self._names[key] = name
+                self._names.move_to_end(key)
+            while len(self._names) > self._max_size:
+                self._names.popitem(last=False)
+
+        names.update(found)
+        return names
+
+    @staticmethod
+    def _load(
+        session: Session, keys: list[tuple[str, str, str]]
+    ) -> dict[tuple[str, str, str], str]:
+        query = select(XLeapBriefingPrompt).where(
+            tuple_(
+                XLeapBriefingPrompt.category,
+                XLeapBriefingPrompt.sub_category,
+                XLeapBriefingPrompt.template_digest,
+            ).in_(keys)
+        )
+        return {
+            (prompt.category, prompt.sub_category, prompt.template_digest): (
+                prompt.langfuse_prompt
+            )
+            for prompt in session.exec(query)
+        }
+
+    def _create_prompt(self, spec: _PromptSpec) -> str:
+        name = spec.new_prompt_name()
+        client = self._client or get_langfuse_client()
+        langfuse_prompt = client.create_prompt(
+            name=name, prompt=spec.template, is_active=True
+        )
+        logging.info(f"new prompt name is: {name}")
+        return langfuse_prompt.name
+
+    def _create(
+        self, session: Session, specs: list[_PromptSpec]
+    ) -> dict[tuple[str, str, str], str]:
+        workers = max(1, min(len(specs), settings.PROMPT_FETCH_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            created = dict(
+                zip(
+                    [spec.key for spec in specs],
+                    executor.map(self._create_prompt, specs),
+                    strict=True,
+                )
+            )
+        self._created += len(created)
+
+        try:
+            self._store(session, specs, created)
+        except IntegrityError:
+            # another request stored (some of) the templates meanwhile, their
+            # prompts are used and the remaining ones are stored again
+            session.rollback()
+            stored = self._load(session, list(created))
+            self._store(
+                session,
+                specs,
+                {
+                    key: name
+                    for key, name in created.items()
+                    if key not in stored
+                },
+            )
+            created.update(stored)
+        return created
+
+    @staticmethod
+    def _store(
+        session: Session,
+        specs: list[_PromptSpec],
+        names: dict[tuple[str, str, str], str],
+    ):
+        templates = {spec.key: spec.template for spec in specs}
+        # the rows are inserted together on commit
+        with session.no_autoflush:
+            for (cat, db_sub_cat, digest), name in names.items():
+                session.add(
+                    XLeapBriefingPrompt(
+                        category=cat,
+                        sub_category=db_sub_cat,
+                        template=templates[(cat, db_sub_cat, digest)],
+                        template_digest=digest,
+                        langfuse_prompt=name,
+                    )
+                )
+                # the prompt store, its version is added by the next sync.
+                # Prompt names have a resolution of seconds, a concurrent
+                # request may have stored a prompt of the same name
+                session.merge(
+                    LangfusePrompt(
+                        name=name,
+                        prompt=templates[(cat, db_sub_cat, digest)],
+                    )
+                )
+        session.commit()
+
+    def clear(self):
+        with self._lock:
+            self._names.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._names),
+                "hits": self._hits,
+                "misses": self._misses,
+                "created": self._created,
+            }
+
+
+prompt_name_resolver = LangfusePromptNameResolver()
 
 
 def _workspace_name_2_sub_category(name: str) -> BriefingSubCategory:
@@ -163,81 +370,13 @@ def _workspace_name_2_sub_category(name: str) -> BriefingSubCategory:
     raise ValueError(f"Unhandled workspace name: '{name}'")
 
 
-def _get_langfuse_prompt_name(
-    *,
-    session: Session,
-    cat: BriefingCategory,
-    sub_category: BriefingSubCategory,
-    template: str,
-    ref_number: int = 0,
-    differentiator: BriefingSubCategoryDifferentiator = BriefingSubCategoryDifferentiator.NONE,
-) -> str:
+def _get_briefing_prompt_specs(
+    briefing_base: AIBriefing2Base,
+) -> dict[str, _PromptSpec]:
     """
-    Gets the name of a Prompt from an XLeap template string
-    :param session: the SQL session
-    :param cat: the category for the prompt
-    :param sub_category:  the sub category of the prompt
-    :param template: the language template
-    :param ref_number: required for references
-    :param differentiator: default NONE="", used TASK_TEMPLATES
-    :return: the name of the corresponding prompt in Langfuse
+    returns the templates of a briefing by the field of AIBriefing2LangfuseBase
+    they are resolved for
     """
-    db_sub_cat = sub_category + differentiator
-    if ref_number > 0:
-        db_sub_cat = db_sub_cat + "@" + str(ref_number)
-    query = select(XLeapBriefingPrompt).where(
-        XLeapBriefingPrompt.category == cat,
-        XLeapBriefingPrompt.sub_category == db_sub_cat,
-        XLeapBriefingPrompt.template == template,
-    )
-    briefing_prompt = session.exec(query).first()
-
-    if briefing_prompt is not None:
-        return briefing_prompt.langfuse_prompt
-
-    date_str = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
-
-    if BriefingSubCategory.NONE == sub_category:
-        if ref_number == 0:
-            name = f"xleap-{cat}-{date_str}"
-        else:
-            name = f"xleap-{cat}-{ref_number}-{date_str}"
-    elif ref_number == 0:
-        name = f"xleap-{cat}-{sub_category}{differentiator}-{date_str}"
-    else:
-        name = f"xleap-{cat}-{sub_category}{differentiator}-{ref_number}-{date_str}"
-
-    langfuse_prompt = langfuse_client.create_prompt(
-        name=name, prompt=template, is_active=True
-    )
-
-    logging.info(f"new prompt name is: {name}")
-
-    _create_xleap_prompt(
-        session=session,
-        cat=cat,
-        db_sub_cat=db_sub_cat,
-        template=template,
-        langfuse_prompt=langfuse_prompt.name,
-    )
-
-    return langfuse_prompt.name
-
-
-def langfuse_base_from_briefing_base(
-    session: Session, briefing_base: AIBriefing2Base
-) -> AIBriefing2LangfuseBase:
-    """Converts templates from AIBriefing2Base to prompts in Langfuse and returns an object
-       with all Langfuse prompt names that are used in the briefing
-
-    Args:
-        session (Session): Database session
-        briefing_base (AIBriefing2Base): The briefing data
-
-    Returns:
-        AIBriefing2LangfuseBase: the result of the conversion
-    """
-    langfuse_base: AIBriefing2LangfuseBase = AIBriefing2LangfuseBase()
     sub_category = BriefingSubCategory.MEDIUM
     if briefing_base.response_length == 1:
         sub_category = BriefingSubCategory.BRIEF
@@ -248,179 +387,222 @@ def langfuse_base_from_briefing_base(
         briefing_base.workspace_type
     )
 
-    langfuse_base.response_length_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.RESPONSE_LENGTH,
-        sub_category=sub_category,
-        template=briefing_base.response_length_template,
-    )
-
-    langfuse_base.response_language_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.RESPONSE_LANGUAGE,
-        sub_category=BriefingSubCategory.NONE,
-        template=briefing_base.response_language_template,
-    )
-
-    langfuse_base.context_intro_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.CONTEXT_INTRO,
-        sub_category=workspace_sub_category,
-        template=briefing_base.context_intro_template,
-    )
+    specs = {
+        "response_length_langfuse_name": _PromptSpec(
+            cat=BriefingCategory.RESPONSE_LENGTH,
+            sub_category=sub_category,
+            template=briefing_base.response_length_template,
+        ),
+        "response_language_langfuse_name": _PromptSpec(
+            cat=BriefingCategory.RESPONSE_LANGUAGE,
+            sub_category=BriefingSubCategory.NONE,
+            template=briefing_base.response_language_template,
+        ),
+        "context_intro_langfuse_name": _PromptSpec(
+            cat=BriefingCategory.CONTEXT_INTRO,
+            sub_category=workspace_sub_category,
+            template=briefing_base.context_intro_template,
+        ),
+    }
 
     if briefing_base.with_additional_info:
-        langfuse_base.additional_info_langfuse_name = (
-            _get_langfuse_prompt_name(
-                session=session,
-                cat=BriefingCategory.ADDITIONAL_INFO,
-                sub_category=BriefingSubCategory.NONE,
-                template=briefing_base.additional_info_template,
-            )
+        specs["additional_info_langfuse_name"] = _PromptSpec(
+            cat=BriefingCategory.ADDITIONAL_INFO,
+            sub_category=BriefingSubCategory.NONE,
+            template=briefing_base.additional_info_template,
         )
 
     if briefing_base.with_persona:
-        langfuse_base.persona_langfuse_name = _get_langfuse_prompt_name(
-            session=session,
+        specs["persona_langfuse_name"] = _PromptSpec(
             cat=BriefingCategory.PERSONA,
             sub_category=BriefingSubCategory.NONE,
             template=briefing_base.persona_template,
         )
 
     if briefing_base.with_tone:
-        langfuse_base.tone_langfuse_name = _get_langfuse_prompt_name(
-            session=session,
+        specs["tone_langfuse_name"] = _PromptSpec(
             cat=BriefingCategory.TONE,
             sub_category=BriefingSubCategory.NONE,
             template=briefing_base.tone_template,
         )
 
     if briefing_base.with_host_info:
-        langfuse_base.host_info_langfuse_name = _get_langfuse_prompt_name(
-            session=session,
+        specs["host_info_langfuse_name"] = _PromptSpec(
             cat=BriefingCategory.HOST_INFO,
             sub_category=workspace_sub_category,
             template=briefing_base.host_info_template,
         )
 
     if briefing_base.with_participant_info:
-        langfuse_base.participant_info_langfuse_name = (
-            _get_langfuse_prompt_name(
-                session=session,
-                cat=BriefingCategory.PARTICIPANT_INFO,
-                sub_category=BriefingSubCategory.NONE,
-                template=briefing_base.participant_info_template,
-            )
+        specs["participant_info_langfuse_name"] = _PromptSpec(
+            cat=BriefingCategory.PARTICIPANT_INFO,
+            sub_category=BriefingSubCategory.NONE,
+            template=briefing_base.participant_info_template,
         )
 
     if briefing_base.with_session_info:
-        langfuse_base.session_info_langfuse_name = _get_langfuse_prompt_name(
-            session=session,
+        specs["session_info_langfuse_name"] = _PromptSpec(
             cat=BriefingCategory.SESSION_INFO,
             sub_category=workspace_sub_category,
             template=briefing_base.session_info_template,
         )
 
     if briefing_base.with_workspace_info:
-        langfuse_base.workspace_info_langfuse_name = _get_langfuse_prompt_name(
-            session=session,
+        specs["workspace_info_langfuse_name"] = _PromptSpec(
             cat=BriefingCategory.WORKSPACE_PURPOSE_INFO,
             sub_category=workspace_sub_category,
             template=briefing_base.workspace_info_template,
         )
 
     if briefing_base.with_workspace_instruction:
-        langfuse_base.workspace_instruction_langfuse_name = (
-            _get_langfuse_prompt_name(
-                session=session,
-                cat=BriefingCategory.WORKSPACE_INSTRUCTION,
-                sub_category=workspace_sub_category,
-                template=briefing_base.workspace_instruction_template,
-            )
+        specs["workspace_instruction_langfuse_name"] = _PromptSpec(
+            cat=BriefingCategory.WORKSPACE_INSTRUCTION,
+            sub_category=workspace_sub_category,
+            template=briefing_base.workspace_instruction_template,
         )
 
     if briefing_base.with_num_exemplar > 0:
-        langfuse_base.exemplar_langfuse_name = _get_langfuse_prompt_name(
-            session=session,
+        specs["exemplar_langfuse_name"] = _PromptSpec(
             cat=BriefingCategory.EXEMPLAR,
             sub_category=workspace_sub_category,
             template=briefing_base.exemplar_template,
         )
 
-    langfuse_base.task_nn_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.task_template_nn,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_ONE_NN,
-    )
+    task_templates = {
+        "task_nn_langfuse_name": (
+            briefing_base.task_template_nn,
+            BriefingSubCategoryDifferentiator.TASK_ONE_NN,
+        ),
+        "task_pn_langfuse_name": (
+            briefing_base.task_template_pn,
+            BriefingSubCategoryDifferentiator.TASK_ONE_PN,
+        ),
+        "task_na_langfuse_name": (
+            briefing_base.task_template_na,
+            BriefingSubCategoryDifferentiator.TASK_ONE_NA,
+        ),
+        "task_pa_langfuse_name": (
+            briefing_base.task_template_pn,
+            BriefingSubCategoryDifferentiator.TASK_ONE_PA,
+        ),
+        "task_multi_nn_langfuse_name": (
+            briefing_base.task_template_multi_nn,
+            BriefingSubCategoryDifferentiator.TASK_MULTI_NN,
+        ),
+        "task_multi_pn_langfuse_name": (
+            briefing_base.task_template_multi_pn,
+            BriefingSubCategoryDifferentiator.TASK_MULTI_PN,
+        ),
+        "task_multi_na_langfuse_name": (
+            briefing_base.task_template_multi_na,
+            BriefingSubCategoryDifferentiator.TASK_MULTI_NA,
+        ),
+        "task_multi_pa_langfuse_name": (
+            briefing_base.task_template_multi_pa,
+            BriefingSubCategoryDifferentiator.TASK_MULTI_PA,
+        ),
+    }
+    for field, (template, differentiator) in task_templates.items():
+        specs[field] = _PromptSpec(
+            cat=BriefingCategory.TASK_TEMPLATE,
+            sub_category=workspace_sub_category,
+            template=template,
+            differentiator=differentiator,
+        )
 
-    langfuse_base.task_pn_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
+    specs["test_briefing_langfuse_name"] = _PromptSpec(
+        cat=BriefingCategory.TEST_BRIEFING_TEMPLATE,
         sub_category=workspace_sub_category,
-        template=briefing_base.task_template_pn,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_ONE_PN,
+        template=briefing_base.test_briefing_template,
     )
+    return specs
 
-    langfuse_base.task_na_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.task_template_na,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_ONE_NA,
-    )
 
-    langfuse_base.task_pa_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.task_template_pn,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_ONE_PA,
-    )
+def _get_reference_prompt_spec(
+    briefing_ref_base: AIBriefing2ReferenceBase,
+) -> _PromptSpec:
+    """returns the template of a reference"""
+    match briefing_ref_base.type:
+        case "link":
+            cat = BriefingCategory.LINK
+            sub_category = BriefingSubCategory.NONE
+        case "file":
+            cat = BriefingCategory.FILE
+            sub_category = BriefingSubCategory.NONE
+        case "xleap":
+            cat = BriefingCategory.WORKSPACE_CONTENT
+            sub_category = _workspace_name_2_sub_category(
+                briefing_ref_base.workspace_type
+            )
+        case "exemplar":
+            cat = BriefingCategory.EXEMPLAR
+            sub_category = BriefingSubCategory.EXEMPLAR
+        case _:
+            raise ValueError(
+                f"Unhandled reference type: '{briefing_ref_base.type}'"
+            )
 
-    langfuse_base.task_multi_nn_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.task_template_multi_nn,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_MULTI_NN,
+    return _PromptSpec(
+        cat=cat,
+        sub_category=sub_category,
+        template=briefing_ref_base.template,
+        ref_number=briefing_ref_base.ref_number,
     )
 
-    langfuse_base.task_multi_pn_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.task_template_multi_pn,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_MULTI_PN,
-    )
 
-    langfuse_base.task_multi_na_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.task_template_multi_na,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_MULTI_NA,
-    )
+def langfuse_base_from_briefing_base(
+    session: Session, briefing_base: AIBriefing2Base
+) -> AIBriefing2LangfuseBase:
+    """Converts templates from AIBriefing2Base to prompts in Langfuse and returns an object
+       with all Langfuse prompt names that are used in the briefing.
+       The templates of the references of the briefing are resolved in the same
+       batch, hence converting the references afterwards does not query the database.
 
-    langfuse_base.task_multi_pa_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TASK_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.task_template_multi_pa,
-        differentiator=BriefingSubCategoryDifferentiator.TASK_MULTI_PA,
-    )
+    Args:
+        session (Session): Database session
+        briefing_base (AIBriefing2Base): The briefing data
 
-    langfuse_base.test_briefing_langfuse_name = _get_langfuse_prompt_name(
-        session=session,
-        cat=BriefingCategory.TEST_BRIEFING_TEMPLATE,
-        sub_category=workspace_sub_category,
-        template=briefing_base.test_briefing_template,
+    Returns:
+        AIBriefing2LangfuseBase: the result of the conversion
+    """
+    specs = _get_briefing_prompt_specs(briefing_base)
+    references = (briefing_base.workspace_info_references or []) + (
+        briefing_base.exemplar_references or []
+    )
+    reference_specs = [
+        _get_reference_prompt_spec(reference) for reference in references
+    ]
+    names = prompt_name_resolver.resolve(
+        session, [*specs.values(), *reference_specs]
     )
 
+    langfuse_base: AIBriefing2LangfuseBase = AIBriefing2LangfuseBase()
+    for field, spec in specs.items():
+        setattr(langfuse_base, field, names[spec.key])
     return langfuse_base
 
 
+def langfuse_bases_from_briefing_reference_bases(
+    session: Session, briefing_ref_bases: list[AIBriefing2ReferenceBase]
+) -> list[AIBriefing2ReferenceLangfuseBase]:
+    """Converts the templates of AIBriefing2ReferenceBases to prompts in Langfuse (in one batch)
+       and returns objects with the names of these prompts
+
+    :param session: the database session
+    :param briefing_ref_bases: the reference definitions
+    :return: the AIBriefing2ReferenceLangfuseBase of each reference
+    """
+    specs = [
+        _get_reference_prompt_spec(briefing_ref_base)
+        for briefing_ref_base in briefing_ref_bases
+    ]
+    names = prompt_name_resolver.resolve(session, specs)
+    return [
+        AIBriefing2ReferenceLangfuseBase(langfuse_name=names[spec.key])
+        for spec in specs
+    ]
+
+
 def langfuse_base_from_briefing_reference_base(
     session: Session, briefing_ref_base: AIBriefing2ReferenceBase
 ) -> AIBriefing2ReferenceLangfuseBase:
@@ -431,47 +613,6 @@ def langfuse_base_from_briefing_reference_base(
     :param briefing_ref_base: the reference definition
     :return: the AIBriefing2ReferenceLangfuseBase
     """
-    langfuse_base = AIBriefing2ReferenceLangfuseBase()
-
-    match briefing_ref_base.type:
-        case "link":
-            langfuse_base.langfuse_name = _get_langfuse_prompt_name(
-                session=session,
-                cat=BriefingCategory.LINK,
-                sub_category=BriefingSubCategory.NONE,
-                template=briefing_ref_base.template,
-                ref_number=briefing_ref_base.ref_number,
-            )
-        case "file":
-            langfuse_base.langfuse_name = _get_langfuse_prompt_name(
-                session=session,
-                cat=BriefingCategory.FILE,
-                sub_category=BriefingSubCategory.NONE,
-                template=briefing_ref_base.template,
-                ref_number=briefing_ref_base.ref_number,
-            )
-        case "xleap":
-            workspace_sub_category = _workspace_name_2_sub_category(
-                briefing_ref_base.workspace_type
-            )
-            langfuse_base.langfuse_name = _get_langfuse_prompt_name(
-                session=session,
-                cat=BriefingCategory.WORKSPACE_CONTENT,
-                sub_category=workspace_sub_category,
-                template=briefing_ref_base.template,
-                ref_number=briefing_ref_base.ref_number,
-            )
-        case "exemplar":
-            langfuse_base.langfuse_name = _get_langfuse_prompt_name(
-                session=session,
-                cat=BriefingCategory.EXEMPLAR,
-                sub_category=BriefingSubCategory.EXEMPLAR,
-                template=briefing_ref_base.template,
-                ref_number=briefing_ref_base.ref_number,
-            )
-        case _:
-            raise ValueError(
-                f"Unhandled reference type: '{briefing_ref_base.type}'"
-            )
-
-    return langfuse_base
+    return langfuse_bases_from_briefing_reference_bases(
+        session, [briefing_ref_base]
+    )[0]
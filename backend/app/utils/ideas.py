@@ -1,12 +1,21 @@
 import logging
+import re
 import uuid as uuid_pkg
+from datetime import UTC, datetime
 from random import random
 
 from fastapi import HTTPException
 from sqlmodel import Session, desc, func, select
 
+from app.core.config import settings
 from app.models import AIAgent, Idea
-from app.utils import AgentGenerationLock, get_briefing2_by_agent_id
+from app.utils import (
+    AgentGenerationLock,
+    SpeculativeIdea,
+    get_briefing2_by_agent_id,
+)
+
+_WORD_PATTERN = re.compile(r"\w+")
 
 
 def check_if_idea_exists(
@@ -262,6 +271,78 @@ def should_ai_post_new_idea(
     return False
 
 
+def _word_similarity(text_a: str, text_b: str) -> float:
+    """
+    Returns the Jaccard similarity (0..1) of the words of two texts
+    """
+    words_a = set(_WORD_PATTERN.findall(text_a.lower()))
+    words_b = set(_WORD_PATTERN.findall(text_b.lower()))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def is_speculative_idea_stale(
+    session: Session,
+    agent_id: uuid_pkg.UUID,
+    candidate: SpeculativeIdea,
+) -> bool:
+    """
+    Checks a pre-generated candidate idea against the ideas which arrived since
+    it was generated. A candidate is stale if
+    - it is older than settings.SPECULATIVE_MAX_AGE_SECONDS
+    - more than settings.SPECULATIVE_MAX_NEW_IDEAS human ideas arrived since
+    - the agent posted an idea since (the candidate does not know it)
+    - it is too similar to one of the newer ideas (somebody had the same idea)
+
+    Args:
+        session (Session): Active database session.
+        agent_id (UUID): The unique identifier for the agent.
+        candidate (SpeculativeIdea): The pre-generated candidate.
+
+    Returns:
+        bool: True if the candidate must be regenerated, False if it can be posted.
+    """
+    age = (datetime.now(UTC) - candidate.created_at).total_seconds()
+    if age > settings.SPECULATIVE_MAX_AGE_SECONDS:
+        logging.info(
+            f"Speculative idea of agent {agent_id} is stale, it is {age:.0f}s old"
+        )
+        return True
+
+    query = select(Idea).where(
+        Idea.agent_id == agent_id,
+        Idea.deleted == False,  # noqa
+        Idea.idea_count > candidate.last_idea_count,
+    )
+    new_ideas = list(session.exec(query))
+
+    if any(idea.created_by_ai for idea in new_ideas):
+        logging.info(
+            f"Speculative idea of agent {agent_id} is stale, the agent "
+            f"posted an idea since it was generated"
+        )
+        return True
+
+    if len(new_ideas) > settings.SPECULATIVE_MAX_NEW_IDEAS:
+        logging.info(
+            f"Speculative idea of agent {agent_id} is stale, {len(new_ideas)} "
+            f"new ideas arrived since it was generated"
+        )
+        return True
+
+    for idea in new_ideas:
+        similarity = _word_similarity(candidate.text, idea.text)
+        if similarity >= settings.SPECULATIVE_MAX_SIMILARITY:
+            logging.info(
+                f"Speculative idea of agent {agent_id} is stale, it is too "
+                f"similar to idea {idea.id}: {similarity:.2f}"
+            )
+            return True
+
+    return False
+
+
 def get_total_human_ideas(session: Session, agent_id: uuid_pkg.UUID) -> int:
     """
     Counts the total number of human-created ideas for a given agent.
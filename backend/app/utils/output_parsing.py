@@ -0,0 +1,140 @@
+import re
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
+
+from .token_buffer import TokenBuffer
+
+# the closing tag of the selected idea, also used as stop sequence so the LLM
+# does not generate anything after the selection
+SELECTED_IDEA_STOP = "</selected_idea>"
+
+# the opening tag may have attributes, e.g. <selected_idea id="3">
+_SELECTED_IDEA_OPEN = "<selected_idea"
+
+# the content of a <selected_idea> tag, the closing tag may be missing at the
+# end of the text if the LLM stopped at SELECTED_IDEA_STOP
+_SELECTED_IDEA_PATTERN = re.compile(
+    r"<selected_idea[^>]*>(.*?)(?:</selected_idea>|\Z)", re.DOTALL
+)
+# the markdown and quotes the LLMs add to an idea
+_BOLD_PATTERN = re.compile(r"\*\*")
+_BOLD_AND_QUOTES_PATTERN = re.compile(r'\*\*|"')
+
+
+class NoSelectedIdeaError(ValueError):
+    """
+    Raised if an LLM output has no <selected_idea> tag, the output is not
+    posted as idea (the generation may be repeated)
+    """
+
+
+def clean_idea(idea: str, remove_quotes: bool = True) -> str:
+    """
+    Removes the markdown bold markers (and quotes) of an idea
+    :param idea: the idea
+    :param remove_quotes: (optional, default True) whether to remove the
+      double quotes
+    :return: the stripped idea
+    """
+    pattern = _BOLD_AND_QUOTES_PATTERN if remove_quotes else _BOLD_PATTERN
+    return pattern.sub("", idea).strip()
+
+
+def parse_selected_ideas(text: str, remove_quotes: bool = True) -> list[str]:
+    """
+    Returns the cleaned contents of all <selected_idea> tags of an LLM output
+    or a conversation, e.g. of an output selecting several ideas.
+    :param text: the output
+    :param remove_quotes: (optional, default True) see clean_idea
+    :return: the ideas in the order of the text, empty if there is no tag
+    """
+    return [
+        clean_idea(match.group(1), remove_quotes)
+        for match in _SELECTED_IDEA_PATTERN.finditer(text)
+    ]
+
+
+def parse_selected_idea(text: str, remove_quotes: bool = True) -> str:
+    """
+    Returns the cleaned content of the first <selected_idea> tag of an LLM
+    output.
+    :param text: the output
+    :param remove_quotes: (optional, default True) see clean_idea
+    :return: the idea
+    :raises NoSelectedIdeaError: if the LLM did not use the tag
+    """
+    match = _SELECTED_IDEA_PATTERN.search(text)
+    if match is None:
+        raise NoSelectedIdeaError("The LLM output contains no selected idea")
+    return clean_idea(match.group(1), remove_quotes)
+
+
+class SelectedIdeaExtractor:
+    """
+    Finds the content of the first <selected_idea> tag in the tokens of an LLM
+    stream. The idea is returned by the token completing the closing tag, so
+    the rest of the stream can be cancelled. Text before the opening tag is
+    dropped, feeding a token costs the length of the token.
+    """
+
+    def __init__(self):
+        self._buffer = TokenBuffer()
+        # whether the opening tag arrived, the buffer then holds the content
+        self._opened = False
+        self._idea: str | None = None
+
+    def feed(self, token: str) -> str | None:
+        """
+        :param token: the next token of the stream
+        :return: the selected idea once its closing tag arrived, else None
+        """
+        if self._idea is not None:
+            return self._idea
+        buffer = self._buffer
+        buffer.append(token)
+        if not self._opened:
+            tag = buffer.index(_SELECTED_IDEA_OPEN)
+            if tag < 0:
+                return None
+            tag_end = buffer.index(">", tag + len(_SELECTED_IDEA_OPEN))
+            if tag_end < 0:
+                return None
+            buffer.delete(0, tag_end + 1)
+            self._opened = True
+        end = buffer.index(SELECTED_IDEA_STOP)
+        if end >= 0:
+            self._idea = buffer.substring(0, end).strip()
+        return self._idea
+
+    def finish(self) -> str | None:
+        """
+        Returns the selected idea at the end of the stream. An opened tag
+        counts as selection, the closing tag is missing if the LLM stopped at
+        SELECTED_IDEA_STOP.
+        :return: the selected idea, None if there was no opening tag
+        """
+        if self._idea is not None or not self._opened:
+            return self._idea
+        return self._buffer.substring(0, self._buffer.length()).strip()
+
+
+async def extract_selected_idea(
+    tokens: AsyncGenerator[str, None], remove_quotes: bool = True
+) -> str:
+    """
+    Consumes a token stream until the selected idea is complete, the rest of
+    the stream is closed (which cancels the request to the LLM).
+    :param tokens: the tokens of the LLM response
+    :param remove_quotes: (optional, default True) see clean_idea
+    :return: the cleaned idea
+    :raises NoSelectedIdeaError: if the response has no <selected_idea> tag
+    """
+    extractor = SelectedIdeaExtractor()
+    async with aclosing(tokens):
+        async for token in tokens:
+            if extractor.feed(token) is not None:
+                break
+    idea = extractor.finish()
+    if idea is None:
+        raise NoSelectedIdeaError("The LLM response contains no selected idea")
+    return clean_idea(idea, remove_quotes)
@@ -13,60 +13,66 @@ def _maybe_unquote(s: str) -> str:
     return s
 
 
-class XLeapStreamingTokenizer(RunnableGenerator):
-    _buffer = TokenBuffer()
-    _contribution_counter: int = 0
-    _token_counter: int = 0
-    _trigger_format_token: str = "##--##"
-    _trigger_format_token_lf = "\n##--##"
+class ContributionParser:
+    """
+    Splits the text of one LLM stream into the contributions which follow the
+    ##--## separators. Text before the first separator is dropped. Each
+    contribution is returned as soon as the separator after it arrived,
+    feeding a token costs the length of the token.
+    """
 
-    def __init__(self):
-        # noinspection PyTypeChecker
-        super().__init__(self.gen)
-
-        self.name = "XLeapStreamingTokenizer"
-
-    def _extract_message_from_buffer(self, is_complete: bool) -> str | None:
-        first_separator = (
-            self._trigger_format_token
-            if 0 == self._contribution_counter
-            else self._trigger_format_token_lf
-        )
+    _separator: str = "##--##"
 
+    def __init__(self):
+        self._buffer = TokenBuffer()
+        # whether the first separator arrived
+        self._started = False
+
+    def _take(self, end: int) -> str:
+        return _maybe_unquote(self._buffer.substring(0, end).strip())
+
+    def feed(self, token: str) -> list[str]:
+        """
+        :param token: the next token of the stream
+        :return: the contributions completed by the token
+        """
         buffer = self._buffer
-
-        start = buffer.index(first_separator)
-        if -1 == start:
+        buffer.append(token)
+        contributions = []
+        while (end := buffer.index(self._separator)) >= 0:
+            if self._started:
+                contributions.append(self._take(end))
+            self._started = True
+            buffer.delete(0, end + len(self._separator))
+        return contributions
+
+    def finish(self) -> str | None:
+        """returns the last contribution, None if there was no separator"""
+        if not self._started:
             return None
+        return self._take(self._buffer.length())
 
-        message_start = start + len(first_separator)
-        end = buffer.index(self._trigger_format_token_lf, message_start)
 
-        if is_complete and -1 == end:
-            end = buffer.length()
-
-        if -1 == end:
-            return None
-
-        contribution = _maybe_unquote(
-            buffer.substring(message_start, end).strip()
-        )
-        buffer.delete(start, end)
-        return contribution
-
-    def append_token(self, token: str) -> str | None:
-        self._buffer.append(token)
+class XLeapStreamingTokenizer(RunnableGenerator):
+    """
+    Turns the streamed response of an LLM into the contributions it contains.
+    Each stream is parsed by its own ContributionParser, so concurrent streams
+    do not share state.
+    """
 
-        return self._extract_message_from_buffer(False)
+    def __init__(self):
+        # noinspection PyTypeChecker
+        super().__init__(self.gen)
 
-    def complete(self) -> str | None:
-        return self._extract_message_from_buffer(True)
+        self.name = "XLeapStreamingTokenizer"
 
     async def gen(
         self, chunks: AsyncIterable[AIMessageChunk]
     ) -> AsyncIterable[str]:
+        parser = ContributionParser()
         async for chunk in chunks:
-            complete = self.append_token(chunk.content)
-            if complete is not None:
-                yield complete
-        yield self.complete()
+            for contribution in parser.feed(chunk.content):  # type: ignore
+                yield contribution
+        last_contribution = parser.finish()
+        if last_contribution is not None:
+            yield last_contribution
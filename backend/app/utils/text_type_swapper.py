@@ -1,4 +1,96 @@
 import random
+from collections.abc import Iterable
+
+# Nearby keys on the keyboard that can be swapped.
+# "": represents forgetting to type a character.
+_NEARBY_KEYS: dict[str, tuple[str, ...]] = {
+    "a": ("q", "w", "s", "x", "z", ""),
+    "b": ("v", "g", "h", "n", ""),
+    "c": ("x", "d", "f", "v", ""),
+    "d": ("s", "e", "r", "f", "c", "x", ""),
+    "e": ("w", "s", "d", "r", ""),
+    "f": ("d", "r", "t", "g", "v", "c", ""),
+    "g": ("f", "t", "y", "h", "b", "v", ""),
+    "h": ("g", "y", "u", "j", "n", "b", ""),
+    "i": ("u", "j", "k", "o", ""),
+    "j": ("h", "u", "i", "k", "n", "m", ""),
+    "k": ("j", "i", "o", "l", "m", ""),
+    "l": ("k", "o", "p", ""),
+    "m": ("n", "j", "k", "l", ""),
+    "n": ("b", "h", "j", "m", ""),
+    "o": ("i", "k", "l", "p", ""),
+    "p": ("o", "l", ""),
+    "q": ("w", "a", "s", ""),
+    "r": ("e", "d", "f", "t", ""),
+    "s": ("w", "e", "d", "x", "z", "a", ""),
+    "t": ("r", "f", "g", "y", ""),
+    "u": ("y", "h", "j", "i", ""),
+    "v": ("c", "f", "g", "v", "b", ""),
+    "w": ("q", "a", "s", "e", ""),
+    "x": ("z", "s", "d", "c", ""),
+    # Account for English and German keyboard layouts
+    # "y": ("t", "g", "h", "u", "a", "s", "x", "y", ""),
+    # "z": ("a", "s", "x", "y", "t", "g", "h", "u", ""),
+    # Special characters
+    # " ": ("c", "v", "b", "n", "m"),
+    ".": (",", "/", "-", " "),
+    ",": (".", "/", " "),  # , "m"),
+    ":": (";", ".", " "),
+    "'": ("", " "),
+}
+
+
+def add_typos(
+    text: str, typo_prob: float = 0.02, rng: random.Random | None = None
+) -> str:
+    """
+    Replaces random characters of the text with nearby keyboard letters,
+    keeping their capitalization. Only the replaced characters are visited,
+    characters without nearby keys stay unchanged.
+    :param text: the text
+    :param typo_prob: the probability of a character becoming a typo (between
+      0 and 1)
+    :param rng: (optional) the random number generator, e.g. a seeded
+      random.Random for reproducible typos, default the random module
+    :return: the text with typos
+    """
+    chooser = random if rng is None else rng
+    positions = chooser.sample(range(len(text)), int(len(text) * typo_prob))
+
+    replacements: dict[int, str] = {}
+    for pos in positions:
+        char = text[pos]
+        nearby_keys = _NEARBY_KEYS.get(char.lower())
+        if nearby_keys is None:
+            continue
+        new_char = chooser.choice(nearby_keys)
+        replacements[pos] = new_char.upper() if char.isupper() else new_char
+
+    if not replacements:
+        return text
+    parts = []
+    start = 0
+    for pos in sorted(replacements):
+        parts.append(text[start:pos])
+        parts.append(replacements[pos])
+        start = pos + 1
+    parts.append(text[start:])
+    return "".join(parts)
+
+
+def add_typos_to_texts(
+    texts: Iterable[str],
+    typo_prob: float = 0.02,
+    rng: random.Random | None = None,
+) -> list[str]:
+    """
+    Adds typos to many texts, see add_typos
+    :param texts: the texts
+    :param typo_prob: the probability of a character becoming a typo
+    :param rng: (optional) the random number generator shared by the texts
+    :return: the texts with typos, in the order of the given texts
+    """
+    return [add_typos(text, typo_prob, rng) for text in texts]
 
 
 class TextTypeSwapper:
@@ -6,16 +98,14 @@ class TextTypeSwapper:
     A class to introduce typos and swap letters in a given text message.
 
     Attributes:
-        _message (list): The message as a list of characters.
+        _message (str): The message.
         _typo_prob (float): The probability of a character becoming a typo
             (between 0 and 1).
-        _capitalization (list): A list of boolean values indicating the
-            capitalization of each character in the message.
-        _nearbykeys (dict): A dictionary mapping each letter to a list of
-            nearby letters on the keyboard.
+        _rng (random.Random | None): The random number generator, None for
+            the random module.
     """
 
-    def __init__(self, text, typo_prob=0.02):
+    def __init__(self, text, typo_prob=0.02, rng=None):
         """
         Initialize the TextTypeSwapper object.
 
@@ -27,76 +117,20 @@ class TextTypeSwapper:
                 see https://www.grammarly.com/blog/analysis-shows-we-write-better-day/
                 and https://contenthub-static.grammarly.com/blog/wp-content/
                 uploads/2016/09/EarlyBird_NightOwl-Infographic-1.jpg
+            rng (random.Random, optional): A (seeded) random number
+                generator for reproducible typos. Defaults to the random
+                module.
         """
-        self._message = list(text)
+        self._message = text
         self._typo_prob = typo_prob
-        self._capitalization = [False] * len(self._message)
-        # Define nearby keys on the keyboard that can be swapped.
-        # "": represents forgetting to type a character.
-        self._nearbykeys = {
-            "a": ["q", "w", "s", "x", "z", ""],
-            "b": ["v", "g", "h", "n", ""],
-            "c": ["x", "d", "f", "v", ""],
-            "d": ["s", "e", "r", "f", "c", "x", ""],
-            "e": ["w", "s", "d", "r", ""],
-            "f": ["d", "r", "t", "g", "v", "c", ""],
-            "g": ["f", "t", "y", "h", "b", "v", ""],
-            "h": ["g", "y", "u", "j", "n", "b", ""],
-            "i": ["u", "j", "k", "o", ""],
-            "j": ["h", "u", "i", "k", "n", "m", ""],
-            "k": ["j", "i", "o", "l", "m", ""],
-            "l": ["k", "o", "p", ""],
-            "m": ["n", "j", "k", "l", ""],
-            "n": ["b", "h", "j", "m", ""],
-            "o": ["i", "k", "l", "p", ""],
-            "p": ["o", "l", ""],
-            "q": ["w", "a", "s", ""],
-            "r": ["e", "d", "f", "t", ""],
-            "s": ["w", "e", "d", "x", "z", "a", ""],
-            "t": ["r", "f", "g", "y", ""],
-            "u": ["y", "h", "j", "i", ""],
-            "v": ["c", "f", "g", "v", "b", ""],
-            "w": ["q", "a", "s", "e", ""],
-            "x": ["z", "s", "d", "c", ""],
-            # Account for English and German keyboard layouts
-            # "y": ["t", "g", "h", "u", "a", "s", "x", "y", ""],
-            # "z": ["a", "s", "x", "y", "t", "g", "h", "u", ""],
-            # Special characters
-            # " ": ["c", "v", "b", "n", "m"],
-            ".": [",", "/", "-", " "],
-            ",": [".", "/", " "],  # , "m"],
-            ":": [";", ".", " "],
-            "'": ["", " "],
-        }
+        self._rng = rng
 
     def add_typos(self):
         """
         Add typos to the message by replacing characters with nearby keyboard
         letters.
         """
-        # Record capitalization
-        for i in range(len(self._message)):
-            self._capitalization[i] = self._message[i].isupper()
-            self._message[i] = self._message[i].lower()
-
-        # Add typos
-        n_chars_to_flip = int(len(self._message) * self._typo_prob)
-        pos_to_flip = random.sample(range(len(self._message)), n_chars_to_flip)
-
-        for pos in pos_to_flip:
-            try:
-                typo_arrays = self._nearbykeys[self._message[pos]]
-                new_char = random.choice(typo_arrays)
-                self._message[pos] = new_char
-            except Exception as e:
-                print(e)
-                continue
-
-        # Restore capitalization
-        for i in range(len(self._message)):
-            if self._capitalization[i]:
-                self._message[i] = self._message[i].upper()
-
+        self._message = add_typos(self._message, self._typo_prob, self._rng)
         return self
 
     def get_text(self):
@@ -106,4 +140,4 @@ class TextTypeSwapper:
         Returns:
             str: The modified message.
         """
-        return "".join(self._message)
+        return self._message
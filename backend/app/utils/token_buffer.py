@@ -1,14 +1,38 @@
+class _Scan:
+    """the progress of the search of one value from one start index"""
+
+    __slots__ = ("scanned_to", "found")
+
+    def __init__(self):
+        # the buffer before this index does not contain the value (unless found)
+        self.scanned_to = 0
+        # the first index of the value, -1 if not found yet
+        self.found = -1
+
+
 class TokenBuffer:
-    _buffer = list[str]()
-    _last_search: str | None = None
-    _last_str_index: int = -1
-    _last_buffer_index: int = -1
+    """
+    Collects the tokens of a stream, e.g. to find the separators between the
+    ideas of an LLM response.
+    A search resumes where its previous scan of the buffer stopped, so
+    repeating a search after each appended token costs the length of the
+    token only. Deleting the start of the buffer is O(1), the deleted
+    characters are dropped once they make up half of the storage.
+    """
+
+    # the number of searches whose progress is kept
+    _MAX_SCANS = 8
+
+    def __init__(self):
+        self._chars: list[str] = []
+        # the characters before this index were deleted
+        self._head = 0
+        self._scans: dict[tuple[str, int], _Scan] = {}
 
     def append(self, token: str):
-        for s in token:
-            self._buffer.append(s)
+        self._chars.extend(token)
 
-    def index(self, search: str, start: int = 0):
+    def index(self, search: str, start: int = 0) -> int:
         """
             Returns the first index of the search. Returns -1 if the search value
             is not present!
@@ -16,43 +40,56 @@ class TokenBuffer:
         :param start:
         :return:
         """
-        search_length = len(search)
-        buff = self._buffer
-        buff_length = len(buff)
-        if search_length > buff_length or start > buff_length:
+        if not search:
+            raise ValueError("The search value must not be empty")
+        length = self.length()
+        if len(search) > length or start > length:
             return -1
-        buffer_index = -1 + start
-        while True:
-            buffer_index += 1
-            if buffer_index >= buff_length:
-                return -1
-
-            try:
-                idx = self._buffer.index(search[0], buffer_index)
-            except ValueError:
-                return -1
-
-            if search_length + idx > buff_length:
-                return -1
-            search_index = 0
-            while (
-                search_index + 1 < search_length
-                and idx + 1 + search_index < buff_length
-            ):
-                search_index += 1
-                if buff[idx + search_index] != search[search_index]:
-                    break
-            if (
-                search_index == search_length - 1
-                and buff[idx + search_index] == search[search_index]
-            ):
-                return idx
-
-    def length(self):
-        return len(self._buffer)
+
+        scan = self._scans.get((search, start))
+        if scan is None:
+            if len(self._scans) >= self._MAX_SCANS:
+                self._scans.clear()
+            scan = self._scans[(search, start)] = _Scan()
+            scan.scanned_to = start
+        if scan.found >= 0:
+            return scan.found
+
+        # a match may begin in the characters scanned before
+        scan_from = max(start, scan.scanned_to - len(search) + 1)
+        position = self.substring(scan_from, length).find(search)
+        scan.scanned_to = length
+        if position >= 0:
+            scan.found = scan_from + position
+        return scan.found
+
+    def length(self) -> int:
+        return len(self._chars) - self._head
 
     def substring(self, start: int, end: int) -> str:
-        return "".join(self._buffer[start:end])
+        head = self._head
+        return "".join(self._chars[head + start : head + end])
 
     def delete(self, start: int, end: int):
-        del self._buffer[start:end]
+        end = min(end, self.length())
+        if start >= end:
+            return
+        if start == 0:
+            self._head += end
+            if self._head * 2 >= len(self._chars):
+                del self._chars[: self._head]
+                self._head = 0
+        else:
+            del self._chars[self._head + start : self._head + end]
+        self._update_scans(start)
+
+    def _update_scans(self, deleted_from: int):
+        """keeps the progress of the searches before the deleted characters"""
+        for (search, start), scan in list(self._scans.items()):
+            if start > deleted_from:
+                del self._scans[(search, start)]
+                continue
+            if scan.found >= 0 and scan.found + len(search) <= deleted_from:
+                continue
+            scan.found = -1
+            scan.scanned_to = min(scan.scanned_to, deleted_from)